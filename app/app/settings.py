@@ -53,6 +53,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "audio.timing.ServerTimingMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     'whitenoise.middleware.WhiteNoiseMiddleware',
     "django.middleware.security.SecurityMiddleware",
@@ -211,3 +212,64 @@ SPECTACULAR_SETTINGS = {
     "COMPONENT_SPLIT_REQUEST": True,
     "SERVE_INCLUDE_SCHEMA": False,
 }
+
+# Background audio analysis queue (see `manage.py run_analysis_workers`)
+AUDIO_ANALYSIS_MAX_ATTEMPTS = int(os.environ.get("AUDIO_ANALYSIS_MAX_ATTEMPTS", 3))
+AUDIO_ANALYSIS_RETRY_DELAY = int(os.environ.get("AUDIO_ANALYSIS_RETRY_DELAY", 30))
+AUDIO_ANALYSIS_STALE_SECONDS = int(os.environ.get("AUDIO_ANALYSIS_STALE_SECONDS", 600))
+# Running jobs refresh their lock this often; keep it well below the above
+AUDIO_ANALYSIS_HEARTBEAT_SECONDS = int(
+    os.environ.get("AUDIO_ANALYSIS_HEARTBEAT_SECONDS", 60)
+)
+
+# Decoded PCM shared by all workers on a host; set the budget to 0 to disable
+AUDIO_PCM_CACHE_DIR = os.environ.get(
+    "AUDIO_PCM_CACHE_DIR",
+    "/dev/shm/ariakon-pcm" if os.path.isdir("/dev/shm") else "/tmp/ariakon-pcm",
+)
+AUDIO_PCM_CACHE_BYTES = int(os.environ.get("AUDIO_PCM_CACHE_BYTES", 512 * 1024 * 1024))
+
+# Files larger than this are analysed in blocks of AUDIO_STREAM_BLOCK_SECONDS
+AUDIO_STREAM_MIN_BYTES = int(os.environ.get("AUDIO_STREAM_MIN_BYTES", 8 * 1024 * 1024))
+AUDIO_STREAM_BLOCK_SECONDS = float(os.environ.get("AUDIO_STREAM_BLOCK_SECONDS", 10))
+
+# Multi-channel files: analyse the "loudest" channel or a "mix" of all channels
+AUDIO_CHANNEL_MODE = os.environ.get("AUDIO_CHANNEL_MODE", "loudest")
+
+# Batch uploads are analysed in the request by a bounded pool of processes
+AUDIO_BATCH_MAX_FILES = int(os.environ.get("AUDIO_BATCH_MAX_FILES", 50))
+AUDIO_BATCH_PROCESSES = int(
+    os.environ.get("AUDIO_BATCH_PROCESSES", min(os.cpu_count() or 1, 8))
+)
+
+# Seconds the statistics endpoint spends analysing files without a result
+AUDIO_STATISTICS_DEADLINE = float(os.environ.get("AUDIO_STATISTICS_DEADLINE", 5))
+
+# Response cache of the audio views. It stays off with the default per-process
+# LocMemCache, which the analysis worker cannot invalidate; point CACHE_BACKEND
+# at a backend every process shares (redis, database or file based) to use it
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "ariakon"),
+    }
+}
+AUDIO_RESPONSE_CACHE_SECONDS = int(os.environ.get("AUDIO_RESPONSE_CACHE_SECONDS", 300))
+
+# Resumable uploads (audio-uploads/): largest recording and largest chunk
+AUDIO_UPLOAD_MAX_BYTES = int(os.environ.get("AUDIO_UPLOAD_MAX_BYTES", 2 * 1024**3))
+AUDIO_UPLOAD_MAX_CHUNK_BYTES = int(
+    os.environ.get("AUDIO_UPLOAD_MAX_CHUNK_BYTES", 32 * 1024 * 1024)
+)
+# Hours without a chunk after which delete_abandoned_uploads removes an upload
+AUDIO_UPLOAD_ABANDONED_HOURS = float(os.environ.get("AUDIO_UPLOAD_ABANDONED_HOURS", 48))
+
+# Follow WAV uploads while they arrive, so they are analysed in the request
+AUDIO_ANALYZE_DURING_UPLOAD = bool(
+    int(os.environ.get("AUDIO_ANALYZE_DURING_UPLOAD", 1))
+)
+
+# Per-stage Server-Timing header and timing log line on every response
+AUDIO_SERVER_TIMING = bool(int(os.environ.get("AUDIO_SERVER_TIMING", 0)))
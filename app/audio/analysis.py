@@ -0,0 +1,271 @@
+"""
+Persistence of audio analysis results.
+"""
+
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import AnalysisJob, AudioAnalysis
+
+from .cache import invalidate_responses
+from .canonical import analysis_source, canonical_path, delete_canonical
+from .envelope import Envelope
+from .summary import record_analyses
+from .utils import ANALYSIS_VERSION, analyze_audio, calculate_speed_from_peaks
+from .waveform import delete_waveform, waveform_path
+
+logger = logging.getLogger(__name__)
+
+
+def run_analysis(audio_file, inflight=None):
+    """
+    Decode the audio file once and store the result of the analysis.
+
+    An ``inflight`` analysis, followed while the file was uploaded, only
+    needs its peaks to be found instead.
+    """
+    analysis, _ = AudioAnalysis.objects.get_or_create(audio_file=audio_file)
+
+    try:
+        if inflight is not None:
+            result = inflight.finish(
+                audio_file.file.path, waveform_path=waveform_path(audio_file)
+            )
+        else:
+            result = analyze_audio(
+                analysis_source(audio_file),
+                waveform_path=waveform_path(audio_file),
+                canonical_path=canonical_path(audio_file),
+            )
+    except Exception as e:
+        fill_analysis(analysis, audio_file, error=e)
+    else:
+        fill_analysis(analysis, audio_file, result=result)
+
+    analysis.save()
+    audio_file.analysis = analysis
+    return analysis
+
+
+def fill_analysis(analysis, audio_file, result=None, error=None):
+    """Copy an analysis result, or the error that prevented it, onto the model."""
+    analysis.algorithm_version = ANALYSIS_VERSION
+    if error is not None:
+        logger.error(f"Error analysing audio file {audio_file.id}: {str(error)}")
+        analysis.status = AudioAnalysis.STATUS_FAILED
+        analysis.error = str(error)
+        analysis.speed_mps = analysis.speed_mph = 0
+        analysis.frame_rate = 0
+        analysis.peaks = []
+        analysis.envelope = b""
+        analysis.envelope_bucket = analysis.envelope_points = 0
+        delete_waveform(audio_file)
+        delete_canonical(audio_file)
+    else:
+        analysis.status = AudioAnalysis.STATUS_DONE
+        analysis.error = ""
+        analysis.frame_rate = result.frame_rate
+        analysis.peaks = result.peaks
+        analysis.envelope = result.envelope.to_bytes()
+        analysis.envelope_bucket = result.envelope.bucket
+        analysis.envelope_points = result.envelope.points
+        analysis.speed_mps, analysis.speed_mph = calculate_speed_from_peaks(
+            float(audio_file.distance), result.peaks, result.frame_rate, audio_file.unit
+        )
+    return analysis
+
+
+# Columns written by fill_analysis, for bulk updates.
+ANALYSIS_FIELDS = [
+    "algorithm_version",
+    "status",
+    "error",
+    "speed_mps",
+    "speed_mph",
+    "frame_rate",
+    "peaks",
+    "envelope",
+    "envelope_bucket",
+    "envelope_points",
+    "updated_at",
+]
+
+
+def terminate_pool(pool):
+    """Shut a process pool down, killing its workers instead of waiting."""
+    # ProcessPoolExecutor has no public way to stop running tasks.
+    processes = list(pool._processes.values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+def run_batch_analysis(audio_files, timeout=None, processes=None):
+    """
+    Analyse several files in parallel and store all results at once.
+
+    Decoding and peak finding run in a bounded pool of forked processes that
+    never touch the database, one task per file; the results are written
+    back with one ``bulk_create`` and one ``bulk_update``, and the speed
+    summaries and response cache are updated in the same transaction. After
+    ``timeout`` seconds the workers are killed, so no analysis outlives the
+    call, and the files not finished, or whose worker process died, are
+    queued for the background workers instead. ``processes`` defaults to
+    ``AUDIO_BATCH_PROCESSES``.
+
+    Returns:
+        list: The AudioAnalysis of the files analysed here
+    """
+    if not audio_files:
+        return []
+
+    existing = {
+        analysis.audio_file_id: analysis
+        for analysis in AudioAnalysis.objects.filter(audio_file__in=audio_files)
+    }
+    processes = min(len(audio_files), processes or settings.AUDIO_BATCH_PROCESSES)
+    pool = ProcessPoolExecutor(
+        max_workers=processes, mp_context=multiprocessing.get_context("fork")
+    )
+    futures = {}
+    try:
+        for audio_file in audio_files:
+            future = pool.submit(
+                analyze_audio,
+                analysis_source(audio_file),
+                waveform_path=waveform_path(audio_file),
+                canonical_path=canonical_path(audio_file),
+            )
+            futures[future] = audio_file
+        finished, _ = wait(futures, timeout=timeout)
+    finally:
+        terminate_pool(pool)
+
+    created, updated, queued = [], [], []
+    for future, audio_file in futures.items():
+        if future not in finished:
+            queued.append(audio_file)
+            continue
+        try:
+            result, error = future.result(), None
+        except BrokenProcessPool:
+            queued.append(audio_file)
+            continue
+        except Exception as e:
+            result, error = None, e
+
+        analysis = existing.get(audio_file.id)
+        if analysis is None:
+            analysis = AudioAnalysis(audio_file=audio_file)
+            created.append(analysis)
+        else:
+            analysis.updated_at = timezone.now()
+            updated.append(analysis)
+        fill_analysis(analysis, audio_file, result=result, error=error)
+        audio_file.analysis = analysis
+
+    with transaction.atomic():
+        AudioAnalysis.objects.bulk_create(created)
+        AudioAnalysis.objects.bulk_update(updated, ANALYSIS_FIELDS)
+        record_analyses(created + updated)
+        for analysis in created + updated:
+            invalidate_responses(analysis.audio_file.user_id, analysis.audio_file_id)
+        # Queued jobs of files analysed here have nothing left to do.
+        AnalysisJob.objects.filter(
+            audio_file__in=[analysis.audio_file for analysis in updated],
+            status=AnalysisJob.STATUS_QUEUED,
+        ).update(status=AnalysisJob.STATUS_DONE)
+    for audio_file in queued:
+        enqueue_analysis(audio_file)
+    return created + updated
+
+
+def needs_analysis(audio_files):
+    """
+    Files without an up-to-date result that are not left to the workers.
+
+    Files with a queued or running job are skipped, so polling clients do
+    not analyse again what an earlier deadline already queued.
+    """
+    missing = []
+    for audio_file in audio_files:
+        try:
+            analysis = audio_file.analysis
+        except AudioAnalysis.DoesNotExist:
+            missing.append(audio_file)
+            continue
+        if (
+            analysis.status == AudioAnalysis.STATUS_PENDING
+            or analysis.algorithm_version < ANALYSIS_VERSION
+        ):
+            missing.append(audio_file)
+    if not missing:
+        return []
+
+    queued = set(
+        AnalysisJob.objects.filter(
+            audio_file__in=missing,
+            status__in=[AnalysisJob.STATUS_QUEUED, AnalysisJob.STATUS_RUNNING],
+        ).values_list("audio_file_id", flat=True)
+    )
+    return [audio_file for audio_file in missing if audio_file.id not in queued]
+
+
+def refresh_speed(audio_file):
+    """Recompute the speeds from the stored peaks after distance or unit changed."""
+    try:
+        analysis = audio_file.analysis
+    except AudioAnalysis.DoesNotExist:
+        return run_analysis(audio_file)
+
+    analysis.speed_mps, analysis.speed_mph = calculate_speed_from_peaks(
+        float(audio_file.distance), analysis.peaks, analysis.frame_rate, audio_file.unit
+    )
+    analysis.save(update_fields=["speed_mps", "speed_mph", "updated_at"])
+    return analysis
+
+
+def enqueue_analysis(audio_file):
+    """Mark the analysis as pending and queue it for the background workers."""
+    with transaction.atomic():
+        analysis, _ = AudioAnalysis.objects.update_or_create(
+            audio_file=audio_file,
+            defaults={"status": AudioAnalysis.STATUS_PENDING, "error": ""},
+        )
+        if not AnalysisJob.objects.filter(
+            audio_file=audio_file, status=AnalysisJob.STATUS_QUEUED
+        ).exists():
+            AnalysisJob.objects.create(audio_file=audio_file)
+
+    audio_file.analysis = analysis
+    return analysis
+
+
+def get_analysis(audio_file):
+    """Return the stored analysis, queueing missing and outdated results."""
+    try:
+        analysis = audio_file.analysis
+    except AudioAnalysis.DoesNotExist:
+        return enqueue_analysis(audio_file)
+
+    if (
+        analysis.algorithm_version < ANALYSIS_VERSION
+        and analysis.status != AudioAnalysis.STATUS_PENDING
+    ):
+        enqueue_analysis(audio_file)
+    return analysis
+
+
+def get_envelope(analysis):
+    """Waveform envelope pyramid of a stored analysis."""
+    return Envelope.from_bytes(
+        analysis.envelope, analysis.envelope_bucket, analysis.envelope_points
+    )
@@ -0,0 +1,292 @@
+"""
+Synthetic impact recordings and a stage by stage timing of their analysis.
+
+A recording holds clicks, a sharp onset with a short ring-down, at known
+sample positions over low background noise, so the peaks found can be
+checked as well as timed. Recordings are generated block by block and kept
+in a work directory, so long files are only written once. Files the
+analysis would stream are timed through the streamed analysis as well, so
+no recording is ever decoded into memory whole.
+"""
+
+import os
+import time
+import wave
+import tempfile
+import subprocess
+
+import numpy as np
+import soundfile
+from django.conf import settings
+from pydub import AudioSegment
+
+from .envelope import EnvelopeBuilder, to_int16
+from .peaks import find_distant_peaks
+from .timing import collect_timings
+from .utils import (
+    PEAK_DISTANCE,
+    PEAK_PERCENTILE,
+    analyze_audio_stream,
+    calculate_amplitude,
+    calculate_speed_from_peaks,
+    channel_signals,
+    decode_audio,
+    format_values,
+    loudest_channel,
+)
+
+FORMATS = ("wav", "flac", "mp3")
+# Sample rates an MP3 stream can carry.
+MP3_RATES = (8000, 11025, 12000, 16000, 22050, 24000, 32000, 44100, 48000)
+STAGES = ("decode", "abs", "percentile", "peaks", "formatting")
+STREAM_STAGES = ("decode", "peaks", "second_pass", "formatting")
+
+CLICK_AMPLITUDE = 20000
+CLICK_DECAY_SECONDS = 0.003
+CLICK_TONE_HZ = 1000
+# Background noise, as a fraction of full scale.
+NOISE = 0.001
+# How far a peak may be from its click; lossy codecs smear the onset.
+CLICK_TOLERANCE_SECONDS = 0.005
+GENERATE_BLOCK_SECONDS = 10
+
+
+def click_positions(frame_rate, seconds, separations):
+    """
+    Sample indices of clicks ``separations`` seconds apart, centred in time.
+
+    Raises:
+        ValueError: If the clicks do not fit or the peak detector cannot tell
+        two of them apart
+    """
+    if min(separations) * frame_rate <= PEAK_DISTANCE:
+        raise ValueError(f"Clicks closer than {PEAK_DISTANCE} samples.")
+    times = np.concatenate([[0.0], np.cumsum(separations)])
+    start = (seconds - times[-1]) / 2
+    if start <= 0:
+        raise ValueError(f"Clicks do not fit in {seconds:g} s.")
+    return [int(round((start + offset) * frame_rate)) for offset in times]
+
+
+def synthesize_block(start, count, frame_rate, channels, clicks, noise, rng):
+    """Frames ``start`` to ``start + count`` of a recording, as int16."""
+    scale = noise * np.iinfo(np.int16).max
+    signal = rng.normal(0, scale, count)
+    ring = int(frame_rate * CLICK_DECAY_SECONDS * 10)
+    for position in clicks:
+        low, high = max(position, start), min(position + ring, start + count)
+        if low < high:
+            offset = np.arange(low - position, high - position)
+            signal[low - start : high - start] += (
+                CLICK_AMPLITUDE
+                * np.exp(-offset / (frame_rate * CLICK_DECAY_SECONDS))
+                * np.cos(2 * np.pi * CLICK_TONE_HZ * offset / frame_rate)
+            )
+
+    # Further channels carry the same clicks, quieter, over their own noise.
+    frames = [signal] + [
+        signal / (2 * channel) + rng.normal(0, scale, count)
+        for channel in range(1, channels)
+    ]
+    frames = np.column_stack(frames).round()
+    return np.clip(frames, -32768, 32767).astype("<i2")
+
+
+def write_recording(
+    path, audio_format, frame_rate, channels, seconds, clicks, noise=NOISE, seed=0
+):
+    """
+    Write a synthetic 16-bit recording, block by block.
+
+    The file appears under its final name only once it is complete.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(seconds * frame_rate)
+    block = int(GENERATE_BLOCK_SECONDS * frame_rate)
+    # MP3 is encoded from a WAV file.
+    suffix = ".flac" if audio_format == "flac" else ".wav"
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=suffix)
+    os.close(fd)
+    try:
+        if audio_format == "flac":
+            output = soundfile.SoundFile(
+                tmp_path, "w", frame_rate, channels, "PCM_16", format="FLAC"
+            )
+        else:
+            output = wave.open(tmp_path, "wb")
+            output.setnchannels(channels)
+            output.setsampwidth(2)
+            output.setframerate(frame_rate)
+
+        with output:
+            for start in range(0, total, block):
+                frames = synthesize_block(
+                    start,
+                    min(block, total - start),
+                    frame_rate,
+                    channels,
+                    clicks,
+                    noise,
+                    rng,
+                )
+                if audio_format == "flac":
+                    output.write(frames)
+                else:
+                    output.writeframes(frames.tobytes())
+
+        if audio_format == "mp3":
+            wav_path = tmp_path
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".mp3")
+            os.close(fd)
+            try:
+                subprocess.run(
+                    [
+                        AudioSegment.converter,
+                        "-v",
+                        "error",
+                        "-y",
+                        "-i",
+                        wav_path,
+                        tmp_path,
+                    ],
+                    check=True,
+                )
+            finally:
+                os.unlink(wav_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def recording(
+    work_dir,
+    audio_format,
+    frame_rate,
+    channels,
+    seconds,
+    separations,
+    noise=NOISE,
+    seed=0,
+):
+    """
+    A synthetic recording in ``work_dir``, generated on first use.
+
+    Returns:
+        tuple: (path, sample indices of the clicks)
+
+    Raises:
+        ValueError: If the format cannot carry the sample rate or the clicks
+        do not fit
+    """
+    if audio_format not in FORMATS:
+        raise ValueError(f"Unknown format: {audio_format}")
+    if audio_format == "mp3" and frame_rate not in MP3_RATES:
+        raise ValueError(f"MP3 cannot carry {frame_rate} Hz.")
+    clicks = click_positions(frame_rate, seconds, separations)
+
+    gaps = "-".join(f"{separation:g}" for separation in separations)
+    name = (
+        f"impacts-{frame_rate}hz-{channels}ch-{seconds:g}s-{gaps}"
+        f"-n{noise:g}-s{seed}.{audio_format}"
+    )
+    path = os.path.join(work_dir, name)
+    if not os.path.exists(path):
+        write_recording(
+            path, audio_format, frame_rate, channels, seconds, clicks, noise, seed
+        )
+    return path, clicks
+
+
+def clicks_found(clicks, peaks, frame_rate):
+    """Number of clicks with a detected peak within the tolerance."""
+    if not len(peaks):
+        return 0
+    peaks = np.asarray(peaks)
+    tolerance = CLICK_TOLERANCE_SECONDS * frame_rate
+    return sum(int(np.abs(peaks - click).min() <= tolerance) for click in clicks)
+
+
+def time_stages(audio_file_path, distance=1.0, unit="meters"):
+    """
+    Time each stage of the in-memory analysis behind calculate_speed_of_sound.
+
+    The file is decoded directly, without the shared PCM cache. PCM WAV is
+    memory-mapped, so its reads are paid in the ``abs`` stage, as they are in
+    the analysis itself. ``formatting`` covers the envelope, the hit list and
+    the speeds of the response. Files above ``AUDIO_STREAM_MIN_BYTES`` are
+    timed by time_streamed_stages instead, as the analysis streams them.
+
+    Returns:
+        tuple: (seconds spent in every stage of STAGES, or of STREAM_STAGES
+        for streamed files, peaks, frame rate)
+    """
+    if os.path.getsize(audio_file_path) > settings.AUDIO_STREAM_MIN_BYTES:
+        return time_streamed_stages(audio_file_path, distance, unit)
+
+    timings = {}
+    clock = time.perf_counter
+
+    started = clock()
+    samples, frame_rate, channels = decode_audio(audio_file_path)
+    if samples.dtype.itemsize > 2:
+        samples = to_int16(samples)
+    signals = channel_signals(samples.reshape(-1, channels))
+    signal = signals[:, loudest_channel(signals)]
+    timings["decode"] = clock() - started
+
+    started = clock()
+    amplitude = calculate_amplitude(signal)
+    timings["abs"] = clock() - started
+
+    started = clock()
+    threshold = np.percentile(amplitude, PEAK_PERCENTILE)
+    timings["percentile"] = clock() - started
+
+    started = clock()
+    peaks = find_distant_peaks(amplitude, threshold, PEAK_DISTANCE)
+    timings["peaks"] = clock() - started
+
+    started = clock()
+    envelope = EnvelopeBuilder()
+    envelope.feed(signal)
+    envelope.finish().as_dict()
+    peaks = [int(val) for val in peaks]
+    format_values(peaks)
+    calculate_speed_from_peaks(distance, peaks, frame_rate, unit)
+    timings["formatting"] = clock() - started
+
+    return timings, peaks, frame_rate
+
+
+def time_streamed_stages(audio_file_path, distance=1.0, unit="meters"):
+    """
+    Time each stage of the block-wise analysis of long recordings.
+
+    ``decode`` is the first pass, which decodes every block and builds the
+    amplitude histograms, ``peaks`` the online peak detector and
+    ``second_pass`` the rest of the second pass, mostly reading the blocks
+    again and building the envelope. ``formatting`` is as in time_stages.
+
+    Returns:
+        tuple: (seconds spent in every stage of STREAM_STAGES, peaks, frame rate)
+    """
+    clock = time.perf_counter
+
+    started = clock()
+    with collect_timings() as collected:
+        result = analyze_audio_stream(audio_file_path)
+    elapsed = clock() - started
+    timings = {
+        stage: collected.stages.get(stage, (0.0, 0))[0] for stage in ("decode", "peaks")
+    }
+    timings["second_pass"] = elapsed - timings["decode"] - timings["peaks"]
+
+    started = clock()
+    result.envelope.as_dict()
+    format_values(result.peaks)
+    calculate_speed_from_peaks(distance, result.peaks, result.frame_rate, unit)
+    timings["formatting"] = clock() - started
+
+    return timings, result.peaks, result.frame_rate
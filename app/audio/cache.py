@@ -0,0 +1,108 @@
+"""
+Per-user cache of audio responses.
+
+Entries are keyed by user, view and representation, plus a generation token
+of the user, or of the file for detail responses. Any change to a file or
+its analysis replaces the tokens, so old entries are never read again and
+simply expire. Entries also keep the ETag of the state they were built from
+and are only served while it is still current, so a lost invalidation can
+never pair a new ETag with an old body.
+
+Invalidations come from the web processes and the analysis worker alike,
+so the cache stays off unless every process shares it.
+"""
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+# Backends whose entries live in one process, out of reach of the others.
+PROCESS_LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def response_cache_timeout():
+    """Seconds responses are cached, 0 unless every process shares the cache."""
+    if settings.CACHES["default"]["BACKEND"] in PROCESS_LOCAL_BACKENDS:
+        return 0
+    return settings.AUDIO_RESPONSE_CACHE_SECONDS
+
+
+def generation_key(kind, pk):
+    return f"audio:generation:{kind}:{pk}"
+
+
+def response_key(request, scope, audio_file_id=None):
+    """Cache key of the response to ``request``, valid until an invalidation."""
+    if audio_file_id is None:
+        name = generation_key("user", request.user.id)
+    else:
+        name = generation_key("file", audio_file_id)
+    generation = cache.get(name)
+    if generation is None:
+        # A fresh token, never "no token", so an evicted one cannot bring
+        # back entries cached before it was replaced.
+        generation = uuid.uuid4().hex
+        cache.add(name, generation, None)
+        generation = cache.get(name, generation)
+    representation = "|".join(
+        [request.accepted_renderer.format, request.GET.urlencode(), generation]
+    )
+    digest = hashlib.sha256(representation.encode()).hexdigest()[:32]
+    return f"audio:response:{scope}:{request.user.id}:{audio_file_id}:{digest}"
+
+
+def cached_response(request, scope, etag, audio_file_id=None):
+    """
+    Look up the response to ``request`` in the cache.
+
+    Only 200 responses are stored, as their data rather than rendered bytes,
+    so every renderer can be served from its own entry. ``etag`` must be
+    that of the current state, taken before the body of a miss is built.
+
+    Returns:
+        tuple: (key to store a miss under, None with the cache off;
+        the cached response or None)
+    """
+    if not response_cache_timeout():
+        return None, None
+
+    # Taken before building: a change during the build orphans the entry.
+    key = response_key(request, scope, audio_file_id)
+    entry = cache.get(key)
+    if entry is not None and entry[0] == etag:
+        return key, Response(entry[1], status=status.HTTP_200_OK)
+    return key, None
+
+
+def store_response(key, etag, response):
+    """Cache a response built after ``etag`` was taken, under a looked up key."""
+    if key is not None and response.status_code == status.HTTP_200_OK:
+        cache.set(key, (etag, response.data), response_cache_timeout())
+
+
+def invalidate_responses(user_id, audio_file_id=None):
+    """
+    Drop the cached responses of a user, and of one file of theirs.
+
+    The tokens are replaced right away and again once the transaction
+    commits, so a request racing the commit cannot cache the old state.
+    """
+    if not response_cache_timeout():
+        return
+
+    def replace_tokens():
+        tokens = {generation_key("user", user_id): uuid.uuid4().hex}
+        if audio_file_id is not None:
+            tokens[generation_key("file", audio_file_id)] = uuid.uuid4().hex
+        cache.set_many(tokens, None)
+
+    replace_tokens()
+    transaction.on_commit(replace_tokens)
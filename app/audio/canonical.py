@@ -0,0 +1,87 @@
+"""
+Canonical analysis copies of uploads that need a decoder.
+
+The first analysis of an MP3, FLAC or other compressed upload keeps the
+signal it analysed, the chosen or mixed channel at the original frame rate
+and sample width, as a mono PCM WAV file next to the upload. Later
+analyses and waveform builds memory-map that copy instead of decoding the
+upload again, and give the same result. The upload itself is only kept for
+download.
+"""
+
+import os
+import wave
+import tempfile
+
+import numpy as np
+from django.conf import settings
+
+CHANNEL_MODES = ("loudest", "mix")
+
+
+def canonical_path(audio_file, channel_mode=None):
+    """Location of the canonical copy of an AudioFile for a channel mode."""
+    mode = channel_mode or settings.AUDIO_CHANNEL_MODE
+    return f"{audio_file.file.path}.{mode}.wav"
+
+
+def analysis_source(audio_file):
+    """The file to analyse: the canonical copy when it is up to date."""
+    path = canonical_path(audio_file)
+    try:
+        if os.path.getmtime(path) >= os.path.getmtime(audio_file.file.path):
+            return path
+    except OSError:
+        pass
+    return audio_file.file.path
+
+
+def delete_canonical(audio_file):
+    """Remove the canonical copies of an AudioFile, if it has any."""
+    if not audio_file.file:
+        return
+    for mode in CHANNEL_MODES:
+        try:
+            os.unlink(canonical_path(audio_file, mode))
+        except FileNotFoundError:
+            pass
+
+
+class CanonicalWriter:
+    """
+    Write blocks of one signal as a mono PCM WAV file.
+
+    The file is written under a temporary name and only published by
+    ``close``, so readers never see a partial copy.
+    """
+
+    def __init__(self, path, frame_rate, sample_width):
+        self.path = path
+        self.sample_width = sample_width
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        self.output = os.fdopen(fd, "wb")
+        self.writer = wave.open(self.output, "wb")
+        self.writer.setnchannels(1)
+        self.writer.setsampwidth(sample_width)
+        self.writer.setframerate(frame_rate)
+
+    def feed(self, samples):
+        samples = np.asarray(samples)
+        if self.sample_width == 1:
+            # 8-bit WAV is unsigned.
+            data = samples.astype(np.int8).view(np.uint8) ^ 0x80
+        else:
+            data = samples.astype(f"<i{self.sample_width}")
+        self.writer.writeframes(data.tobytes())
+
+    def close(self):
+        """Publish the file."""
+        self.writer.close()
+        self.output.close()
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        """Drop what was written without publishing anything."""
+        self.writer.close()
+        self.output.close()
+        os.unlink(self.tmp_path)
@@ -0,0 +1,197 @@
+"""
+Min/max waveform envelopes stored as a small mipmap pyramid.
+
+Level 0 holds at most ``MAX_POINTS`` (min, max) pairs of the signal and every
+further level halves the previous one, down to a single point. Clients ask
+for the number of points that fits their width and get the matching level,
+so the payload does not depend on the length of the recording.
+"""
+
+import numpy as np
+
+MIN_BUCKET = 64
+MAX_POINTS = 4096
+DEFAULT_POINTS = 512
+
+
+def to_int16(samples):
+    """Scale samples of any integer width to the 16-bit range."""
+    samples = np.asarray(samples)
+    width = samples.dtype.itemsize
+    if width == 1:
+        return samples.astype(np.int16) << 8
+    if width > 2:
+        return (samples >> (8 * (width - 2))).astype(np.int16)
+    return samples.astype(np.int16, copy=False)
+
+
+def halve(mins, maxs):
+    """Merge neighbouring points; an odd last point is kept on its own."""
+    if mins.size % 2:
+        mins = np.append(mins, mins[-1])
+        maxs = np.append(maxs, maxs[-1])
+    return mins.reshape(-1, 2).min(axis=1), maxs.reshape(-1, 2).max(axis=1)
+
+
+def level_sizes(points):
+    """Number of points of every level of a pyramid with ``points`` at level 0."""
+    sizes = [points]
+    while sizes[-1] > 1:
+        sizes.append((sizes[-1] + 1) // 2)
+    return sizes
+
+
+class Envelope:
+    """Pyramid of min/max levels of one signal."""
+
+    def __init__(self, bucket, levels):
+        self.bucket = bucket
+        self.levels = levels
+
+    @property
+    def points(self):
+        """Number of points of the most detailed level."""
+        return self.levels[0][0].size if self.levels else 0
+
+    def to_bytes(self):
+        """Pack all levels as little-endian int16 (min, max) pairs."""
+        if not self.levels:
+            return b""
+        pairs = [np.stack(level, axis=1) for level in self.levels]
+        return np.concatenate(pairs).astype("<i2").tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, bucket, points):
+        """Unpack an envelope stored by ``to_bytes``."""
+        if not points:
+            return cls(bucket, [])
+        pairs = np.frombuffer(data, dtype="<i2").reshape(-1, 2)
+        levels = []
+        start = 0
+        for size in level_sizes(points):
+            level = pairs[start : start + size]
+            levels.append((level[:, 0], level[:, 1]))
+            start += size
+        return cls(bucket, levels)
+
+    def level_for(self, points):
+        """
+        Pick the most detailed level with no more than ``points`` points.
+
+        Returns:
+            tuple: (samples_per_point, mins, maxs)
+        """
+        if not self.levels:
+            return self.bucket, self.levels, self.levels
+        for index, (mins, maxs) in enumerate(self.levels):
+            if mins.size <= points:
+                return self.bucket << index, mins, maxs
+        return self.bucket << (len(self.levels) - 1), *self.levels[-1]
+
+    def as_dict(self, points=DEFAULT_POINTS, packed=False):
+        """API representation of the level that fits ``points``."""
+        samples_per_point, mins, maxs = self.level_for(max(1, points))
+        if packed:
+            return {
+                "samples_per_point": samples_per_point,
+                "min": np.asarray(mins),
+                "max": np.asarray(maxs),
+            }
+        return {
+            "samples_per_point": samples_per_point,
+            "min": [int(val) for val in mins],
+            "max": [int(val) for val in maxs],
+        }
+
+
+class EnvelopeBuilder:
+    """
+    Build an envelope from blocks of samples in bounded memory.
+
+    Points start at ``MIN_BUCKET`` samples each; whenever more than twice
+    ``max_points`` have been collected they are merged pairwise and the
+    bucket size doubles, so memory never depends on the signal length.
+    """
+
+    def __init__(self, max_points=MAX_POINTS, bucket=MIN_BUCKET):
+        self.max_points = max_points
+        self.bucket = bucket
+        self.mins = []
+        self.maxs = []
+        self.count = 0
+        # Incomplete last point: its min, max and number of samples.
+        self.partial = None
+
+    def feed(self, samples):
+        samples = to_int16(samples)
+        if self.partial is not None:
+            low, high, filled = self.partial
+            take = samples[: self.bucket - filled]
+            if take.size:
+                low, high = min(low, int(take.min())), max(high, int(take.max()))
+            filled += take.size
+            samples = samples[take.size :]
+            if filled < self.bucket:
+                self.partial = (low, high, filled)
+                return
+            self.partial = None
+            self.append(np.array([low], np.int16), np.array([high], np.int16))
+
+        full = samples.size - samples.size % self.bucket
+        if full:
+            buckets = samples[:full].reshape(-1, self.bucket)
+            self.append(buckets.min(axis=1), buckets.max(axis=1))
+        rest = samples[full:]
+        if rest.size:
+            low, high, filled = int(rest.min()), int(rest.max()), rest.size
+            if self.partial is not None:
+                # Left over by merging points above; these samples follow it.
+                partial_low, partial_high, partial_filled = self.partial
+                low, high = min(low, partial_low), max(high, partial_high)
+                filled += partial_filled
+            self.partial = (low, high, filled)
+
+    def append(self, mins, maxs):
+        self.mins.append(mins)
+        self.maxs.append(maxs)
+        self.count += mins.size
+        while self.count > 2 * self.max_points:
+            mins, maxs = np.concatenate(self.mins), np.concatenate(self.maxs)
+            if mins.size % 2:
+                # The odd last point becomes the start of a larger bucket.
+                self.partial = self.merge_partial(mins[-1], maxs[-1])
+                mins, maxs = mins[:-1], maxs[:-1]
+            mins, maxs = halve(mins, maxs)
+            self.mins, self.maxs = [mins], [maxs]
+            self.count = mins.size
+            self.bucket *= 2
+
+    def merge_partial(self, low, high):
+        filled = self.bucket
+        if self.partial is not None:
+            partial_low, partial_high, partial_filled = self.partial
+            low, high = min(low, partial_low), max(high, partial_high)
+            filled += partial_filled
+        return int(low), int(high), filled
+
+    def finish(self):
+        """Return the envelope of everything fed so far."""
+        mins = np.concatenate(self.mins) if self.mins else np.empty(0, np.int16)
+        maxs = np.concatenate(self.maxs) if self.maxs else np.empty(0, np.int16)
+        if self.partial is not None:
+            low, high, _ = self.partial
+            mins = np.append(mins, np.int16(low))
+            maxs = np.append(maxs, np.int16(high))
+
+        bucket = self.bucket
+        while mins.size > self.max_points:
+            mins, maxs = halve(mins, maxs)
+            bucket *= 2
+
+        levels = []
+        if mins.size:
+            levels.append((mins, maxs))
+            while mins.size > 1:
+                mins, maxs = halve(mins, maxs)
+                levels.append((mins, maxs))
+        return Envelope(bucket, levels)
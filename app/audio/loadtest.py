@@ -0,0 +1,224 @@
+"""
+Seeded recordings and concurrent requests against the audio API.
+
+Requests either run in-process through the Django test client, where every
+request is charged the SQL queries it made, or go over HTTP to a running
+server that shares the database. Seeded users own recordings that are
+already analysed and share one short WAV file, so the API is measured and
+not the analysis.
+"""
+
+import os
+import sys
+import time
+import random
+import resource
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.models import AudioAnalysis, AudioFile
+
+from .analysis import fill_analysis
+from .bench import click_positions, write_recording
+from .summary import rebuild_summary
+from .utils import analyze_audio
+
+SCENARIOS = ("list", "detail", "statistics")
+SEED_EMAIL = "loadtest-{recordings}-{index}@example.com"
+SEED_FILE = "audio/loadtest.wav"
+BUDGET_KEYS = ("p50_ms", "p95_ms", "p99_ms", "queries", "rss_mb", "errors")
+
+
+def seed_file():
+    """Storage name of the recording every seeded file points at."""
+    path = default_storage.path(SEED_FILE)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_recording(path, "wav", 44100, 1, 2, click_positions(44100, 2, [0.7]))
+    return SEED_FILE
+
+
+def seed_users(recordings, users):
+    """
+    Users owning ``recordings`` analysed recordings each, created on first use.
+
+    Rows are written with bulk queries, so the speed summaries are rebuilt
+    afterwards rather than maintained by the signals.
+
+    Returns:
+        list: (token key, ids of the user's recordings) of every user
+    """
+    name = seed_file()
+    result = analyze_audio(default_storage.path(name))
+    seeded = []
+    for index in range(users):
+        user, _ = get_user_model().objects.get_or_create(
+            email=SEED_EMAIL.format(recordings=recordings, index=index),
+            defaults={"name": "Load test"},
+        )
+        missing = recordings - user.audio_files.count()
+        if missing > 0:
+            audio_files = AudioFile.objects.bulk_create(
+                AudioFile(
+                    user=user,
+                    file=name,
+                    distance=1 + number % 10,
+                    unit="meters",
+                )
+                for number in range(missing)
+            )
+            AudioAnalysis.objects.bulk_create(
+                fill_analysis(AudioAnalysis(audio_file=audio_file), audio_file, result)
+                for audio_file in audio_files
+            )
+            rebuild_summary(user.id)
+        token, _ = Token.objects.get_or_create(user=user)
+        ids = list(user.audio_files.values_list("id", flat=True))
+        seeded.append((token.key, ids))
+    return seeded
+
+
+def remove_seeded():
+    """Delete every seeded user, their recordings and the shared file."""
+    deleted, _ = get_user_model().objects.filter(
+        email__startswith="loadtest-", email__endswith="@example.com"
+    ).delete()
+    default_storage.delete(SEED_FILE)
+    return deleted
+
+
+def request_plan(scenario, seeded, requests, seed=0):
+    """(url, token key) of every request of a scenario, spread over the users."""
+    rng = random.Random(seed)
+    plan = []
+    for number in range(requests):
+        token, ids = seeded[number % len(seeded)]
+        if scenario == "list":
+            url = reverse("audio:audiofile-list-create")
+        elif scenario == "detail":
+            url = reverse("audio:audiofile-detail", args=[rng.choice(ids)])
+        else:
+            url = reverse("audio:audio-statistics")
+        plan.append((url, token))
+    return plan
+
+
+class QueryCounter:
+    """Database execute wrapper counting the queries of the current thread."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def in_process_request(client, url, token):
+    """(seconds, queries, status) of a GET through the test client."""
+    queries = QueryCounter()
+    with connection.execute_wrapper(queries):
+        started = time.perf_counter()
+        response = client.get(url, HTTP_AUTHORIZATION=f"Token {token}")
+        elapsed = time.perf_counter() - started
+    return elapsed, queries.count, response.status_code
+
+
+def http_request(base_url, url, token):
+    """(seconds, None, status) of a GET to a running server."""
+    request = urllib.request.Request(
+        base_url.rstrip("/") + url, headers={"Authorization": f"Token {token}"}
+    )
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            code = response.status
+    except urllib.error.HTTPError as e:
+        code = e.code
+    return time.perf_counter() - started, None, code
+
+
+def drive(plan, concurrency, base_url=None):
+    """
+    Send the requests of a plan from ``concurrency`` threads.
+
+    Every thread takes the next request as soon as its previous one is
+    answered, and closes its own database connection when the plan is done.
+
+    Returns:
+        tuple: ((seconds, queries, status) of every request, wall time)
+    """
+    samples = []
+    lock = threading.Lock()
+    pending = iter(plan)
+
+    def worker():
+        client = Client()
+        try:
+            while True:
+                with lock:
+                    step = next(pending, None)
+                if step is None:
+                    return
+                if base_url is None:
+                    sample = in_process_request(client, *step)
+                else:
+                    sample = http_request(base_url, *step)
+                with lock:
+                    samples.append(sample)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def peak_rss_mb():
+    """Largest resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(samples, wall_time):
+    """Latency percentiles, queries per request and throughput of a run."""
+    latencies = np.array([sample[0] for sample in samples]) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    queries = [sample[1] for sample in samples if sample[1] is not None]
+    return {
+        "requests": len(samples),
+        "errors": sum(sample[2] >= 400 for sample in samples),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(latencies.max()), 2),
+        "requests_per_second": round(len(samples) / wall_time, 1),
+        "queries": max(queries) if queries else None,
+        "queries_median": float(np.median(queries)) if queries else None,
+    }
+
+
+def breaches(summary, budget):
+    """What a scenario summary exceeds of a budget, as messages."""
+    messages = []
+    for key in BUDGET_KEYS:
+        limit = budget.get(key)
+        value = summary.get(key)
+        if limit is not None and value is not None and value > limit:
+            messages.append(f"{key} {value:g} > {limit:g}")
+    return messages
@@ -0,0 +1,254 @@
+"""
+Django command to benchmark the audio analysis on synthetic recordings
+"""
+
+import os
+import json
+import time
+import platform
+import tempfile
+import statistics
+import subprocess
+from itertools import product
+
+import numpy as np
+import scipy
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.utils import timezone
+
+from audio.bench import FORMATS, clicks_found, recording, time_stages
+from audio.utils import ANALYSIS_VERSION, calculate_speed_of_sound
+
+
+def comma_list(cast):
+    """argparse type for a comma separated list of values."""
+
+    def parse(value):
+        return [cast(item) for item in value.split(",") if item]
+
+    parse.__name__ = f"{cast.__name__} list"
+    return parse
+
+
+def git_commit():
+    """Commit of the checked out tree, if it is a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def case_key(case):
+    return (
+        case["format"],
+        case["frame_rate"],
+        case["channels"],
+        case["seconds"],
+        tuple(case["separations"]),
+    )
+
+
+class Command(BaseCommand):
+    """Django command to time every stage of the analysis"""
+
+    help = (
+        "Time the analysis of synthetic impact recordings stage by stage "
+        "(decode, abs, percentile, peaks, formatting, or decode, peaks, "
+        "second_pass, formatting for streamed files) and end to end, and "
+        "write the timings as JSON to compare runs across commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--formats",
+            type=comma_list(str),
+            default=list(FORMATS),
+            help="Comma separated formats (default: wav,flac,mp3).",
+        )
+        parser.add_argument(
+            "--rates",
+            type=comma_list(int),
+            default=[8000, 44100, 96000],
+            help="Comma separated sample rates (default: 8000,44100,96000).",
+        )
+        parser.add_argument(
+            "--channels",
+            type=comma_list(int),
+            default=[1, 2],
+            help="Comma separated channel counts (default: 1,2).",
+        )
+        parser.add_argument(
+            "--durations",
+            type=comma_list(float),
+            default=[1, 60, 600],
+            help="Comma separated lengths in seconds (default: 1,60,600).",
+        )
+        parser.add_argument(
+            "--separations",
+            type=comma_list(float),
+            default=[0.7],
+            help="Seconds between consecutive clicks (default: 0.7, two clicks).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Timed runs per recording; the minimum and median are kept.",
+        )
+        parser.add_argument(
+            "--work-dir",
+            default=os.path.join(tempfile.gettempdir(), "bench_audio"),
+            help="Where the generated recordings are kept between runs.",
+        )
+        parser.add_argument(
+            "--output",
+            default="bench_audio.json",
+            help="File to write the JSON report to (default: bench_audio.json).",
+        )
+        parser.add_argument(
+            "--baseline",
+            help="JSON report of an earlier run to compare the timings with.",
+        )
+        parser.add_argument(
+            "--label",
+            default="",
+            help="Free-form name of the run, stored in the report.",
+        )
+        parser.add_argument(
+            "--pcm-cache",
+            action="store_true",
+            help="Keep the shared PCM cache on for the end to end timing.",
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options["formats"]) - set(FORMATS)
+        if unknown:
+            raise CommandError(f"Unknown formats: {', '.join(sorted(unknown))}")
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1.")
+
+        baseline = {}
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline_file:
+                baseline = {
+                    case_key(case): case
+                    for case in json.load(baseline_file)["cases"]
+                    if "stages" in case
+                }
+
+        os.makedirs(options["work_dir"], exist_ok=True)
+        cache = {} if options["pcm_cache"] else {"AUDIO_PCM_CACHE_BYTES": 0}
+        cases = []
+        with override_settings(**cache):
+            for audio_format, frame_rate, channels, seconds in product(
+                options["formats"],
+                options["rates"],
+                options["channels"],
+                options["durations"],
+            ):
+                case = self.run_case(
+                    options, audio_format, frame_rate, channels, seconds
+                )
+                cases.append(case)
+                self.report(case, baseline.get(case_key(case)))
+
+        report = {
+            "label": options["label"],
+            "commit": git_commit(),
+            "analysis_version": ANALYSIS_VERSION,
+            "created_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": options["repeat"],
+            "pcm_cache": options["pcm_cache"],
+            "stream_min_bytes": settings.AUDIO_STREAM_MIN_BYTES,
+            "cases": cases,
+        }
+        with open(options["output"], "w") as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote {len(cases)} case(s) to {options['output']}.")
+        )
+
+    def run_case(self, options, audio_format, frame_rate, channels, seconds):
+        """Generate one recording if needed and time its analysis."""
+        case = {
+            "format": audio_format,
+            "frame_rate": frame_rate,
+            "channels": channels,
+            "seconds": seconds,
+            "separations": options["separations"],
+        }
+        try:
+            path, clicks = recording(
+                options["work_dir"],
+                audio_format,
+                frame_rate,
+                channels,
+                seconds,
+                options["separations"],
+            )
+        except ValueError as e:
+            case["skipped"] = str(e)
+            return case
+
+        size = os.path.getsize(path)
+        runs = {}
+        for _ in range(options["repeat"]):
+            timings, peaks, _ = time_stages(path)
+            for stage, seconds_spent in timings.items():
+                runs.setdefault(stage, []).append(seconds_spent)
+            started = time.perf_counter()
+            calculate_speed_of_sound(1.0, path, "meters")
+            runs.setdefault("total", []).append(time.perf_counter() - started)
+
+        case.update(
+            {
+                "bytes": size,
+                # Whether the analysis, and so the stage timings, streamed.
+                "streamed": size > settings.AUDIO_STREAM_MIN_BYTES,
+                "clicks": clicks,
+                "peaks": len(peaks),
+                "clicks_found": clicks_found(clicks, peaks, frame_rate),
+                "stages": {
+                    stage: {"min": min(values), "median": statistics.median(values)}
+                    for stage, values in runs.items()
+                },
+            }
+        )
+        return case
+
+    def report(self, case, baseline=None):
+        """One progress line per case."""
+        name = (
+            f"{case['format']} {case['frame_rate']} Hz {case['channels']} ch "
+            f"{case['seconds']:g} s"
+        )
+        if "skipped" in case:
+            self.stdout.write(f"{name}: skipped, {case['skipped']}")
+            return
+
+        stages = ", ".join(
+            f"{stage} {values['median'] * 1000:.1f} ms"
+            for stage, values in case["stages"].items()
+        )
+        line = (
+            f"{name}: {stages}; {case['clicks_found']}/{len(case['clicks'])} "
+            "clicks found"
+        )
+        if baseline is not None:
+            before = baseline["stages"]["total"]["median"]
+            after = case["stages"]["total"]["median"]
+            line += f", total x{after / before:.2f} of the baseline"
+        self.stdout.write(line)
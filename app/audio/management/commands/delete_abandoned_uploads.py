@@ -0,0 +1,36 @@
+"""
+Django command to delete resumable uploads that were never finished
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from audio.uploads import delete_abandoned_uploads
+
+
+class Command(BaseCommand):
+    """Django command to remove abandoned uploads and their partial files"""
+
+    help = (
+        "Delete unfinished resumable uploads that received no chunk for a "
+        "while, with the bytes received so far. Meant to run periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=float,
+            default=settings.AUDIO_UPLOAD_ABANDONED_HOURS,
+            help=(
+                "Hours without a chunk after which an upload counts as "
+                f"abandoned (default: {settings.AUDIO_UPLOAD_ABANDONED_HOURS:g})."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(hours=options["hours"])
+        deleted = delete_abandoned_uploads(older_than)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} abandoned uploads."))
@@ -0,0 +1,200 @@
+"""
+Django command to load test the audio API
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from audio.loadtest import (
+    BUDGET_KEYS,
+    SCENARIOS,
+    breaches,
+    drive,
+    peak_rss_mb,
+    remove_seeded,
+    request_plan,
+    seed_users,
+    summarize,
+)
+
+from .bench_audio import comma_list
+
+
+class Command(BaseCommand):
+    """Django command to measure the audio endpoints under concurrent load"""
+
+    help = (
+        "Seed users with analysed recordings and drive the list, detail and "
+        "statistics endpoints concurrently. Reports p50/p95/p99 latency, SQL "
+        "queries per request and peak RSS per scenario, and fails when a "
+        "budget is exceeded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenarios",
+            type=comma_list(str),
+            default=list(SCENARIOS),
+            help="Comma separated endpoints (default: list,detail,statistics).",
+        )
+        parser.add_argument(
+            "--recordings",
+            type=comma_list(int),
+            default=[10, 100, 500],
+            help="Comma separated recordings per user (default: 10,100,500).",
+        )
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=4,
+            help="Seeded users per recording count; requests rotate over them.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Requests per scenario.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="Requests in flight at once.",
+        )
+        parser.add_argument(
+            "--base-url",
+            help=(
+                "Send the requests over HTTP to a server on the same database, "
+                "e.g. http://127.0.0.1:9000, instead of the in-process test "
+                "client. Queries are not counted in this mode."
+            ),
+        )
+        parser.add_argument(
+            "--no-response-cache",
+            action="store_true",
+            help="Build every in-process response instead of serving it cached.",
+        )
+        parser.add_argument(
+            "--budgets",
+            help=(
+                "JSON file of limits per scenario, with a 'default' entry for "
+                f"all of them. Keys: {', '.join(BUDGET_KEYS)}."
+            ),
+        )
+        parser.add_argument(
+            "--max-p95-ms",
+            type=float,
+            help="Default p95 latency budget in milliseconds.",
+        )
+        parser.add_argument(
+            "--max-queries",
+            type=int,
+            help="Default budget of SQL queries per request.",
+        )
+        parser.add_argument(
+            "--output",
+            help="File to write the JSON report to.",
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the seeded users and recordings for the next run.",
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options["scenarios"]) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        if min(options["users"], options["requests"], options["concurrency"]) < 1:
+            raise CommandError("--users, --requests and --concurrency must be >= 1.")
+        budgets = self.load_budgets(options)
+
+        cache = {}
+        if options["no_response_cache"]:
+            cache["AUDIO_RESPONSE_CACHE_SECONDS"] = 0
+        results, failures = [], []
+        try:
+            with override_settings(**cache):
+                for recordings in options["recordings"]:
+                    self.stdout.write(
+                        f"Seeding {options['users']} user(s) with "
+                        f"{recordings} recording(s)..."
+                    )
+                    seeded = seed_users(recordings, options["users"])
+                    for scenario in options["scenarios"]:
+                        result = self.run_scenario(options, scenario, seeded)
+                        result["recordings"] = recordings
+                        results.append(result)
+
+                        budget = {**budgets.get("default", {})}
+                        budget.update(budgets.get(scenario, {}))
+                        exceeded = breaches(result, budget)
+                        failures.extend(
+                            f"{scenario} @ {recordings}: {message}"
+                            for message in exceeded
+                        )
+                        self.report(result, exceeded)
+        finally:
+            if not options["keep"]:
+                remove_seeded()
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({"scenarios": results, "budgets": budgets}, output, indent=2)
+        if failures:
+            raise CommandError("Budget exceeded: " + "; ".join(failures))
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(results)} scenario(s) within budget.")
+        )
+
+    def load_budgets(self, options):
+        budgets = {}
+        if options["budgets"]:
+            with open(options["budgets"]) as budget_file:
+                budgets = json.load(budget_file)
+            for scenario, budget in budgets.items():
+                unknown = set(budget) - set(BUDGET_KEYS)
+                if scenario not in SCENARIOS + ("default",) or unknown:
+                    raise CommandError(f"Invalid budget for {scenario}.")
+        default = budgets.setdefault("default", {})
+        # A failing request fails the run unless a budget allows for it.
+        default.setdefault("errors", 0)
+        if options["max_p95_ms"] is not None:
+            default["p95_ms"] = options["max_p95_ms"]
+        if options["max_queries"] is not None:
+            default["queries"] = options["max_queries"]
+        return budgets
+
+    def run_scenario(self, options, scenario, seeded):
+        """Drive one endpoint and summarize what it cost."""
+        plan = request_plan(scenario, seeded, options["requests"])
+        rss_before = peak_rss_mb()
+        samples, wall_time = drive(plan, options["concurrency"], options["base_url"])
+        rss = peak_rss_mb()
+
+        result = {"scenario": scenario, **summarize(samples, wall_time)}
+        if options["base_url"] is None:
+            # The server's memory is out of reach over HTTP.
+            result["rss_mb"] = round(rss, 1)
+            result["rss_growth_mb"] = round(rss - rss_before, 1)
+        return result
+
+    def report(self, result, exceeded):
+        line = (
+            f"{result['scenario']} @ {result['recordings']} recordings: "
+            f"p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, "
+            f"p99 {result['p99_ms']:.1f} ms, "
+            f"{result['requests_per_second']:.1f} req/s"
+        )
+        if result["queries"] is not None:
+            line += f", {result['queries']} queries"
+        if "rss_mb" in result:
+            line += f", peak RSS {result['rss_mb']:.1f} MB"
+        if result["errors"]:
+            line += f", {result['errors']} error(s)"
+        if exceeded:
+            self.stdout.write(self.style.ERROR(f"{line} - {', '.join(exceeded)}"))
+        else:
+            self.stdout.write(line)
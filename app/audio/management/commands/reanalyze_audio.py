@@ -0,0 +1,175 @@
+"""
+Django command to recompute stored analysis results in bulk
+"""
+
+import os
+import json
+import time
+import tempfile
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from core.models import AudioAnalysis, AudioFile
+from audio.analysis import run_batch_analysis
+
+
+def since_argument(value):
+    """Parse ``--since`` as an ISO date or datetime in the current time zone."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.combine(day, datetime.min.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m{seconds:02d}s"
+    return f"{minutes}m{seconds:02d}s"
+
+
+class Command(BaseCommand):
+    """Django command to re-run the analysis of stored audio files"""
+
+    help = (
+        "Re-analyse stored audio files in a process pool, e.g. after the "
+        "detection logic changed. Progress is checkpointed, so a killed run "
+        "resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.AUDIO_BATCH_PROCESSES,
+            help="Number of analysis processes (default: AUDIO_BATCH_PROCESSES).",
+        )
+        parser.add_argument(
+            "--user",
+            action="append",
+            default=[],
+            help="Email of a user whose files to re-analyse (default: every user).",
+        )
+        parser.add_argument(
+            "--since",
+            type=since_argument,
+            help="Only files uploaded on or after this ISO date or datetime.",
+        )
+        parser.add_argument(
+            "--algorithm-version",
+            type=int,
+            help="Only files without a result or with one older than this version.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=100,
+            help="Files fetched, analysed and checkpointed together.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=os.path.join(tempfile.gettempdir(), "reanalyze_audio.json"),
+            help="File that records the progress of the run.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the checkpoint of an earlier run and start over.",
+        )
+
+    def handle(self, *args, **options):
+        filters = {
+            "user": sorted(options["user"]),
+            "since": options["since"].isoformat() if options["since"] else None,
+            "algorithm_version": options["algorithm_version"],
+        }
+        checkpoint = options["checkpoint"]
+        last_id, done = self.resume(checkpoint, filters, options["restart"])
+
+        audio_files = AudioFile.objects.filter(id__gt=last_id).order_by("id")
+        if filters["user"]:
+            audio_files = audio_files.filter(user__email__in=filters["user"])
+        if options["since"]:
+            audio_files = audio_files.filter(created_at__gte=options["since"])
+        if filters["algorithm_version"] is not None:
+            audio_files = audio_files.filter(
+                Q(analysis__isnull=True)
+                | Q(analysis__algorithm_version__lt=filters["algorithm_version"])
+            )
+
+        remaining = audio_files.count()
+        self.stdout.write(
+            f"Re-analysing {remaining} file(s)"
+            + (f", resuming after {done} done." if done else ".")
+        )
+
+        started = time.monotonic()
+        processed = failed = queued = size = 0
+        rows = audio_files.iterator(chunk_size=options["chunk_size"])
+        while chunk := list(islice(rows, options["chunk_size"])):
+            analyses = run_batch_analysis(chunk, processes=max(1, options["workers"]))
+            failed += sum(
+                analysis.status == AudioAnalysis.STATUS_FAILED for analysis in analyses
+            )
+            queued += len(chunk) - len(analyses)
+            processed += len(chunk)
+            size += sum(self.file_size(audio_file) for audio_file in chunk)
+            self.save(checkpoint, filters, chunk[-1].id, done + processed)
+
+            elapsed = max(time.monotonic() - started, 1e-6)
+            rate = processed / elapsed
+            self.stdout.write(
+                f"{done + processed}/{done + remaining} files, "
+                f"{rate:.1f} files/s, {size / elapsed / 1024**2:.1f} MB/s, "
+                f"ETA {format_duration((remaining - processed) / rate)}"
+            )
+
+        if os.path.exists(checkpoint):
+            os.unlink(checkpoint)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Re-analysed {processed} file(s) in "
+                f"{format_duration(time.monotonic() - started)}: {failed} failed, "
+                f"{queued} left to the background workers."
+            )
+        )
+
+    def resume(self, checkpoint, filters, restart):
+        """(last id, files done) of an interrupted run with the same filters."""
+        if restart or not os.path.exists(checkpoint):
+            return 0, 0
+        with open(checkpoint) as state_file:
+            state = json.load(state_file)
+        if state["filters"] != filters:
+            raise CommandError(
+                f"{checkpoint} belongs to a run with other filters; "
+                "pass --restart to discard it."
+            )
+        return state["last_id"], state["done"]
+
+    def save(self, checkpoint, filters, last_id, done):
+        """Record the progress, atomically so a kill never leaves half a file."""
+        state = {"filters": filters, "last_id": last_id, "done": done}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(checkpoint) or ".")
+        with os.fdopen(fd, "w") as state_file:
+            json.dump(state, state_file)
+        os.replace(tmp_path, checkpoint)
+
+    @staticmethod
+    def file_size(audio_file):
+        try:
+            return audio_file.file.size
+        except OSError:
+            return 0
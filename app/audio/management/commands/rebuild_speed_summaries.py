@@ -0,0 +1,34 @@
+"""
+Django command to rebuild the per-user speed summaries
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from audio.summary import rebuild_summary
+
+
+class Command(BaseCommand):
+    """Django command to recompute speed summaries from the stored analyses"""
+
+    help = "Recompute the per-user speed summaries from the stored analyses."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            action="append",
+            default=[],
+            help="Email of a user to rebuild (default: every user).",
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by("id")
+        if options["user"]:
+            users = users.filter(email__in=options["user"])
+
+        rebuilt = 0
+        for user_id in users.values_list("id", flat=True).iterator():
+            rebuild_summary(user_id)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} speed summaries."))
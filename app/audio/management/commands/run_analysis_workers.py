@@ -0,0 +1,94 @@
+"""
+Django command to run background audio analysis workers
+"""
+
+import signal
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from audio.worker import default_worker_id, run_worker
+
+
+class Command(BaseCommand):
+    """Django command to process queued analysis jobs"""
+
+    help = "Process queued audio analysis jobs. Safe to run on several hosts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Number of worker processes to start on this host.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before polling an empty queue again.",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once the queue is empty instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        processes = max(1, options["processes"])
+        worker_options = {
+            "poll_interval": options["poll_interval"],
+            "burst": options["burst"],
+        }
+
+        if processes == 1:
+            processed = self.work(**worker_options)
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} job(s)."))
+            return
+
+        # Children must open their own database connections.
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=self.work, kwargs=worker_options)
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {processes} analysis workers.")
+
+        def forward(signum, frame):
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+
+        signal.signal(signal.SIGTERM, forward)
+        for worker in workers:
+            worker.join()
+
+        self.stdout.write(self.style.SUCCESS("Analysis workers stopped."))
+
+    def work(self, poll_interval, burst):
+        """Run one worker loop, finishing the current job on SIGTERM/SIGINT."""
+        stopping = []
+
+        def stop(signum, frame):
+            stopping.append(signum)
+
+        previous = {
+            signum: signal.signal(signum, stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+
+        worker_id = default_worker_id()
+        self.stdout.write(f"Analysis worker {worker_id} waiting for jobs...")
+        try:
+            return run_worker(
+                worker_id=worker_id,
+                poll_interval=poll_interval,
+                burst=burst,
+                should_stop=lambda: bool(stopping),
+            )
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
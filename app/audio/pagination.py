@@ -0,0 +1,88 @@
+"""
+Keyset pagination for the audio file list.
+
+Pages are ordered by ``(updated_at, id)``, newest first, and the cursor holds
+the key of the last row served. The next page starts right after it through
+the ``(user_id, updated_at DESC, id DESC)`` index, so every page costs the
+same however deep a client scrolls.
+"""
+
+import base64
+import binascii
+from datetime import datetime
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Forward-only cursor over ``-updated_at, -id`` for infinite scroll."""
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    page_size = 20
+    max_page_size = 100
+    ordering = ("-updated_at", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            updated_at, pk = self.decode_cursor(cursor)
+            # updated_at <= t AND NOT (updated_at = t AND id >= pk) keeps the
+            # index range scan on updated_at.
+            queryset = queryset.filter(updated_at__lte=updated_at).exclude(
+                updated_at=updated_at, id__gte=pk
+            )
+
+        # One extra row tells whether there is a next page, without a COUNT.
+        rows = list(queryset[: page_size + 1])
+        self.has_next = len(rows) > page_size
+        page = rows[:page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        cursor = self.encode_cursor(self.last.updated_at, self.last.id)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def encode_cursor(self, updated_at, pk):
+        key = f"{updated_at.isoformat()}|{pk}".encode()
+        return base64.urlsafe_b64encode(key).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            key = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            updated_at, pk = key.decode().split("|")
+            return datetime.fromisoformat(updated_at), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
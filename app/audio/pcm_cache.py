@@ -0,0 +1,144 @@
+"""
+Decoded PCM cache shared by every worker process on a host.
+
+Decoded sample arrays are written once to memory-mapped files, by default in
+``/dev/shm``, and later analyses map them read-only instead of decoding the
+file again. Files are keyed by source path, size and mtime so a replaced
+upload never hits a stale entry, and the directory is kept under a byte budget
+by evicting the least recently used entries.
+"""
+
+import os
+import struct
+import hashlib
+import logging
+import tempfile
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"APCM"
+VERSION = 1
+# magic, version, channels, frame rate, dtype, frame count
+HEADER = struct.Struct("<4sHHI8sQ")
+DATA_OFFSET = 64
+SUFFIX = ".pcm"
+
+
+class PCMCache:
+    """LRU cache of decoded samples stored as memory-mapped files."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_settings(cls):
+        return cls(settings.AUDIO_PCM_CACHE_DIR, settings.AUDIO_PCM_CACHE_BYTES)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def key(self, audio_file_path):
+        """Cache key of the current version of a file."""
+        stat = os.stat(audio_file_path)
+        source = (
+            f"{os.path.realpath(audio_file_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        )
+        return hashlib.sha1(source.encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, audio_file_path):
+        """
+        Map the cached samples of a file.
+
+        Returns:
+            tuple: (samples, frame_rate, channels) with a read-only memmap, or None
+        """
+        if not self.enabled:
+            return None
+
+        path = self.entry_path(self.key(audio_file_path))
+        try:
+            with open(path, "rb") as entry:
+                header = entry.read(HEADER.size)
+            magic, version, channels, frame_rate, dtype, frames = HEADER.unpack(header)
+        except (OSError, struct.error):
+            return None
+        if magic != MAGIC or version != VERSION:
+            return None
+
+        try:
+            samples = np.memmap(
+                path,
+                dtype=np.dtype(dtype.rstrip(b"\0").decode()),
+                mode="r",
+                offset=DATA_OFFSET,
+                shape=(frames * channels,),
+            )
+            # Mark the entry as recently used for eviction.
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return samples, frame_rate, channels
+
+    def put(self, audio_file_path, samples, frame_rate, channels):
+        """Store decoded samples and evict old entries beyond the byte budget."""
+        if not self.enabled:
+            return
+
+        samples = np.ascontiguousarray(samples)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.entry_path(self.key(audio_file_path))
+        header = HEADER.pack(
+            MAGIC,
+            VERSION,
+            channels,
+            frame_rate,
+            samples.dtype.str.encode(),
+            samples.size // channels,
+        )
+
+        # Write under a private name and rename so readers never see a partial file.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as entry:
+                entry.write(header.ljust(DATA_OFFSET, b"\0"))
+                entry.write(samples.tobytes())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not cache decoded samples: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its budget."""
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if not entry.name.endswith(SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                # Workers that still map the entry keep their pages until they unmap.
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
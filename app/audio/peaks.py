@@ -0,0 +1,263 @@
+"""
+Peak finding building blocks for signals that arrive in blocks.
+
+They follow the rules of ``scipy.signal.find_peaks``: a peak is a sample, or
+the middle of a flat plateau, with strictly lower neighbours on both sides,
+and the first and last samples of the signal are never peaks. The distance
+rule visits peaks from the highest down like scipy, but breaks ties between
+equal heights from the left, so that a stream can apply it without knowing
+the whole signal.
+"""
+
+import numpy as np
+from scipy.signal import find_peaks
+
+# The compiled distance rule behind find_peaks, which takes any visiting order.
+from scipy.signal._peak_finding_utils import _select_by_peak_distance
+
+# Decision states of the candidates of PeakDetector.
+UNKNOWN, TAINTED, REMOVED, OPEN, KEPT = range(5)
+
+
+class LocalMaximaScanner:
+    """Find the local maxima of a signal fed one block after another."""
+
+    def __init__(self):
+        self.offset = 0
+        # Last run of equal values, still open until a different value arrives.
+        self.run_value = None
+        self.run_start = 0
+        # Value of the run before it, None while the open run touches the start.
+        self.before = None
+
+    def feed(self, block):
+        """
+        Scan the next block of the signal.
+
+        Args:
+            block (np.ndarray): Next samples of the signal
+
+        Returns:
+            tuple: (positions, values) of the maxima confirmed by this block
+        """
+        block = np.asarray(block)
+        if block.size == 0:
+            return np.empty(0, dtype=np.int64), block[:0]
+
+        # Run-length encode the block so plateaus are a single element.
+        starts = np.concatenate(([0], np.flatnonzero(block[1:] != block[:-1]) + 1))
+        values = block[starts]
+        starts = starts.astype(np.int64) + self.offset
+        before = self.before
+
+        if self.run_value is not None:
+            if values[0] == self.run_value:
+                starts[0] = self.run_start
+            else:
+                values = np.concatenate(([self.run_value], values))
+                starts = np.concatenate(([self.run_start], starts))
+        self.offset += block.size
+
+        # The last run stays open: the next block may extend it.
+        closed = values.size - 1
+        if closed > 0:
+            left = np.empty(closed, dtype=values.dtype)
+            left[1:] = values[: closed - 1]
+            # A run touching the start of the signal has no left neighbour.
+            left[0] = values[0] if before is None else before
+            current = values[:closed]
+            is_peak = (left < current) & (values[1:] < current)
+            if before is None:
+                is_peak[0] = False
+
+            ends = starts[1:] - 1
+            positions = (starts[:closed] + ends) // 2
+            positions, peak_values = positions[is_peak], current[is_peak]
+            self.before = values[-2]
+        else:
+            positions, peak_values = np.empty(0, dtype=np.int64), values[:0]
+
+        self.run_value = values[-1]
+        self.run_start = starts[-1]
+        return positions, peak_values
+
+
+def peak_order(heights):
+    """
+    Order in which the distance rule visits peaks.
+
+    Args:
+        heights (np.ndarray): Height of each peak, in position order
+
+    Returns:
+        np.ndarray: Indices from the highest peak down, the leftmost of equal
+        heights first
+    """
+    heights = np.asarray(heights)
+    # A stable sort of the reversed heights puts the rightmost of a tie first,
+    # which is last once the order is turned to descending.
+    return heights.size - 1 - np.argsort(heights[::-1], kind="stable")[::-1]
+
+
+def select_by_distance(peaks, heights, distance):
+    """
+    The distance rule of ``find_peaks``, visiting peaks in ``peak_order``.
+
+    Each kept peak removes its neighbours closer than ``distance``. Without
+    equal heights the result is that of ``find_peaks``.
+
+    Args:
+        peaks (np.ndarray): Sorted peak positions
+        heights (np.ndarray): Height of each peak
+        distance (int): Minimal horizontal distance between kept peaks
+
+    Returns:
+        np.ndarray: Boolean mask of the kept peaks
+    """
+    peaks = np.asarray(peaks)
+    if peaks.size < 2:
+        return np.ones(peaks.size, dtype=bool)
+
+    priority = np.empty(peaks.size, dtype=np.float64)
+    priority[peak_order(heights)] = np.arange(peaks.size, 0, -1)
+    return _select_by_peak_distance(
+        np.ascontiguousarray(peaks, dtype=np.intp), priority, float(distance)
+    ).astype(bool)
+
+
+def find_distant_peaks(signal, height, distance):
+    """
+    ``find_peaks(signal, height=height, distance=distance)`` with left ties.
+
+    Args:
+        signal (np.ndarray): Signal to search
+        height (float): Minimal peak height
+        distance (int): Minimal horizontal distance between peaks
+
+    Returns:
+        np.ndarray: Peak positions, as ``PeakDetector`` finds them
+    """
+    signal = np.asarray(signal)
+    peaks, _ = find_peaks(signal, height=height)
+    return peaks[select_by_distance(peaks, signal[peaks], distance)]
+
+
+class PeakDetector:
+    """
+    Incremental ``find_distant_peaks(signal, height, distance)``.
+
+    Blocks of the signal are fed one after another. The distance rule is run
+    over the candidates seen so far, and a candidate is decided once no
+    later sample can change it: its whole window of ``distance`` samples on
+    each side has been seen, and no undecided candidate ranked before it lies
+    in that window. Decided candidates are dropped, so only the undecided
+    ones near the end of the signal, and kept peaks waiting behind them to be
+    returned in order, are held. On real and noisy audio that is a few
+    windows' worth of candidates whatever the length.
+
+    A long run of peaks rising towards the end can keep more of them
+    undecided. Past ``max_open`` of them, they are decided as if the signal
+    ended there, so a later, higher peak closer than ``distance`` may then
+    be returned along with one it would have removed.
+    """
+
+    # Undecided candidates held at most, 1 MiB of positions and heights.
+    MAX_OPEN = 1 << 16
+
+    def __init__(self, height, distance, max_open=MAX_OPEN):
+        self.height = height
+        self.distance = int(np.ceil(distance))
+        self.max_open = max_open
+        self.scanner = LocalMaximaScanner()
+        # Undecided candidates, in position order.
+        self.positions = np.empty(0, dtype=np.int64)
+        self.heights = np.empty(0)
+        # Kept peaks after the first undecided candidate.
+        self.ready = np.empty(0, dtype=np.int64)
+
+    @property
+    def held(self):
+        """Number of candidates and peaks the detector currently holds."""
+        return self.positions.size + self.ready.size
+
+    def feed(self, block):
+        """
+        Process the next block of the signal.
+
+        Returns:
+            np.ndarray: Positions of the peaks settled by this block
+        """
+        positions, heights = self.scanner.feed(block)
+        above = heights >= self.height
+        if above.any():
+            self.positions = np.concatenate((self.positions, positions[above]))
+            # Heights keep the dtype of the signal, for any amount held.
+            heights = heights[above]
+            if self.heights.size:
+                heights = np.concatenate((self.heights, heights))
+            self.heights = heights
+        if self.positions.size == 0:
+            return self.positions
+
+        # Later candidates lie in the open run of the scanner, if it is high
+        # enough to become one, or in samples not seen yet.
+        run_value = self.scanner.run_value
+        if run_value is None or run_value < self.height:
+            frontier = self.scanner.offset
+        else:
+            frontier = self.scanner.run_start
+
+        settled = self.settle(frontier)
+        if self.positions.size > self.max_open:
+            settled = np.concatenate((settled, self.settle(np.inf)))
+        return settled
+
+    def finish(self):
+        """Settle the remaining candidates once the signal has ended."""
+        return self.settle(np.inf)
+
+    def settle(self, frontier):
+        """
+        Decide what can be of the held candidates.
+
+        Args:
+            frontier (float): Position from which later candidates may appear
+
+        Returns:
+            np.ndarray: Kept peaks before the first undecided candidate
+        """
+        positions = self.positions
+        lower = np.searchsorted(positions, positions - self.distance + 1)
+        upper = np.searchsorted(positions, positions + self.distance)
+        complete = positions + self.distance <= frontier
+
+        # A candidate alone in its window only waits for the window to end.
+        status = np.where(complete, KEPT, OPEN).astype(np.int8)
+        crowded = (upper - lower) > 1
+        status[crowded] = UNKNOWN
+        order = peak_order(self.heights)
+        for i in order[crowded[order]]:
+            if status[i] == REMOVED:
+                continue
+            window = status[lower[i] : upper[i]]
+            if status[i] == TAINTED or not complete[i]:
+                # Whether it stays depends on what comes later, and so does
+                # every lower candidate it could remove.
+                status[i] = OPEN
+                window[window == UNKNOWN] = TAINTED
+            else:
+                status[i] = KEPT
+                window[window < OPEN] = REMOVED
+
+        kept = positions[status == KEPT]
+        is_open = status == OPEN
+        self.positions, self.heights = positions[is_open], self.heights[is_open]
+
+        ready = np.concatenate((self.ready, kept))
+        ready.sort()
+        if self.positions.size == 0:
+            self.ready = ready[:0]
+            return ready
+        count = np.searchsorted(ready, self.positions[0])
+        self.ready = ready[count:]
+        return ready[:count]
@@ -0,0 +1,117 @@
+"""
+Binary renderers for the audio endpoints.
+
+Views put NumPy arrays in the response data when the accepted renderer packs
+arrays, and these renderers copy their buffers as they are instead of
+encoding one number at a time. Integer arrays go out as little-endian int32
+and float arrays as little-endian float32. JSON stays the default.
+"""
+
+import json
+import struct
+import decimal
+
+import msgpack
+import numpy as np
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+
+def packed_dtype(array):
+    """Wire type of an array: int32 for integers, float32 otherwise."""
+    return np.dtype("<i4") if array.dtype.kind in "biu" else np.dtype("<f4")
+
+
+def packs_arrays(request):
+    """Whether the response to ``request`` is rendered with packed arrays."""
+    renderer = getattr(request, "accepted_renderer", None)
+    return getattr(renderer, "packs_arrays", False)
+
+
+class MsgPackRenderer(BaseRenderer):
+    """
+    MessagePack with every array as a ``bin`` of its packed values.
+    """
+
+    media_type = "application/x-msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+    packs_arrays = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=self.default)
+
+    @staticmethod
+    def default(obj):
+        if isinstance(obj, np.ndarray):
+            return obj.astype(packed_dtype(obj), copy=False).tobytes()
+        if isinstance(obj, np.generic):
+            return obj.item()
+        if isinstance(obj, decimal.Decimal):
+            return float(obj)
+        if hasattr(obj, "isoformat"):
+            return obj.isoformat()
+        return str(obj)
+
+
+class ColumnarRenderer(BaseRenderer):
+    """
+    Raw little-endian columns behind a small JSON header.
+
+    The body is a uint32 header length, the UTF-8 JSON header padded to a
+    multiple of 4 bytes and then the columns back to back. In the header
+    every array is replaced by ``{"column": i, "dtype": "<i4" or "<f4",
+    "offset": o, "count": n}`` with ``o`` counted from the first column, so
+    clients can view each column without copying.
+    """
+
+    media_type = "application/vnd.ariakon.columnar"
+    format = "columnar"
+    charset = None
+    render_style = "binary"
+    packs_arrays = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        columns = []
+        size = 0
+
+        def replace(obj):
+            nonlocal size
+            if isinstance(obj, dict):
+                return {key: replace(value) for key, value in obj.items()}
+            if isinstance(obj, (list, tuple)):
+                return [replace(value) for value in obj]
+            if isinstance(obj, np.ndarray):
+                column = obj.astype(packed_dtype(obj), copy=False).ravel()
+                entry = {
+                    "column": len(columns),
+                    "dtype": column.dtype.str,
+                    "offset": size,
+                    "count": int(column.size),
+                }
+                columns.append(column)
+                size += column.nbytes
+                return entry
+            return obj
+
+        header = json.dumps(replace(data), cls=encoders.JSONEncoder).encode()
+        header += b" " * (-(len(header) + 4) % 4)
+        # Every column is 4 bytes wide, so they stay aligned back to back.
+        return b"".join(
+            [struct.pack("<I", len(header)), header]
+            + [column.tobytes() for column in columns]
+        )
+
+
+AUDIO_RENDERER_CLASSES = [
+    *api_settings.DEFAULT_RENDERER_CLASSES,
+    MsgPackRenderer,
+    ColumnarRenderer,
+]
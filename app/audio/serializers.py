@@ -1,5 +1,33 @@
+import os
+import re
+
+import numpy as np
+from django.conf import settings
 from rest_framework import serializers
-from core.models import AudioFile
+from core.models import AudioFile, AudioUpload
+from .analysis import get_analysis, get_envelope
+from .envelope import DEFAULT_POINTS, MAX_POINTS
+from .renderers import packs_arrays
+from .uploads import create_upload
+from .utils import format_values
+
+SUPPORTED_EXTENSIONS = (".wav", ".mp3", ".flac")
+
+
+def requested_points(request):
+    """Envelope width asked for with ``?points=N``, within sane bounds."""
+    try:
+        points = int(request.query_params.get("points", DEFAULT_POINTS))
+    except (TypeError, ValueError):
+        points = DEFAULT_POINTS
+    return min(max(points, 1), MAX_POINTS)
+
+
+def format_peaks(peaks, packed=False):
+    """Peaks as ``[{"value": index}]``, or one array for binary renderers."""
+    if packed:
+        return np.asarray(peaks, dtype=np.int32)
+    return format_values(peaks)
 
 
 class AudioFileSerializer(serializers.ModelSerializer):
@@ -11,12 +39,76 @@ class AudioFileSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         return AudioFile.objects.create(**validated_data)
 
+    def to_representation(self, instance):
+        """Add the stored analysis result to the audio file data"""
+        data = super().to_representation(instance)
+        analysis = get_analysis(instance)
+        request = self.context.get("request")
+        points = requested_points(request) if request else DEFAULT_POINTS
+        packed = packs_arrays(request)
+        data.update(
+            {
+                "speed_mps": analysis.speed_mps,
+                "speed_unit": "m/s",
+                "peaks": format_peaks(analysis.peaks, packed),
+                "speed_mph": analysis.speed_mph,
+                "unit_mph": "MPH",
+                "envelope": get_envelope(analysis).as_dict(points, packed),
+                "analysis_status": analysis.status,
+            }
+        )
+        return data
+
     def validate_distance(self, value):
         if value <= 0:
             raise serializers.ValidationError("Distance must be greater than zero.")
         return value
 
     def validate_file(self, value):
-        if not value.name.endswith(('.wav', '.mp3', '.flac')):
+        if not value.name.endswith(SUPPORTED_EXTENSIONS):
             raise serializers.ValidationError("File type not supported.")
         return value
+
+
+class AudioUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AudioUpload
+        fields = [
+            "id",
+            "file_name",
+            "size",
+            "offset",
+            "sha256",
+            "unit",
+            "distance",
+            "created_at",
+        ]
+        read_only_fields = ["id", "offset", "created_at"]
+
+    def create(self, validated_data):
+        return create_upload(user=self.context["request"].user, **validated_data)
+
+    def validate_distance(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Distance must be greater than zero.")
+        return value
+
+    def validate_file_name(self, value):
+        # Only the name is kept: directories sent by the client are dropped,
+        # and the storage shortens it to fit AudioFile.file if needed.
+        value = os.path.basename(value.replace("\\", "/"))
+        if not value.endswith(SUPPORTED_EXTENSIONS):
+            raise serializers.ValidationError("File type not supported.")
+        return value
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.AUDIO_UPLOAD_MAX_BYTES:
+            raise serializers.ValidationError(
+                f"Size must be between 1 and {settings.AUDIO_UPLOAD_MAX_BYTES} bytes."
+            )
+        return value
+
+    def validate_sha256(self, value):
+        if value and not re.fullmatch(r"[0-9a-fA-F]{64}", value):
+            raise serializers.ValidationError("Expected a hex SHA-256 digest.")
+        return value.lower()
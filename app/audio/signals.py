@@ -0,0 +1,73 @@
+"""
+Keep the per-user SpeedSummary and response cache in step with audio files
+and their analyses.
+"""
+
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from core.models import AudioAnalysis, AudioFile
+
+from .cache import invalidate_responses
+from .summary import record_changes, summary_state, take_change
+
+
+@receiver(post_init, sender=AudioAnalysis)
+def remember_contribution(sender, instance, **kwargs):
+    """Snapshot what a loaded analysis contributes, to diff against on save."""
+    if instance.pk is not None:
+        instance._summary_state = summary_state(instance)
+
+
+@receiver(post_save, sender=AudioAnalysis)
+def analysis_saved(sender, instance, raw=False, **kwargs):
+    before, after = take_change(instance)
+    if not raw and before != after:
+        record_changes(instance.audio_file.user_id, [(before, after)])
+
+
+@receiver(pre_delete, sender=AudioAnalysis)
+def remember_owner(sender, instance, **kwargs):
+    """The file may be deleted in the same cascade, so look its owner up first."""
+    instance._summary_user_id = (
+        AudioFile.objects.filter(pk=instance.audio_file_id)
+        .values_list("user_id", flat=True)
+        .first()
+    )
+
+
+@receiver(post_delete, sender=AudioAnalysis)
+def analysis_deleted(sender, instance, **kwargs):
+    before, after = take_change(instance, deleted=True)
+    user_id = getattr(instance, "_summary_user_id", None)
+    if user_id is not None and before != after:
+        record_changes(user_id, [(before, after)])
+
+
+@receiver(post_save, sender=AudioFile)
+def audio_file_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_changes(instance.user_id, files=1, rebuild_missing=True)
+
+
+@receiver(post_delete, sender=AudioFile)
+def audio_file_deleted(sender, instance, **kwargs):
+    record_changes(instance.user_id, files=-1)
+
+
+@receiver(post_save, sender=AudioFile)
+@receiver(post_delete, sender=AudioFile)
+def audio_file_changed(sender, instance, **kwargs):
+    invalidate_responses(instance.user_id, instance.id)
+
+
+@receiver(post_save, sender=AudioAnalysis)
+def analysis_changed(sender, instance, **kwargs):
+    invalidate_responses(instance.audio_file.user_id, instance.audio_file_id)
+
+
+@receiver(post_delete, sender=AudioAnalysis)
+def analysis_removed(sender, instance, **kwargs):
+    user_id = getattr(instance, "_summary_user_id", None)
+    if user_id is not None:
+        invalidate_responses(user_id, instance.audio_file_id)
@@ -0,0 +1,136 @@
+"""
+Per-user speed totals, maintained alongside the analysis results.
+
+Every analysis contributes ``(processed, speed)`` to the SpeedSummary of its
+owner. Changes are applied as deltas under a row lock, so the statistics
+header never has to scan the user's recordings.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+
+from core.models import AudioAnalysis, AudioFile, SpeedSummary
+
+from .cache import invalidate_responses
+
+# Contribution of a file that has no analysis yet.
+NO_ANALYSIS = (False, None)
+
+COUNTED_SPEED = Q(speed_mph__gt=0)
+
+
+def summary_state(analysis):
+    """What an analysis contributes to the summary: (processed, speed or None)."""
+    processed = analysis.status != AudioAnalysis.STATUS_PENDING
+    speed = analysis.speed_mph
+    return processed, speed if speed and speed > 0 else None
+
+
+def take_change(analysis, deleted=False):
+    """(before, after) contribution of an analysis since it was last recorded."""
+    before = getattr(analysis, "_summary_state", NO_ANALYSIS)
+    after = NO_ANALYSIS if deleted else summary_state(analysis)
+    analysis._summary_state = after
+    return before, after
+
+
+def record_changes(user_id, changes=(), files=0, rebuild_missing=False):
+    """
+    Apply contribution changes and a file count delta to one user's summary.
+
+    Args:
+        user_id (int): Owner of the changed files
+        changes (list): (before, after) contributions of changed analyses
+        files (int): Number of files added (or removed, if negative)
+        rebuild_missing (bool): Build the row from scratch if it does not exist
+    """
+    with transaction.atomic():
+        summary = (
+            SpeedSummary.objects.select_for_update().filter(user_id=user_id).first()
+        )
+        if summary is None:
+            # Rows are only created on upload, never while a user is deleted.
+            if rebuild_missing:
+                rebuild_summary(user_id)
+            return
+
+        summary.total_files += files
+        stale = False
+        for (was_processed, old_speed), (processed, speed) in changes:
+            summary.processed_files += processed - was_processed
+            if old_speed is not None:
+                summary.speed_count -= 1
+                summary.speed_sum -= old_speed
+                summary.speed_sum_squares -= old_speed**2
+                stale = stale or old_speed in (summary.speed_min, summary.speed_max)
+            if speed is not None:
+                summary.speed_count += 1
+                summary.speed_sum += speed
+                summary.speed_sum_squares += speed**2
+                if summary.speed_min is None or speed < summary.speed_min:
+                    summary.speed_min = speed
+                if summary.speed_max is None or speed > summary.speed_max:
+                    summary.speed_max = speed
+
+        if not summary.speed_count:
+            summary.speed_sum = summary.speed_sum_squares = 0
+            summary.speed_min = summary.speed_max = None
+        elif stale:
+            # A removed extreme can only be replaced by looking at the others.
+            extremes = AudioAnalysis.objects.filter(
+                COUNTED_SPEED, audio_file__user_id=user_id
+            ).aggregate(speed_min=Min("speed_mph"), speed_max=Max("speed_mph"))
+            summary.speed_min = extremes["speed_min"]
+            summary.speed_max = extremes["speed_max"]
+        summary.save()
+
+
+def record_analyses(analyses):
+    """Record analyses written with bulk queries, which send no signals."""
+    changes = defaultdict(list)
+    for analysis in analyses:
+        before, after = take_change(analysis)
+        if before != after:
+            changes[analysis.audio_file.user_id].append((before, after))
+    for user_id, user_changes in changes.items():
+        record_changes(user_id, user_changes)
+
+
+def rebuild_summary(user_id):
+    """Recompute the summary of a user from the stored analyses."""
+    with transaction.atomic():
+        SpeedSummary.objects.select_for_update().filter(user_id=user_id).first()
+        totals = AudioAnalysis.objects.filter(audio_file__user_id=user_id).aggregate(
+            processed_files=Count("pk", filter=~Q(status=AudioAnalysis.STATUS_PENDING)),
+            speed_count=Count("pk", filter=COUNTED_SPEED),
+            speed_sum=Sum("speed_mph", filter=COUNTED_SPEED),
+            speed_sum_squares=Sum(
+                F("speed_mph") * F("speed_mph"), filter=COUNTED_SPEED
+            ),
+            speed_min=Min("speed_mph", filter=COUNTED_SPEED),
+            speed_max=Max("speed_mph", filter=COUNTED_SPEED),
+        )
+        summary, _ = SpeedSummary.objects.update_or_create(
+            user_id=user_id,
+            defaults={
+                "total_files": AudioFile.objects.filter(user_id=user_id).count(),
+                "processed_files": totals["processed_files"],
+                "speed_count": totals["speed_count"],
+                "speed_sum": totals["speed_sum"] or 0,
+                "speed_sum_squares": totals["speed_sum_squares"] or 0,
+                "speed_min": totals["speed_min"],
+                "speed_max": totals["speed_max"],
+            },
+        )
+        invalidate_responses(user_id)
+    return summary
+
+
+def get_summary(user):
+    """The summary of a user, built on first use for data that predates it."""
+    summary = SpeedSummary.objects.filter(user=user).first()
+    if summary is None:
+        summary = rebuild_summary(user.id)
+    return summary
@@ -1,9 +1,38 @@
-from django.test import TestCase
+import os
+import json
+import tempfile
+import wave
+import struct
+import time
+import hashlib
+import multiprocessing
+from datetime import timedelta
+from unittest.mock import patch
+
+import msgpack
+import numpy as np
+import soundfile
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.urls import reverse
-from core.models import AudioFile
+from core.models import (
+    AnalysisJob,
+    AudioAnalysis,
+    AudioFile,
+    AudioUpload,
+    SpeedSummary,
+)
+from audio.analysis import run_analysis, run_batch_analysis
+from audio.cache import invalidate_responses
+from audio.canonical import canonical_path
+from audio.timing import ServerTimingMiddleware
+from audio.utils import ANALYSIS_VERSION, analyze_audio
+from audio.worker import heartbeat, refresh_lock, requeue_stale_jobs, run_worker
 from io import BytesIO
 from django.core.files.uploadedfile import SimpleUploadedFile
 
@@ -11,18 +40,53 @@ User = get_user_model()
 
 # Define URLs using their names
 AUDIO_FILE_URL = reverse("audio:audiofile-list-create")
+AUDIO_STATISTICS_URL = reverse("audio:audio-statistics")
+AUDIO_BATCH_URL = reverse("audio:audiofile-batch")
+AUDIO_UPLOAD_URL = reverse("audio:audioupload-create")
+
+
+def create_click_audio_file(
+    name="clicks.wav", frame_rate=44100, clicks=(10000, 30000), length=44100
+):
+    """Create a silent mono WAV upload with single sample clicks."""
+    samples = np.zeros(length, dtype="<i2")
+    samples[list(clicks)] = 20000
+    buffer = BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(frame_rate)
+        wav.writeframes(samples.tobytes())
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="audio/wav")
+
+
+def hang(*args, **kwargs):
+    """Stand-in for an analysis that never finishes in time."""
+    time.sleep(60)
+
+
+def run_analysis_jobs():
+    """Drain the analysis queue like a background worker would."""
+    return run_worker(worker_id="test-worker", burst=True)
+
+
+def create_user(**params):
+    """Create and return a new user."""
+    return User.objects.create_user(**params)
+
 
+class AuthenticatedTestCase(TestCase):
+    """Requests are made as a fresh user, authenticated on the test client."""
 
-class AudioFileTests(TestCase):
     def setUp(self):
         self.client = APIClient()
-        self.user = User.objects.create_user(
-            email="testuser@example.com",
-            name="Test User",
-            password="password123",
-            phone_number="03459100704",
-        )
+        self.user = create_user(email="audio@example.com", password="password123")
         self.client.force_authenticate(user=self.user)
+
+
+class AudioFileTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
         self.distance = 60.0
 
     def create_test_audio_file(self):
@@ -40,9 +104,10 @@ class AudioFileTests(TestCase):
         }
         res = self.client.post(AUDIO_FILE_URL, payload)
 
-        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
         self.assertEqual(AudioFile.objects.count(), 1)
         self.assertEqual(AudioFile.objects.get().user, self.user)
+        self.assertEqual(res.data["analysis_status"], AudioAnalysis.STATUS_PENDING)
 
     def test_audio_file_detail_url(self):
         """Test retrieving an audio file detail URL works."""
@@ -96,7 +161,7 @@ class AudioFileTests(TestCase):
         res = self.client.get(AUDIO_FILE_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 2)
+        self.assertEqual(len(res.data["results"]), 2)
 
     def test_retrieve_audio_file_detail(self):
         """Test retrieving a single audio file detail."""
@@ -133,3 +198,1046 @@ class AudioFileTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(AudioFile.objects.count(), 0)
+
+
+class AudioAnalysisStorageTests(AuthenticatedTestCase):
+    """Test analysis results are stored once and served from the database."""
+
+    def test_create_stores_analysis(self):
+        """Test creating an audio file stores its analysis result."""
+        res = self.client.post(
+            AUDIO_FILE_URL,
+            {"file": create_click_audio_file(), "distance": 20.0, "unit": "meters"},
+        )
+        run_analysis_jobs()
+        detail_url = reverse("audio:audiofile-detail", args=[res.data["id"]])
+        res = self.client.get(detail_url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        analysis = AudioAnalysis.objects.get(audio_file_id=res.data["id"])
+        self.assertEqual(analysis.status, AudioAnalysis.STATUS_DONE)
+        self.assertEqual(analysis.peaks, [10000, 30000])
+        self.assertEqual(analysis.frame_rate, 44100)
+        self.assertEqual(analysis.speed_mps, 44.1)
+        self.assertEqual(res.data["speed_mps"], 44.1)
+        self.assertEqual(res.data["peaks"], [{"value": 10000}, {"value": 30000}])
+        self.assertEqual(max(res.data["envelope"]["max"]), 20000)
+
+    def test_envelope_width_follows_points(self):
+        """Test the envelope payload is bounded by the requested width."""
+        res = self.client.post(
+            AUDIO_FILE_URL, {"file": create_click_audio_file(), "distance": 20.0}
+        )
+        run_analysis_jobs()
+        detail_url = reverse("audio:audiofile-detail", args=[res.data["id"]])
+
+        res = self.client.get(detail_url, {"points": 100})
+
+        envelope = res.data["envelope"]
+        self.assertLessEqual(len(envelope["min"]), 100)
+        self.assertEqual(len(envelope["min"]), len(envelope["max"]))
+        self.assertGreater(len(envelope["min"]), 50)
+
+    def test_list_and_statistics_do_not_decode(self):
+        """Test read endpoints serve stored results without decoding audio."""
+        for distance in (10.0, 20.0):
+            self.client.post(
+                AUDIO_FILE_URL,
+                {"file": create_click_audio_file(), "distance": distance},
+            )
+        run_analysis_jobs()
+
+        with patch("audio.analysis.analyze_audio") as analyze:
+            # The ETag aggregate and the page itself.
+            with self.assertNumQueries(2):
+                res = self.client.get(AUDIO_FILE_URL)
+            stats = self.client.get(AUDIO_STATISTICS_URL)
+
+        analyze.assert_not_called()
+        self.assertEqual(len(res.data["results"]), 2)
+        self.assertEqual(stats.data["processed_files"], 2)
+
+    def test_update_distance_recomputes_speed_without_decoding(self):
+        """Test changing the distance reuses the stored peaks."""
+        res = self.client.post(
+            AUDIO_FILE_URL,
+            {"file": create_click_audio_file(), "distance": 20.0, "unit": "meters"},
+        )
+        run_analysis_jobs()
+        detail_url = reverse("audio:audiofile-detail", args=[res.data["id"]])
+
+        with patch("audio.analysis.analyze_audio") as analyze:
+            res = self.client.patch(detail_url, {"distance": 40.0})
+
+        analyze.assert_not_called()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["speed_mps"], 88.2)
+
+
+class CanonicalCopyApiTests(AuthenticatedTestCase):
+    """Test compressed uploads are decoded once for all their analyses."""
+
+    def setUp(self):
+        super().setUp()
+        samples = np.zeros(44100, dtype=np.int16)
+        samples[[10000, 30000]] = 20000
+        buffer = BytesIO()
+        soundfile.write(buffer, samples, 44100, format="FLAC", subtype="PCM_16")
+        res = self.client.post(
+            AUDIO_FILE_URL,
+            {
+                "file": SimpleUploadedFile("clicks.flac", buffer.getvalue()),
+                "distance": 20.0,
+                "unit": "meters",
+            },
+        )
+        run_analysis_jobs()
+        self.audio_file = AudioFile.objects.get(id=res.data["id"])
+
+    def test_reanalysis_reads_the_copy(self):
+        """Test later analyses use the copy and keep the original."""
+        self.assertTrue(os.path.exists(canonical_path(self.audio_file)))
+
+        with patch("audio.utils.decode_flac") as decode:
+            analysis = run_analysis(self.audio_file)
+
+        decode.assert_not_called()
+        self.assertEqual(analysis.peaks, [10000, 30000])
+        self.assertEqual(analysis.speed_mps, 44.1)
+        self.assertTrue(self.audio_file.file.name.endswith(".flac"))
+
+    def test_copy_is_deleted_with_the_file(self):
+        """Test deleting the file removes its copy."""
+        copy = canonical_path(self.audio_file)
+
+        self.client.delete(reverse("audio:audiofile-detail", args=[self.audio_file.id]))
+
+        self.assertFalse(os.path.exists(copy))
+
+
+@override_settings(AUDIO_ANALYZE_DURING_UPLOAD=False)
+class AnalysisQueueTests(AuthenticatedTestCase):
+    """Test the background analysis queue."""
+
+    def test_create_queues_analysis_without_decoding(self):
+        """Test uploads are accepted without decoding inside the request."""
+        with patch("audio.analysis.analyze_audio") as analyze:
+            res = self.client.post(
+                AUDIO_FILE_URL, {"file": create_click_audio_file(), "distance": 5.0}
+            )
+
+        analyze.assert_not_called()
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIn(f"/audio-files/{res.data['id']}/", res["Location"])
+        job = AnalysisJob.objects.get(audio_file_id=res.data["id"])
+        self.assertEqual(job.status, AnalysisJob.STATUS_QUEUED)
+
+    def test_worker_completes_jobs(self):
+        """Test the worker analyses queued files and finishes the jobs."""
+        res = self.client.post(
+            AUDIO_FILE_URL, {"file": create_click_audio_file(), "distance": 5.0}
+        )
+
+        self.assertEqual(run_analysis_jobs(), 1)
+        job = AnalysisJob.objects.get(audio_file_id=res.data["id"])
+        self.assertEqual(job.status, AnalysisJob.STATUS_DONE)
+        self.assertEqual(job.attempts, 1)
+        analysis = AudioAnalysis.objects.get(audio_file_id=res.data["id"])
+        self.assertEqual(analysis.status, AudioAnalysis.STATUS_DONE)
+
+    def test_undecodable_file_fails_job(self):
+        """Test a file that cannot be decoded is not retried."""
+        res = self.client.post(
+            AUDIO_FILE_URL,
+            {
+                "file": SimpleUploadedFile("broken.wav", b"Dummy audio data"),
+                "distance": 5.0,
+            },
+        )
+
+        run_analysis_jobs()
+
+        job = AnalysisJob.objects.get(audio_file_id=res.data["id"])
+        self.assertEqual(job.status, AnalysisJob.STATUS_FAILED)
+        analysis = AudioAnalysis.objects.get(audio_file_id=res.data["id"])
+        self.assertEqual(analysis.status, AudioAnalysis.STATUS_FAILED)
+
+    def test_unexpected_error_is_retried(self):
+        """Test jobs are requeued with a delay when the worker raises."""
+        self.client.post(
+            AUDIO_FILE_URL, {"file": create_click_audio_file(), "distance": 5.0}
+        )
+
+        with patch("audio.worker.run_analysis", side_effect=RuntimeError("boom")):
+            run_analysis_jobs()
+
+        job = AnalysisJob.objects.get()
+        self.assertEqual(job.status, AnalysisJob.STATUS_QUEUED)
+        self.assertEqual(job.last_error, "boom")
+        self.assertEqual(run_analysis_jobs(), 0)
+
+    def claim_stale_jobs(self, *attempts):
+        """Jobs held by a worker that went quiet an hour ago."""
+        jobs = []
+        for count in attempts:
+            res = self.client.post(
+                AUDIO_FILE_URL, {"file": create_click_audio_file(), "distance": 5.0}
+            )
+            job = AnalysisJob.objects.get(audio_file_id=res.data["id"])
+            job.status = AnalysisJob.STATUS_RUNNING
+            job.locked_by = "gone-worker"
+            job.locked_at = timezone.now() - timedelta(hours=1)
+            job.attempts = count
+            job.save()
+            jobs.append(job)
+        return jobs
+
+    @override_settings(AUDIO_ANALYSIS_MAX_ATTEMPTS=3)
+    def test_stale_jobs_fail_once_out_of_attempts(self):
+        """Test abandoned jobs are requeued, or failed after the last attempt."""
+        retried, exhausted = self.claim_stale_jobs(1, 3)
+
+        self.assertEqual(requeue_stale_jobs(), 2)
+
+        retried.refresh_from_db()
+        exhausted.refresh_from_db()
+        self.assertEqual(retried.status, AnalysisJob.STATUS_QUEUED)
+        self.assertEqual(exhausted.status, AnalysisJob.STATUS_FAILED)
+        self.assertIn("3 attempts", exhausted.last_error)
+        analysis = AudioAnalysis.objects.get(audio_file_id=exhausted.audio_file_id)
+        self.assertEqual(analysis.status, AudioAnalysis.STATUS_FAILED)
+        self.assertEqual(SpeedSummary.objects.get(user=self.user).processed_files, 1)
+
+    def test_heartbeat_keeps_long_jobs_locked(self):
+        """Test a job whose lock is refreshed is not taken for abandoned."""
+        (job,) = self.claim_stale_jobs(1)
+
+        with patch("audio.worker.refresh_lock") as refresh:
+            with heartbeat(job, interval=0.01):
+                deadline = time.monotonic() + 5
+                while not refresh.called and time.monotonic() < deadline:
+                    time.sleep(0.01)
+        refresh.assert_called_with(job)
+
+        self.assertEqual(refresh_lock(job), 1)
+        self.assertEqual(requeue_stale_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.STATUS_RUNNING)
+
+
+class AnalysisWhileUploadingTests(AuthenticatedTestCase):
+    """Test WAV uploads are analysed while the request body arrives."""
+
+    def test_wav_upload_is_analysed_without_a_job(self):
+        """Test the result is stored with the upload, without decoding again."""
+        with patch("audio.analysis.analyze_audio") as analyze:
+            res = self.client.post(
+                AUDIO_FILE_URL,
+                {
+                    "file": create_click_audio_file(),
+                    "distance": 20.0,
+                    "unit": "meters",
+                },
+            )
+
+        analyze.assert_not_called()
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertIn(f"/audio-files/{res.data['id']}/", res["Location"])
+        self.assertEqual(res.data["analysis_status"], AudioAnalysis.STATUS_DONE)
+        self.assertEqual(res.data["speed_mps"], 44.1)
+        self.assertFalse(AnalysisJob.objects.exists())
+
+        tile = self.client.get(
+            reverse("audio:audiofile-waveform", args=[res.data["id"]])
+        )
+        self.assertEqual(tile.status_code, status.HTTP_200_OK)
+
+    def test_replaced_file_is_analysed_on_arrival(self):
+        """Test a file replaced through the detail view is analysed too."""
+        res = self.client.post(
+            AUDIO_FILE_URL, {"file": create_click_audio_file(), "distance": 20.0}
+        )
+
+        res = self.client.patch(
+            reverse("audio:audiofile-detail", args=[res.data["id"]]),
+            {"file": create_click_audio_file(clicks=(1000, 23050))},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            AudioAnalysis.objects.get(audio_file_id=res.data["id"]).peaks,
+            [1000, 23050],
+        )
+
+    def test_other_uploads_are_queued(self):
+        """Test files that are not PCM WAV still go to the workers."""
+        res = self.client.post(
+            AUDIO_FILE_URL,
+            {
+                "file": SimpleUploadedFile("broken.wav", b"Dummy audio data"),
+                "distance": 5.0,
+            },
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(AnalysisJob.objects.filter(audio_file_id=res.data["id"]))
+
+
+class BatchUploadTests(AuthenticatedTestCase):
+    """Test a session of clips is created and analysed in one request."""
+
+    def test_batch_is_analysed_in_the_request(self):
+        """Test every file of a batch comes back with its own result."""
+        res = self.client.post(
+            AUDIO_BATCH_URL,
+            {
+                "files": [
+                    create_click_audio_file("first.wav"),
+                    create_click_audio_file("second.wav", clicks=(1000, 23050)),
+                ],
+                "distance": [20.0, 10.0],
+                "unit": "meters",
+            },
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        first, second = res.data["results"]
+        self.assertEqual(first["speed_mps"], 44.1)
+        self.assertEqual(second["speed_mps"], 20.0)
+        self.assertEqual(second["analysis_status"], AudioAnalysis.STATUS_DONE)
+        self.assertEqual(AudioFile.objects.filter(user=self.user).count(), 2)
+        self.assertFalse(AnalysisJob.objects.exists())
+
+    def test_per_file_errors(self):
+        """Test invalid and undecodable files do not fail the whole batch."""
+        res = self.client.post(
+            AUDIO_BATCH_URL,
+            {
+                "files": [
+                    create_click_audio_file(),
+                    SimpleUploadedFile("notes.txt", b"text"),
+                    SimpleUploadedFile("broken.wav", b"Dummy audio data"),
+                ],
+                "distance": 5.0,
+            },
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        ok, invalid, broken = res.data["results"]
+        self.assertEqual(ok["analysis_status"], AudioAnalysis.STATUS_DONE)
+        self.assertIn("file", invalid["errors"])
+        self.assertEqual(broken["analysis_status"], AudioAnalysis.STATUS_FAILED)
+        self.assertTrue(broken["error"])
+        self.assertEqual(AudioFile.objects.count(), 2)
+
+    def test_mismatched_distances(self):
+        """Test distances must be shared or given once per file."""
+        res = self.client.post(
+            AUDIO_BATCH_URL,
+            {
+                "files": [create_click_audio_file(), create_click_audio_file()],
+                "distance": [1.0, 2.0, 3.0],
+            },
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(AudioFile.objects.count(), 0)
+
+
+@override_settings(AUDIO_ANALYZE_DURING_UPLOAD=False)
+class StatisticsAnalysisTests(AuthenticatedTestCase):
+    """Test statistics analyse missing results within a deadline."""
+
+    def setUp(self):
+        super().setUp()
+        for distance in (10.0, 20.0):
+            self.client.post(
+                AUDIO_FILE_URL,
+                {"file": create_click_audio_file(), "distance": distance},
+            )
+        # Results of an older analysis, not queued for a worker yet.
+        run_analysis_jobs()
+        AudioAnalysis.objects.update(algorithm_version=ANALYSIS_VERSION - 1)
+
+    def test_outdated_files_are_analysed(self):
+        """Test files without an up-to-date result are analysed in parallel."""
+        res = self.client.get(AUDIO_STATISTICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["processed_files"], 2)
+        self.assertEqual(res.data["pending_files"], 0)
+        self.assertGreater(res.data["min_speed"], 0)
+        self.assertFalse(
+            AudioAnalysis.objects.filter(
+                algorithm_version__lt=ANALYSIS_VERSION
+            ).exists()
+        )
+        self.assertEqual(run_analysis_jobs(), 0)
+
+    @override_settings(AUDIO_STATISTICS_DEADLINE=0)
+    def test_deadline_returns_partial_results(self):
+        """Test files not analysed in time are reported as pending."""
+        res = self.client.get(AUDIO_STATISTICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["processed_files"], 0)
+        self.assertEqual(res.data["pending_files"], 2)
+        self.assertEqual(res.data["total_files"], 2)
+        self.assertEqual(
+            [entry["analysis_status"] for entry in res.data["audio_statistics"]],
+            [AudioAnalysis.STATUS_PENDING] * 2,
+        )
+        self.assertEqual(run_analysis_jobs(), 2)
+
+    @override_settings(AUDIO_STATISTICS_DEADLINE=0)
+    def test_queued_files_are_left_to_the_worker(self):
+        """Test polling does not analyse again what a deadline queued."""
+        etag = self.client.get(AUDIO_STATISTICS_URL)["ETag"]
+
+        with patch("audio.views.run_batch_analysis") as run_batch:
+            res = self.client.get(AUDIO_STATISTICS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        run_batch.assert_not_called()
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_running_files_are_left_to_the_worker(self):
+        """Test files a worker is analysing are not analysed again."""
+        for audio_file in AudioFile.objects.all():
+            AnalysisJob.objects.create(
+                audio_file=audio_file, status=AnalysisJob.STATUS_RUNNING
+            )
+
+        with patch("audio.views.run_batch_analysis") as run_batch:
+            res = self.client.get(AUDIO_STATISTICS_URL)
+
+        run_batch.assert_not_called()
+        self.assertEqual(res.data["total_files"], 2)
+
+    def test_etag_describes_the_analysed_state(self):
+        """Test the ETag is taken after the analysis, not before it."""
+        res = self.client.get(AUDIO_STATISTICS_URL)
+
+        with self.assertNumQueries(1):
+            again = self.client.get(
+                AUDIO_STATISTICS_URL, HTTP_IF_NONE_MATCH=res["ETag"]
+            )
+
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_deadline_kills_the_analysis(self):
+        """Test an analysis past the deadline does not keep running."""
+        audio_file = AudioFile.objects.first()
+        started = time.monotonic()
+
+        with patch("audio.analysis.analyze_audio", hang):
+            analyses = run_batch_analysis([audio_file], timeout=0.5)
+
+        self.assertLess(time.monotonic() - started, 30)
+        self.assertEqual(analyses, [])
+        self.assertTrue(
+            AnalysisJob.objects.filter(
+                audio_file=audio_file, status=AnalysisJob.STATUS_QUEUED
+            ).exists()
+        )
+        self.assertEqual(multiprocessing.active_children(), [])
+
+
+class KeysetPaginationTests(AuthenticatedTestCase):
+    """Test the list is served page by page through a cursor."""
+
+    def setUp(self):
+        super().setUp()
+        self.files = [
+            AudioFile.objects.create(
+                user=self.user,
+                file=SimpleUploadedFile("clip.wav", b"Dummy audio data"),
+                distance=distance,
+            )
+            for distance in range(1, 6)
+        ]
+
+    def test_pages_follow_the_cursor(self):
+        """Test following next links yields every file once, newest first."""
+        ids = []
+        url = AUDIO_FILE_URL
+        params = {"page_size": 2}
+        while url:
+            res = self.client.get(url, params)
+            self.assertLessEqual(len(res.data["results"]), 2)
+            ids += [item["id"] for item in res.data["results"]]
+            url, params = res.data["next"], None
+
+        self.assertEqual(ids, [audio_file.id for audio_file in reversed(self.files)])
+
+    def test_equal_timestamps_are_split_by_id(self):
+        """Test rows sharing an updated_at are neither skipped nor repeated."""
+        AudioFile.objects.update(updated_at=self.files[0].updated_at)
+
+        first = self.client.get(AUDIO_FILE_URL, {"page_size": 3})
+        second = self.client.get(first.data["next"])
+
+        ids = [item["id"] for item in first.data["results"] + second.data["results"]]
+        self.assertEqual(ids, [audio_file.id for audio_file in reversed(self.files)])
+        self.assertIsNone(second.data["next"])
+
+    def test_updated_file_moves_to_the_front(self):
+        """Test the list is ordered by the latest change."""
+        self.files[0].distance = 9
+        self.files[0].save()
+
+        res = self.client.get(AUDIO_FILE_URL, {"page_size": 1})
+
+        self.assertEqual(res.data["results"][0]["id"], self.files[0].id)
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is rejected."""
+        res = self.client.get(AUDIO_FILE_URL, {"cursor": "not-a-cursor"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ConditionalGetTests(AuthenticatedTestCase):
+    """Test polling clients get 304 while nothing changed."""
+
+    def setUp(self):
+        super().setUp()
+        res = self.client.post(
+            AUDIO_FILE_URL, {"file": create_click_audio_file(), "distance": 20.0}
+        )
+        run_analysis_jobs()
+        self.detail_url = reverse("audio:audiofile-detail", args=[res.data["id"]])
+
+    def test_unchanged_responses_are_not_modified(self):
+        """Test a matching ETag costs one aggregate query and no decoding."""
+        for url in (AUDIO_FILE_URL, self.detail_url, AUDIO_STATISTICS_URL):
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertTrue(res["Last-Modified"])
+
+            with patch("audio.analysis.analyze_audio") as analyze:
+                with self.assertNumQueries(1):
+                    cached = self.client.get(url, HTTP_IF_NONE_MATCH=res["ETag"])
+
+            analyze.assert_not_called()
+            self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(cached["ETag"], res["ETag"])
+
+    def test_changes_invalidate_the_etag(self):
+        """Test edits, new files and analyses all change the ETag."""
+        etag = self.client.get(AUDIO_STATISTICS_URL)["ETag"]
+
+        self.client.patch(self.detail_url, {"distance": 40.0})
+        res = self.client.get(AUDIO_STATISTICS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+
+        etag = res["ETag"]
+        self.client.post(
+            AUDIO_FILE_URL, {"file": create_click_audio_file(), "distance": 5.0}
+        )
+        res = self.client.get(AUDIO_STATISTICS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_deletes_move_the_last_modification(self):
+        """Test a delete makes If-Modified-Since clients fetch lists again."""
+        res = self.client.post(
+            AUDIO_FILE_URL, {"file": create_click_audio_file(), "distance": 5.0}
+        )
+        run_analysis_jobs()
+        # Both files were last changed an hour ago.
+        past = timezone.now() - timedelta(hours=1)
+        AudioFile.objects.update(updated_at=past)
+        AudioAnalysis.objects.update(updated_at=past)
+        SpeedSummary.objects.update(updated_at=past)
+        modified = {
+            url: self.client.get(url)["Last-Modified"]
+            for url in (AUDIO_FILE_URL, AUDIO_STATISTICS_URL)
+        }
+
+        self.client.delete(reverse("audio:audiofile-detail", args=[res.data["id"]]))
+
+        for url, since in modified.items():
+            res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(res["Last-Modified"], since)
+
+    def test_missing_files_are_not_found(self):
+        """Test unknown or foreign files give 404, never 304 or 500."""
+        other = create_user(email="other-etag@example.com", password="password123")
+        foreign = AudioFile.objects.create(
+            user=other,
+            file=SimpleUploadedFile("clip.wav", b"Dummy audio data"),
+            distance=1.0,
+        )
+
+        for audio_file_id in (foreign.id, foreign.id + 1):
+            url = reverse("audio:audiofile-detail", args=[audio_file_id])
+            for headers in ({}, {"HTTP_IF_NONE_MATCH": "*"}):
+                res = self.client.get(url, **headers)
+                self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_etag_depends_on_the_representation(self):
+        """Test other query parameters or formats do not share an ETag."""
+        res = self.client.get(self.detail_url)
+
+        narrow = self.client.get(
+            self.detail_url, {"points": 10}, HTTP_IF_NONE_MATCH=res["ETag"]
+        )
+        packed = self.client.get(
+            self.detail_url,
+            HTTP_ACCEPT="application/x-msgpack",
+            HTTP_IF_NONE_MATCH=res["ETag"],
+        )
+
+        self.assertEqual(narrow.status_code, status.HTTP_200_OK)
+        self.assertEqual(packed.status_code, status.HTTP_200_OK)
+
+
+class ResponseCacheTests(AuthenticatedTestCase):
+    """Test repeated reads are served from the cache until something changes."""
+
+    def setUp(self):
+        # A file based cache, shared like the one of a deployment.
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        shared = override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": tmp.name,
+                }
+            }
+        )
+        shared.enable()
+        self.addCleanup(shared.disable)
+
+        super().setUp()
+        self.ids = [
+            self.client.post(
+                AUDIO_FILE_URL, {"file": create_click_audio_file(), "distance": 20.0}
+            ).data["id"]
+            for _ in range(2)
+        ]
+        self.urls = [
+            reverse("audio:audiofile-detail", args=[audio_file_id])
+            for audio_file_id in self.ids
+        ]
+        run_analysis_jobs()
+
+    def change_speed_silently(self, speed_mph):
+        """Change the stored speed without invalidating or changing the ETag."""
+        AudioAnalysis.objects.filter(audio_file_id=self.ids[0]).update(
+            speed_mph=speed_mph
+        )
+
+    def invalidate_in_another_process(self):
+        """Invalidate the first file like the analysis worker would."""
+        process = multiprocessing.get_context("fork").Process(
+            target=invalidate_responses, args=(self.user.id, self.ids[0])
+        )
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+
+    def test_hits_only_cost_the_etag_query(self):
+        """Test cached list, detail and statistics skip the serialization."""
+        for url in (AUDIO_FILE_URL, self.urls[0], AUDIO_STATISTICS_URL):
+            first = self.client.get(url)
+
+            with self.assertNumQueries(1):
+                second = self.client.get(url)
+
+            self.assertEqual(second.content, first.content)
+
+    def test_changes_are_never_served_stale(self):
+        """Test edits and finished analyses invalidate the cached responses."""
+        self.client.get(self.urls[0])
+        self.client.get(AUDIO_STATISTICS_URL)
+
+        self.client.patch(self.urls[0], {"distance": 40.0})
+
+        self.assertEqual(self.client.get(self.urls[0]).data["speed_mph"], 5.01)
+        stats = self.client.get(AUDIO_STATISTICS_URL)
+        self.assertEqual(
+            sorted(entry["speed"] for entry in stats.data["audio_statistics"]),
+            [2.51, 5.01],
+        )
+
+    def test_other_files_stay_cached(self):
+        """Test a change to one file keeps the detail of the others."""
+        self.client.get(self.urls[1])
+
+        self.client.patch(self.urls[0], {"distance": 40.0})
+
+        with self.assertNumQueries(1):
+            self.client.get(self.urls[1])
+
+    def test_invalidation_from_another_process(self):
+        """Test invalidations made by another process reach the cache."""
+        self.client.get(self.urls[0])
+        self.change_speed_silently(1.0)
+        self.assertEqual(self.client.get(self.urls[0]).data["speed_mph"], 2.51)
+
+        self.invalidate_in_another_process()
+
+        self.assertEqual(self.client.get(self.urls[0]).data["speed_mph"], 1.0)
+
+    def test_entries_of_an_older_state_are_not_served(self):
+        """Test a change whose invalidation was lost still gets a new body."""
+        first = self.client.get(self.urls[0])
+
+        AudioFile.objects.filter(id=self.ids[0]).update(
+            distance=40.0, updated_at=timezone.now()
+        )
+        res = self.client.get(self.urls[0])
+
+        self.assertNotEqual(res["ETag"], first["ETag"])
+        self.assertEqual(res.data["distance"], 40.0)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_process_local_cache_is_not_used(self):
+        """Test a cache the other processes cannot invalidate stays off."""
+        self.client.get(self.urls[0])
+        self.change_speed_silently(1.0)
+
+        self.invalidate_in_another_process()
+
+        self.assertEqual(self.client.get(self.urls[0]).data["speed_mph"], 1.0)
+
+    def test_cache_is_per_user(self):
+        """Test another user never gets someone else's cached list."""
+        self.client.get(AUDIO_FILE_URL)
+        other = create_user(email="other-cache@example.com", password="password123")
+        self.client.force_authenticate(user=other)
+
+        res = self.client.get(AUDIO_FILE_URL)
+
+        self.assertEqual(res.data["results"], [])
+
+
+@override_settings(AUDIO_ANALYZE_DURING_UPLOAD=False)
+class SpeedSummaryTests(AuthenticatedTestCase):
+    """Test the per-user speed summary follows every change."""
+
+    def setUp(self):
+        super().setUp()
+        self.ids = [
+            self.client.post(
+                AUDIO_FILE_URL,
+                {"file": create_click_audio_file(), "distance": distance},
+            ).data["id"]
+            for distance in (10.0, 20.0)
+        ]
+
+    def summary(self):
+        return SpeedSummary.objects.get(user=self.user)
+
+    def test_uploads_and_analyses_are_counted(self):
+        """Test files are counted on upload and speeds once analysed."""
+        self.assertEqual(self.summary().total_files, 2)
+        self.assertEqual(self.summary().processed_files, 0)
+
+        run_analysis_jobs()
+
+        summary = self.summary()
+        self.assertEqual(summary.processed_files, 2)
+        self.assertEqual(summary.speed_count, 2)
+        self.assertEqual(summary.speed_min, 1.25)
+        self.assertEqual(summary.speed_max, 2.51)
+
+    def test_distance_change_and_delete(self):
+        """Test speed changes and deletions move the totals and extremes."""
+        run_analysis_jobs()
+        first, second = [
+            reverse("audio:audiofile-detail", args=[pk]) for pk in self.ids
+        ]
+
+        self.client.patch(first, {"distance": 40.0})
+        self.assertEqual(self.summary().speed_max, 5.01)
+        self.client.delete(first)
+
+        summary = self.summary()
+        self.assertEqual(summary.total_files, 1)
+        self.assertEqual(summary.speed_count, 1)
+        self.assertEqual((summary.speed_min, summary.speed_max), (2.51, 2.51))
+
+    def test_statistics_header_reads_the_summary(self):
+        """Test the statistics totals come from one summary row."""
+        run_analysis_jobs()
+
+        res = self.client.get(AUDIO_STATISTICS_URL)
+
+        self.assertEqual(res.data["min_speed"], 1.25)
+        self.assertEqual(res.data["max_speed"], 2.51)
+        self.assertEqual(res.data["avg_speed"], 1.88)
+        self.assertEqual(res.data["stddev_speed"], 0.63)
+        self.assertEqual(res.data["total_files"], 2)
+
+    def test_missing_summary_is_rebuilt(self):
+        """Test users from before the summary get one on first use."""
+        run_analysis_jobs()
+        SpeedSummary.objects.all().delete()
+
+        res = self.client.get(AUDIO_STATISTICS_URL)
+
+        self.assertEqual(res.data["processed_files"], 2)
+        self.assertEqual(self.summary().speed_count, 2)
+
+
+class ResumableUploadTests(AuthenticatedTestCase):
+    """Test recordings can be uploaded in chunks and resumed."""
+
+    def setUp(self):
+        super().setUp()
+        self.content = create_click_audio_file().read()
+
+    def start(self, **extra):
+        payload = {
+            "file_name": "session.wav",
+            "size": len(self.content),
+            "distance": 20.0,
+            "unit": "meters",
+            **extra,
+        }
+        res = self.client.post(AUDIO_UPLOAD_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res["Location"]
+
+    def send(self, url, offset, chunk):
+        return self.client.patch(
+            url,
+            chunk,
+            content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_chunks_are_resumed_and_finalized(self):
+        """Test a resumed upload becomes an audio file with the same bytes."""
+        url = self.start(sha256=hashlib.sha256(self.content).hexdigest())
+        half = len(self.content) // 2
+
+        res = self.send(url, 0, self.content[:half])
+        self.assertEqual(res["Upload-Offset"], str(half))
+        self.assertEqual(self.client.get(url).data["offset"], half)
+        res = self.send(url, half, self.content[half:])
+        self.assertEqual(res.data["offset"], len(self.content))
+
+        res = self.client.post(f"{url}finalize/")
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        audio_file = AudioFile.objects.get(id=res.data["id"])
+        with audio_file.file.open("rb") as stored:
+            self.assertEqual(stored.read(), self.content)
+        run_analysis_jobs()
+        analysis = AudioAnalysis.objects.get(audio_file=audio_file)
+        self.assertEqual(analysis.speed_mps, 44.1)
+
+    def test_wrong_offset_conflicts(self):
+        """Test a chunk must start where the upload ends."""
+        url = self.start()
+        self.send(url, 0, self.content[:100])
+
+        res = self.send(url, 0, self.content[:100])
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.client.get(url).data["offset"], 100)
+
+    def test_incomplete_or_corrupt_uploads_are_not_finalized(self):
+        """Test finalize checks the size and the SHA-256 digest."""
+        url = self.start(sha256="0" * 64)
+        self.send(url, 0, self.content[:100])
+
+        incomplete = self.client.post(f"{url}finalize/")
+        self.send(url, 100, self.content[100:])
+        corrupt = self.client.post(f"{url}finalize/")
+
+        self.assertEqual(incomplete.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("SHA-256", corrupt.data["error"])
+        self.assertEqual(AudioFile.objects.count(), 0)
+
+    def test_long_names_fit_the_audio_file(self):
+        """Test directories are dropped and long names shortened to fit."""
+        url = self.start(file_name="../recordings/" + "x" * 200 + ".wav")
+        self.send(url, 0, self.content)
+
+        res = self.client.post(f"{url}finalize/")
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        name = AudioFile.objects.get(id=res.data["id"]).file.name
+        self.assertLessEqual(len(name), AudioFile._meta.get_field("file").max_length)
+        self.assertRegex(name, r"^audio/x+[^/]*\.wav$")
+        self.assertEqual(AudioUpload.objects.get().file_name, "x" * 200 + ".wav")
+
+    def test_uploads_are_private(self):
+        """Test other users cannot see or extend an upload."""
+        url = self.start()
+        other = create_user(email="other-upload@example.com", password="password123")
+        self.client.force_authenticate(user=other)
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        res = self.send(url, 0, self.content)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(AUDIO_ANALYZE_DURING_UPLOAD=False)
+class WaveformTileTests(AuthenticatedTestCase):
+    """Test waveform tiles are sliced from the stored pyramid."""
+
+    def setUp(self):
+        super().setUp()
+        res = self.client.post(
+            AUDIO_FILE_URL, {"file": create_click_audio_file(), "distance": 5.0}
+        )
+        self.url = reverse("audio:audiofile-waveform", args=[res.data["id"]])
+
+    def test_tile_waits_for_analysis(self):
+        """Test no tile is served before the analysis finished."""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_tile_of_a_level(self):
+        """Test a tile holds the requested range of a level."""
+        run_analysis_jobs()
+
+        with patch("audio.analysis.analyze_audio") as analyze:
+            res = self.client.get(self.url, {"level": 0, "start": 300, "end": 320})
+
+        analyze.assert_not_called()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["samples_per_point"], 32)
+        self.assertEqual((res.data["start"], res.data["end"]), (300, 320))
+        self.assertEqual(len(res.data["min"]), 20)
+        # The click at sample 10000 falls in point 312.
+        self.assertEqual(res.data["max"][12], 20000)
+        self.assertIn("public", res["Cache-Control"])
+
+    def test_unchanged_tile_is_not_modified(self):
+        """Test clients revalidate tiles with their ETag."""
+        run_analysis_jobs()
+        res = self.client.get(self.url)
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=res["ETag"])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_invalid_tile(self):
+        """Test tiles outside the pyramid are rejected."""
+        run_analysis_jobs()
+
+        for params in ({"level": 99}, {"start": "x"}, {"start": 10, "end": 5}):
+            res = self.client.get(self.url, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BinaryFormatTests(AuthenticatedTestCase):
+    """Test peaks and envelopes can be fetched as packed arrays."""
+
+    def setUp(self):
+        super().setUp()
+        res = self.client.post(
+            AUDIO_FILE_URL, {"file": create_click_audio_file(), "distance": 20.0}
+        )
+        run_analysis_jobs()
+        self.detail_url = reverse("audio:audiofile-detail", args=[res.data["id"]])
+
+    def test_json_is_the_default(self):
+        """Test clients without an Accept header still get JSON."""
+        res = self.client.get(self.detail_url)
+
+        self.assertEqual(res["Content-Type"], "application/json")
+        self.assertEqual(res.data["peaks"], [{"value": 10000}, {"value": 30000}])
+
+    def test_msgpack_packs_arrays(self):
+        """Test msgpack responses carry arrays as little-endian int32 bytes."""
+        res = self.client.get(self.detail_url, HTTP_ACCEPT="application/x-msgpack")
+
+        self.assertEqual(res["Content-Type"], "application/x-msgpack")
+        data = msgpack.unpackb(res.content)
+        np.testing.assert_array_equal(
+            np.frombuffer(data["peaks"], "<i4"), [10000, 30000]
+        )
+        self.assertEqual(np.frombuffer(data["envelope"]["max"], "<i4").max(), 20000)
+
+    def test_columnar_statistics(self):
+        """Test columnar responses point into aligned raw columns."""
+        res = self.client.get(
+            AUDIO_STATISTICS_URL, HTTP_ACCEPT="application/vnd.ariakon.columnar"
+        )
+
+        body = res.content
+        (length,) = struct.unpack_from("<I", body)
+        self.assertEqual(length % 4, 0)
+        header = json.loads(body[4 : 4 + length])
+        columns = body[4 + length :]
+        peaks = header["audio_statistics"][0]["peaks"]
+        self.assertEqual(peaks["dtype"], "<i4")
+        values = np.frombuffer(
+            columns, "<i4", count=peaks["count"], offset=peaks["offset"]
+        )
+        np.testing.assert_array_equal(values, [10000, 30000])
+        self.assertEqual(header["processed_files"], 1)
+
+
+class ServerTimingTests(TestCase):
+    """Test the per-stage Server-Timing breakdown."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="timing@example.com", password="password123")
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def stages(self, response):
+        return {
+            metric.split(";")[0].strip()
+            for metric in response["Server-Timing"].split(",")
+        }
+
+    @override_settings(AUDIO_SERVER_TIMING=True)
+    def test_header_and_log_line(self):
+        """Test auth, SQL, analysis and rendering are timed per request."""
+        res = self.client.post(
+            AUDIO_FILE_URL,
+            {"file": create_click_audio_file(), "distance": 1.0},
+            format="multipart",
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(
+            {"auth", "db", "analysis", "render", "total"} <= self.stages(res)
+        )
+
+        with self.assertLogs("audio.timing", "INFO") as logs:
+            res = self.client.get(AUDIO_STATISTICS_URL)
+
+        self.assertTrue({"auth", "db", "render", "total"} <= self.stages(res))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line["path"], AUDIO_STATISTICS_URL)
+        self.assertEqual(line["status"], 200)
+        self.assertGreaterEqual(line["stages"]["db"]["count"], 1)
+        self.assertGreater(line["total_ms"], 0)
+
+    @override_settings(AUDIO_SERVER_TIMING=True, AUDIO_PCM_CACHE_BYTES=0)
+    def test_analysis_stages(self):
+        """Test decoding and peak finding are timed inside audio.utils."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "clicks.wav")
+            with open(path, "wb") as audio_file:
+                audio_file.write(create_click_audio_file().read())
+
+            def view(request):
+                analyze_audio(path)
+                return HttpResponse()
+
+            res = ServerTimingMiddleware(view)(RequestFactory().get("/"))
+
+        self.assertTrue({"decode", "peaks", "envelope"} <= self.stages(res))
+
+    def test_off_by_default(self):
+        """Test nothing is added while the setting is off."""
+        res = self.client.get(AUDIO_STATISTICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Server-Timing", res)
@@ -0,0 +1,333 @@
+"""
+Test audio management commands.
+"""
+import os
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from core.models import (
+    AnalysisJob,
+    AudioAnalysis,
+    AudioFile,
+    AudioUpload,
+    SpeedSummary,
+)
+from audio.analysis import enqueue_analysis
+from audio.uploads import create_upload
+from audio.utils import ANALYSIS_VERSION
+
+
+class RunAnalysisWorkersCommandTests(TestCase):
+    """Test the run_analysis_workers command."""
+
+    def test_burst_processes_queue(self):
+        """Test a burst run drains the queue and exits."""
+        user = get_user_model().objects.create_user(
+            email="worker@example.com", password="password123"
+        )
+        audio_file = AudioFile.objects.create(
+            user=user,
+            file=SimpleUploadedFile("broken.wav", b"Dummy audio data"),
+            distance=10.0,
+        )
+        enqueue_analysis(audio_file)
+        out = StringIO()
+
+        call_command("run_analysis_workers", "--burst", stdout=out)
+
+        self.assertIn("Processed 1 job(s).", out.getvalue())
+        self.assertFalse(
+            AnalysisJob.objects.filter(status=AnalysisJob.STATUS_QUEUED).exists()
+        )
+
+
+class RebuildSpeedSummariesCommandTests(TestCase):
+    """Test the rebuild_speed_summaries command."""
+
+    def test_rebuild_fixes_drifted_totals(self):
+        """Test summaries are recomputed from the stored analyses."""
+        user = get_user_model().objects.create_user(
+            email="summary@example.com", password="password123"
+        )
+        AudioFile.objects.create(
+            user=user,
+            file=SimpleUploadedFile("broken.wav", b"Dummy audio data"),
+            distance=10.0,
+        )
+        SpeedSummary.objects.filter(user=user).update(total_files=7, speed_count=3)
+        out = StringIO()
+
+        call_command("rebuild_speed_summaries", stdout=out)
+
+        self.assertIn("Rebuilt 1 speed summaries.", out.getvalue())
+        summary = SpeedSummary.objects.get(user=user)
+        self.assertEqual((summary.total_files, summary.speed_count), (1, 0))
+
+
+class DeleteAbandonedUploadsCommandTests(TestCase):
+    """Test the delete_abandoned_uploads command."""
+
+    def test_only_stale_unfinished_uploads_are_deleted(self):
+        """Test uploads without a recent chunk go, with their files."""
+        user = get_user_model().objects.create_user(
+            email="abandoned@example.com", password="password123"
+        )
+        stale, recent, finished = [
+            create_upload(user, "session.wav", 100, 1.0, "meters") for _ in range(3)
+        ]
+        finished.audio_file = AudioFile.objects.create(
+            user=user, file=finished.file, distance=1.0
+        )
+        finished.save()
+        AudioUpload.objects.exclude(id=recent.id).update(
+            updated_at=timezone.now() - timedelta(hours=3)
+        )
+        out = StringIO()
+
+        call_command("delete_abandoned_uploads", "--hours", "2", stdout=out)
+
+        self.assertIn("Deleted 1 abandoned uploads.", out.getvalue())
+        self.assertEqual(
+            set(AudioUpload.objects.values_list("id", flat=True)),
+            {recent.id, finished.id},
+        )
+        self.assertFalse(default_storage.exists(stale.file))
+        self.assertTrue(default_storage.exists(recent.file))
+        for upload in (recent, finished):
+            default_storage.delete(upload.file)
+
+
+class ReanalyzeAudioCommandTests(TestCase):
+    """Test the reanalyze_audio command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="reanalyze@example.com", password="password123"
+        )
+        self.audio_files = [
+            AudioFile.objects.create(
+                user=self.user,
+                file=SimpleUploadedFile("broken.wav", b"Dummy audio data"),
+                distance=10.0,
+            )
+            for _ in range(3)
+        ]
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.checkpoint = os.path.join(tmp.name, "checkpoint.json")
+
+    def reanalyze(self, *args):
+        out = StringIO()
+        call_command(
+            "reanalyze_audio",
+            "--workers=1",
+            "--chunk-size=2",
+            f"--checkpoint={self.checkpoint}",
+            *args,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def test_every_file_is_reanalysed(self):
+        """Test results are stored with throughput and the checkpoint cleared."""
+        out = self.reanalyze()
+
+        self.assertIn("2/3 files", out)
+        self.assertIn("files/s", out)
+        self.assertIn("ETA", out)
+        self.assertIn("Re-analysed 3 file(s)", out)
+        self.assertEqual(
+            AudioAnalysis.objects.filter(
+                status=AudioAnalysis.STATUS_FAILED, algorithm_version=ANALYSIS_VERSION
+            ).count(),
+            3,
+        )
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_interrupted_run_resumes(self):
+        """Test a run picks up after the last file of the checkpoint."""
+        with patch(
+            "audio.management.commands.reanalyze_audio.run_batch_analysis",
+            side_effect=[[], KeyboardInterrupt],
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                self.reanalyze()
+
+        out = self.reanalyze()
+
+        self.assertIn("resuming after 2 done", out)
+        self.assertIn("Re-analysed 1 file(s)", out)
+        self.assertEqual(
+            list(AudioAnalysis.objects.values_list("audio_file_id", flat=True)),
+            [self.audio_files[2].id],
+        )
+
+    def test_other_filters_do_not_resume(self):
+        """Test a checkpoint is only reused by a run with the same filters."""
+        with patch(
+            "audio.management.commands.reanalyze_audio.run_batch_analysis",
+            side_effect=[[], KeyboardInterrupt],
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                self.reanalyze()
+
+        with self.assertRaises(CommandError):
+            self.reanalyze("--since=2020-01-01")
+        self.assertIn("Re-analysed 3 file(s)", self.reanalyze("--restart"))
+
+    def test_filters(self):
+        """Test user, date and algorithm version narrow the files."""
+        AudioAnalysis.objects.create(
+            audio_file=self.audio_files[0], algorithm_version=ANALYSIS_VERSION
+        )
+        AudioFile.objects.filter(id=self.audio_files[1].id).update(
+            created_at=timezone.now() - timedelta(days=30)
+        )
+
+        self.assertIn(
+            "Re-analysing 2 file(s)",
+            self.reanalyze(f"--algorithm-version={ANALYSIS_VERSION}"),
+        )
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        self.assertIn("Re-analysing 2 file(s)", self.reanalyze(f"--since={since}"))
+        self.assertIn(
+            "Re-analysing 0 file(s)", self.reanalyze("--user=nobody@example.com")
+        )
+
+
+class BenchAudioCommandTests(SimpleTestCase):
+    """Test the bench_audio command."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.work_dir = tmp.name
+        self.report_path = os.path.join(tmp.name, "report.json")
+
+    def bench(self, *args):
+        out = StringIO()
+        call_command(
+            "bench_audio",
+            "--formats=wav,flac",
+            "--rates=8000",
+            "--channels=1,2",
+            "--repeat=1",
+            f"--work-dir={self.work_dir}",
+            f"--output={self.report_path}",
+            *args,
+            stdout=out,
+        )
+        with open(self.report_path) as report:
+            return out.getvalue(), json.load(report)
+
+    def test_report_has_every_stage(self):
+        """Test every case is timed stage by stage and its clicks are found."""
+        out, report = self.bench("--durations=2")
+
+        self.assertEqual(len(report["cases"]), 4)
+        for case in report["cases"]:
+            self.assertEqual(
+                set(case["stages"]),
+                {"decode", "abs", "percentile", "peaks", "formatting", "total"},
+            )
+            self.assertEqual(case["clicks_found"], 2)
+            self.assertEqual(case["clicks"][1] - case["clicks"][0], 5600)
+        self.assertIn("2/2 clicks found", out)
+
+    @override_settings(AUDIO_STREAM_MIN_BYTES=0)
+    def test_streamed_files_are_timed_block_wise(self):
+        """Test files the analysis streams are never decoded into memory."""
+        with patch("audio.bench.decode_audio", side_effect=AssertionError):
+            _, report = self.bench("--durations=2")
+
+        for case in report["cases"]:
+            self.assertTrue(case["streamed"])
+            self.assertEqual(
+                set(case["stages"]),
+                {"decode", "peaks", "second_pass", "formatting", "total"},
+            )
+            self.assertEqual(case["clicks_found"], 2)
+
+    def test_recordings_are_reused_and_compared(self):
+        """Test a second run reuses the recordings and compares with a baseline."""
+        self.bench("--durations=2,0.5")
+        baseline = os.path.join(self.work_dir, "baseline.json")
+        os.replace(self.report_path, baseline)
+        generated = {
+            name: os.path.getmtime(os.path.join(self.work_dir, name))
+            for name in os.listdir(self.work_dir)
+            if name.startswith("impacts-")
+        }
+
+        out, report = self.bench("--durations=2,0.5", f"--baseline={baseline}")
+
+        self.assertEqual(len(generated), 4)
+        for name, mtime in generated.items():
+            self.assertEqual(os.path.getmtime(os.path.join(self.work_dir, name)), mtime)
+        self.assertIn("of the baseline", out)
+        self.assertIn("skipped", out)
+        self.assertEqual(sum("skipped" in case for case in report["cases"]), 4)
+
+
+class LoadtestAudioApiCommandTests(TransactionTestCase):
+    """Test the loadtest_audio_api command."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.report_path = os.path.join(tmp.name, "report.json")
+
+    def load_test(self, *args):
+        out = StringIO()
+        call_command(
+            "loadtest_audio_api",
+            "--recordings=3",
+            "--users=2",
+            "--requests=6",
+            "--concurrency=2",
+            f"--output={self.report_path}",
+            *args,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def test_every_scenario_is_measured(self):
+        """Test latency and queries are reported and the seeded data removed."""
+        out = self.load_test()
+
+        with open(self.report_path) as report:
+            scenarios = json.load(report)["scenarios"]
+        self.assertEqual(
+            [scenario["scenario"] for scenario in scenarios],
+            ["list", "detail", "statistics"],
+        )
+        for scenario in scenarios:
+            self.assertEqual(scenario["requests"], 6)
+            self.assertEqual(scenario["errors"], 0)
+            self.assertGreater(scenario["queries"], 0)
+            self.assertLessEqual(scenario["p50_ms"], scenario["p99_ms"])
+            self.assertGreater(scenario["rss_mb"], 0)
+        self.assertIn("3 scenario(s) within budget", out)
+        self.assertFalse(AudioFile.objects.exists())
+        self.assertFalse(get_user_model().objects.exists())
+
+    def test_exceeded_budget_fails(self):
+        """Test a scenario over its query budget fails the run."""
+        with self.assertRaisesMessage(CommandError, "statistics @ 3: queries"):
+            self.load_test("--scenarios=statistics", "--max-queries=1")
@@ -0,0 +1,101 @@
+"""
+Tests for the shared decoded PCM cache.
+"""
+import os
+import tempfile
+from unittest.mock import patch
+
+import numpy as np
+import soundfile
+from django.test import SimpleTestCase, override_settings
+
+from audio.pcm_cache import PCMCache
+from audio.utils import analyze_audio, load_samples
+
+
+class PCMCacheTests(SimpleTestCase):
+    """Test the memory-mapped PCM cache."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = PCMCache(os.path.join(self.tmp.name, "cache"), 1024 * 1024)
+        self.source = self.create_source("clip.mp3")
+
+    def create_source(self, name, content=b"encoded audio"):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as source:
+            source.write(content)
+        return path
+
+    def test_put_and_get_maps_samples(self):
+        """Test cached samples come back as a read-only memory map."""
+        samples = np.arange(-500, 500, dtype=np.int16)
+        self.cache.put(self.source, samples, 44100, 2)
+
+        cached, frame_rate, channels = self.cache.get(self.source)
+
+        self.assertIsInstance(cached, np.memmap)
+        self.assertFalse(cached.flags.writeable)
+        np.testing.assert_array_equal(cached, samples)
+        self.assertEqual((frame_rate, channels), (44100, 2))
+
+    def test_changed_file_misses(self):
+        """Test replacing the source file invalidates its entry."""
+        self.cache.put(self.source, np.zeros(10, dtype=np.int16), 8000, 1)
+        stat = os.stat(self.source)
+        os.utime(self.source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        self.assertIsNone(self.cache.get(self.source))
+
+    def test_evicts_least_recently_used(self):
+        """Test old entries are removed once the byte budget is exceeded."""
+        cache = PCMCache(self.cache.directory, 3000)
+        first = self.create_source("first.mp3", b"first")
+        second = self.create_source("second.mp3", b"second")
+        third = self.create_source("third.mp3", b"third")
+        samples = np.zeros(600, dtype=np.int16)
+
+        cache.put(first, samples, 8000, 1)
+        cache.put(second, samples, 8000, 1)
+        entry = cache.entry_path(cache.key(first))
+        os.utime(entry, ns=(0, 0))
+        cache.get(second)
+        cache.put(third, samples, 8000, 1)
+
+        self.assertIsNone(cache.get(first))
+        self.assertIsNotNone(cache.get(second))
+        self.assertIsNotNone(cache.get(third))
+
+    def test_load_samples_decodes_once(self):
+        """Test repeated loads attach to the cached samples."""
+        decoded = (np.array([1, -2, 3], dtype=np.int16), 22050, 1)
+        with override_settings(
+            AUDIO_PCM_CACHE_DIR=self.cache.directory, AUDIO_PCM_CACHE_BYTES=1024
+        ), patch("audio.utils.decode_audio", return_value=decoded) as decode:
+            load_samples(self.source)
+            samples, frame_rate, _ = load_samples(self.source)
+
+        decode.assert_called_once()
+        self.assertIsInstance(samples, np.memmap)
+        np.testing.assert_array_equal(samples, decoded[0])
+        self.assertEqual(frame_rate, 22050)
+
+    def test_decoded_file_with_a_copy_is_not_cached(self):
+        """Test a first analysis writing a canonical copy skips the cache."""
+        source = os.path.join(self.tmp.name, "clip.flac")
+        samples = np.zeros(20000, dtype=np.int16)
+        samples[[1000, 9000]] = 20000
+        soundfile.write(source, samples, 8000, subtype="PCM_16")
+        copy = os.path.join(self.tmp.name, "clip.wav")
+
+        with override_settings(
+            AUDIO_PCM_CACHE_DIR=self.cache.directory,
+            AUDIO_PCM_CACHE_BYTES=1024 * 1024,
+        ):
+            analyze_audio(source, canonical_path=copy)
+            self.assertTrue(os.path.exists(copy))
+            self.assertIsNone(self.cache.get(source))
+
+            analyze_audio(source)
+            self.assertIsNotNone(self.cache.get(source))
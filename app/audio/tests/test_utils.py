@@ -0,0 +1,619 @@
+"""
+Tests for the audio analysis helpers.
+"""
+
+import os
+import wave
+import tempfile
+import subprocess
+import tracemalloc
+
+from unittest.mock import patch
+
+import numpy as np
+import soundfile
+from django.test import SimpleTestCase, override_settings
+from pydub import AudioSegment
+from scipy.signal import find_peaks
+
+from audio.envelope import Envelope, EnvelopeBuilder, halve, to_int16
+from audio.upload_handlers import InflightAnalysis
+from audio.peaks import (
+    LocalMaximaScanner,
+    PeakDetector,
+    find_distant_peaks,
+    select_by_distance,
+)
+from audio.utils import (
+    PCMStream,
+    analyze_audio,
+    analyze_audio_stream,
+    decode_audio,
+    percentile_from_histogram,
+)
+from audio.waveform import WaveformFile, WaveformWriter
+
+
+def write_wav(path, samples, frame_rate=44100, channels=1, sample_width=2):
+    """Write samples to a WAV file, 16-bit unless raw bytes are given."""
+    if sample_width == 2:
+        samples = np.asarray(samples, dtype="<i2").tobytes()
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(sample_width)
+        wav.setframerate(frame_rate)
+        wav.writeframes(samples)
+    return path
+
+
+class PeakBuildingBlockTests(SimpleTestCase):
+    """Test the block-wise peak finding helpers against scipy."""
+
+    def setUp(self):
+        self.rng = np.random.default_rng(7)
+
+    def feed_in_blocks(self, signal):
+        scanner = LocalMaximaScanner()
+        positions = []
+        start = 0
+        while start < signal.size:
+            stop = start + int(self.rng.integers(1, 50))
+            found, _ = scanner.feed(signal[start:stop])
+            positions.append(found)
+            start = stop
+        return np.concatenate(positions)
+
+    def test_scanner_matches_find_peaks_with_plateaus(self):
+        """Test maxima and plateau midpoints match across block boundaries."""
+        signal = self.rng.integers(0, 4, size=5000)
+
+        np.testing.assert_array_equal(
+            self.feed_in_blocks(signal), find_peaks(signal)[0]
+        )
+
+    def test_select_by_distance_matches_find_peaks(self):
+        """Test the distance rule keeps the same peaks as scipy without ties."""
+        signal = self.rng.permutation(20000)
+        peaks = find_peaks(signal)[0]
+
+        keep = select_by_distance(peaks, signal[peaks], 300)
+
+        np.testing.assert_array_equal(peaks[keep], find_peaks(signal, distance=300)[0])
+
+    def test_select_by_distance_keeps_the_leftmost_of_a_tie(self):
+        """Test equal heights within the distance keep the leftmost peak."""
+        peaks = np.array([10, 50, 90, 400])
+
+        keep = select_by_distance(peaks, np.array([7, 7, 7, 7]), 100)
+
+        np.testing.assert_array_equal(peaks[keep], [10, 400])
+
+    def test_peak_detector_matches_find_peaks(self):
+        """Test the online detector gives exactly the batch hits."""
+        signal = self.rng.permutation(20000)
+        signal[5000:5200] = 0
+        signal[12000:12010] = 19990
+        height = np.percentile(signal, 95)
+        detector = PeakDetector(height, 500)
+        hits = []
+        for start in range(0, signal.size, 777):
+            hits.append(detector.feed(signal[start : start + 777]))
+        hits.append(detector.finish())
+
+        np.testing.assert_array_equal(
+            np.concatenate(hits), find_peaks(signal, height=height, distance=500)[0]
+        )
+
+    def test_peak_detector_breaks_ties_like_the_batch_rule(self):
+        """Test clipped, flat-topped peaks give the batch hits, in order."""
+        for seed in range(20):
+            rng = np.random.default_rng(seed)
+            signal = rng.integers(0, 2000, size=100000)
+            # Clipping leaves many equal maxima within the peak distance.
+            signal[rng.integers(0, signal.size, size=400)] = 3000
+            signal[rng.integers(0, signal.size, size=200)] = 2999
+            height = np.percentile(signal, 95)
+            detector = PeakDetector(height, 5000)
+            hits = []
+            for start in range(0, signal.size, 4096):
+                hits.append(detector.feed(signal[start : start + 4096]))
+            hits.append(detector.finish())
+
+            np.testing.assert_array_equal(
+                np.concatenate(hits), find_distant_peaks(signal, height, 5000)
+            )
+
+    def test_peak_detector_holds_little_on_long_noise(self):
+        """Test two minutes of noise never hold more than a few windows."""
+        rng = np.random.default_rng(0)
+        signal = np.abs(rng.normal(0, 3000, size=44100 * 120)).astype(np.int32)
+        height = np.percentile(signal, 95)
+        detector = PeakDetector(height, 5000)
+        hits, held = [], 0
+        for start in range(0, signal.size, 44100):
+            hits.append(detector.feed(signal[start : start + 44100]))
+            held = max(held, detector.held)
+        hits.append(detector.finish())
+
+        self.assertLess(held, 2000)
+        np.testing.assert_array_equal(
+            np.concatenate(hits), find_distant_peaks(signal, height, 5000)
+        )
+
+    def test_peak_detector_caps_undecided_candidates(self):
+        """Test a rising run of peaks is settled once the cap is reached."""
+        signal = np.zeros(40000, dtype=np.int64)
+        signal[1::4] = np.arange(1, 10001)
+        detector = PeakDetector(1, 5000, max_open=100)
+        hits = []
+        for start in range(0, signal.size, 1000):
+            hits.append(detector.feed(signal[start : start + 1000]))
+            self.assertLessEqual(detector.held, 100 + 250)
+        hits = np.concatenate(hits + [detector.finish()])
+
+        self.assertTrue(np.all(np.diff(hits) > 0))
+
+    def test_peak_detector_settles_before_the_end(self):
+        """Test peaks are returned once a quiet gap follows them."""
+        signal = np.zeros(3000, dtype=np.int32)
+        signal[[100, 150]] = [5, 7]
+        detector = PeakDetector(1, 1000)
+
+        settled = detector.feed(signal[:2000])
+
+        np.testing.assert_array_equal(settled, [150])
+        self.assertEqual(detector.positions.size, 0)
+        self.assertEqual(detector.finish().size, 0)
+
+    def test_percentile_from_histogram_is_exact(self):
+        """Test the histogram percentile equals np.percentile."""
+        for size in (1, 2, 19, 1000, 12345):
+            values = self.rng.integers(0, 32769, size=size)
+            histogram = np.bincount(values, minlength=32769)
+
+            self.assertAlmostEqual(
+                percentile_from_histogram(histogram, 95),
+                np.percentile(values, 95),
+                places=6,
+            )
+
+
+class EnvelopeTests(SimpleTestCase):
+    """Test the min/max envelope pyramid."""
+
+    def setUp(self):
+        self.signal = (
+            np.random.default_rng(5)
+            .integers(-32768, 32768, size=100003)
+            .astype(np.int16)
+        )
+
+    def build(self, block_size, max_points=100):
+        builder = EnvelopeBuilder(max_points=max_points)
+        for start in range(0, self.signal.size, block_size):
+            builder.feed(self.signal[start : start + block_size])
+        return builder.finish()
+
+    def test_blocks_give_exact_bucket_extremes(self):
+        """Test block-wise building matches min/max over aligned buckets."""
+        envelope = self.build(997)
+        mins, maxs = envelope.levels[0]
+        padded = np.append(
+            self.signal, np.full(-self.signal.size % envelope.bucket, self.signal[-1])
+        ).reshape(-1, envelope.bucket)
+
+        self.assertLessEqual(mins.size, 100)
+        np.testing.assert_array_equal(mins, padded.min(axis=1))
+        np.testing.assert_array_equal(maxs, padded.max(axis=1))
+        self.assertEqual(envelope.to_bytes(), self.build(self.signal.size).to_bytes())
+
+    def test_level_fits_requested_points(self):
+        """Test the most detailed level within the width is returned."""
+        envelope = self.build(4096)
+        stored = Envelope.from_bytes(
+            envelope.to_bytes(), envelope.bucket, envelope.points
+        )
+
+        data = stored.as_dict(40)
+
+        self.assertEqual(len(data["min"]), 25)
+        self.assertEqual(data["samples_per_point"], envelope.bucket * 4)
+        self.assertEqual(max(data["max"]), int(self.signal.max()))
+        self.assertEqual(len(stored.as_dict(1)["max"]), 1)
+
+
+class WaveformTests(SimpleTestCase):
+    """Test the on-disk waveform pyramid."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "clip.wav.waveform")
+        self.signal = (
+            np.random.default_rng(7)
+            .integers(-32768, 32768, size=50001)
+            .astype(np.int16)
+        )
+
+    def write(self, block_size):
+        writer = WaveformWriter(self.path, 44100, 1, bucket=16)
+        for start in range(0, self.signal.size, block_size):
+            writer.feed(self.signal[start : start + block_size])
+        writer.close()
+        return WaveformFile(self.path)
+
+    @patch("audio.waveform.CHUNK_POINTS", 64)
+    def test_levels_match_halving(self):
+        """Test every level is the pairwise min/max of the one below."""
+        waveform = self.write(999)
+        padded = np.append(self.signal, np.full(15, self.signal[-1])).reshape(-1, 16)
+        mins, maxs = padded.min(axis=1), padded.max(axis=1)
+
+        self.assertEqual(waveform.levels[-1][1], 1)
+        for level, (_, points) in enumerate(waveform.levels):
+            tile = waveform.tile(level, 0, points)
+            np.testing.assert_array_equal(tile[:, 0], mins)
+            np.testing.assert_array_equal(tile[:, 1], maxs)
+            mins, maxs = halve(mins, maxs)
+
+    def test_tile_is_a_slice_of_the_level(self):
+        """Test tiles are clipped to the level and scale with the zoom."""
+        waveform = self.write(self.signal.size)
+        points = waveform.levels[2][1]
+
+        tile = waveform.tile(2, points - 10, points + 10)
+
+        self.assertEqual(tile.shape, (10, 2))
+        self.assertEqual(waveform.samples_per_point(2), 64)
+        self.assertEqual(waveform.tile(2, points, points + 10).shape, (0, 2))
+        self.assertLessEqual(waveform.levels[waveform.overview_level(100)][1], 100)
+
+
+@patch("audio.utils.AudioSegment.from_file", side_effect=AssertionError("ffmpeg"))
+class NativeDecoderTests(SimpleTestCase):
+    """Test WAV and FLAC are decoded without pydub/ffmpeg."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.samples = np.array([0, 1, -1, 32767, -32768, 1234], dtype=np.int16)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_pcm_wav_is_memory_mapped(self, from_file):
+        """Test 16-bit WAV samples are a view of the file."""
+        path = write_wav(self.path("clip.wav"), self.samples, 8000, channels=2)
+
+        samples, frame_rate, channels = decode_audio(path)
+
+        self.assertIsInstance(samples, np.memmap)
+        np.testing.assert_array_equal(samples, self.samples)
+        self.assertEqual((frame_rate, channels), (8000, 2))
+
+    def test_8_and_24_bit_wav_are_converted(self, from_file):
+        """Test other sample widths are converted like pydub does."""
+        unsigned = np.array([0, 128, 255, 1], dtype=np.uint8)
+        path = write_wav(self.path("8.wav"), unsigned.tobytes(), sample_width=1)
+        samples, _, _ = decode_audio(path)
+        np.testing.assert_array_equal(samples, [-128, 0, 127, -127])
+
+        packed = b"".join(
+            v.to_bytes(3, "little", signed=True) for v in (1, -2, 8388607)
+        )
+        path = write_wav(self.path("24.wav"), packed, sample_width=3)
+        samples, _, _ = decode_audio(path)
+        np.testing.assert_array_equal(samples, [1 << 8, -2 << 8, 8388607 << 8])
+
+    def test_flac_is_decoded_in_process(self, from_file):
+        """Test FLAC files are decoded by libsndfile."""
+        path = self.path("clip.flac")
+        soundfile.write(path, self.samples.reshape(-1, 2), 16000, subtype="PCM_16")
+
+        samples, frame_rate, channels = decode_audio(path)
+
+        np.testing.assert_array_equal(samples, self.samples)
+        self.assertEqual((frame_rate, channels), (16000, 2))
+
+
+class StreamingAnalysisTests(SimpleTestCase):
+    """Test the bounded memory analysis gives the in-memory result."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        rng = np.random.default_rng(3)
+        # Distinct amplitudes keep the distance rule free of ties.
+        self.samples = rng.permutation(30000).astype(np.int16)
+        self.samples[1::2] *= -1
+        self.path = write_wav(os.path.join(self.tmp.name, "noise.wav"), self.samples)
+
+    def assert_same_result(self, streamed, expected):
+        self.assertEqual(streamed.frame_rate, expected.frame_rate)
+        self.assertEqual(streamed.peaks, expected.peaks)
+        self.assertEqual(streamed.envelope.bucket, expected.envelope.bucket)
+        self.assertEqual(streamed.envelope.to_bytes(), expected.envelope.to_bytes())
+
+    @override_settings(AUDIO_PCM_CACHE_BYTES=0)
+    def test_wav_stream_matches_in_memory_analysis(self):
+        """Test block-wise WAV analysis finds exactly the same peaks."""
+        expected = analyze_audio(self.path)
+
+        streamed = analyze_audio_stream(self.path, block_seconds=0.01)
+
+        self.assertTrue(expected.peaks)
+        self.assert_same_result(streamed, expected)
+
+    @override_settings(AUDIO_PCM_CACHE_BYTES=0)
+    def test_stream_memory_does_not_grow_with_noise_length(self):
+        """Test eight times more noise does not need more memory."""
+        rng = np.random.default_rng(0)
+        peaks = []
+        for seconds in (15, 120):
+            noise = rng.normal(0, 3000, size=44100 * seconds).astype(np.int16)
+            path = write_wav(os.path.join(self.tmp.name, f"{seconds}.wav"), noise)
+            tracemalloc.start()
+            try:
+                analyze_audio_stream(path, block_seconds=1)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+
+        self.assertLess(peaks[1], peaks[0] * 1.5)
+
+    @override_settings(AUDIO_PCM_CACHE_BYTES=0)
+    def test_stream_writes_the_same_waveform(self):
+        """Test both analysis paths write an identical waveform pyramid."""
+        memory = os.path.join(self.tmp.name, "memory.waveform")
+        streamed = os.path.join(self.tmp.name, "streamed.waveform")
+
+        analyze_audio(self.path, waveform_path=memory)
+        analyze_audio_stream(self.path, block_seconds=0.01, waveform_path=streamed)
+
+        with open(memory, "rb") as expected, open(streamed, "rb") as result:
+            self.assertEqual(result.read(), expected.read())
+
+    @override_settings(AUDIO_PCM_CACHE_BYTES=0, AUDIO_STREAM_MIN_BYTES=0)
+    def test_large_files_are_streamed(self):
+        """Test files above the size limit take the streaming path."""
+        clicks = np.zeros(44100, dtype=np.int16)
+        clicks[[10000, 30000]] = 20000
+        path = write_wav(os.path.join(self.tmp.name, "clicks.wav"), clicks)
+
+        result = analyze_audio(path)
+
+        self.assertEqual(result.peaks, [10000, 30000])
+
+    @override_settings(AUDIO_PCM_CACHE_BYTES=0)
+    def test_ffmpeg_stream_matches_in_memory_analysis(self):
+        """Test compressed inputs are streamed through an ffmpeg pipe."""
+        path = os.path.join(self.tmp.name, "noise.flac")
+        subprocess.run(
+            [AudioSegment.converter, "-v", "error", "-i", self.path, path],
+            check=True,
+        )
+
+        streamed = analyze_audio_stream(path, block_seconds=0.01)
+
+        self.assert_same_result(streamed, analyze_audio(self.path))
+
+    def write_wide(self, name, subtype):
+        """Stereo noise stored with more than 16 bits per sample."""
+        rng = np.random.default_rng(5)
+        wide = rng.integers(-(1 << 31), 1 << 31, size=(30000, 2), dtype=np.int64)
+        if subtype == "PCM_24":
+            wide &= ~0xFF
+        wide = wide.astype(np.int32)
+        path = os.path.join(self.tmp.name, name)
+        soundfile.write(path, wide, 44100, subtype=subtype)
+        return path, wide.ravel()
+
+    def test_wide_samples_are_read_without_ffmpeg(self):
+        """Test 24 and 32-bit WAV and FLAC keep their top 16 bits in-process."""
+        for name, subtype in (
+            ("24.wav", "PCM_24"),
+            ("32.wav", "PCM_32"),
+            ("24.flac", "PCM_24"),
+        ):
+            path, wide = self.write_wide(name, subtype)
+
+            with patch("audio.utils.subprocess.Popen") as popen:
+                with PCMStream(path) as stream:
+                    blocks = list(stream.blocks(0.01))
+
+            popen.assert_not_called()
+            self.assertTrue(all(block.dtype == np.int16 for block in blocks))
+            np.testing.assert_array_equal(np.concatenate(blocks), to_int16(wide))
+
+    @override_settings(AUDIO_PCM_CACHE_BYTES=0)
+    def test_wide_samples_stream_like_in_memory(self):
+        """Test 24 and 32-bit files give the same result on both paths."""
+        for name, subtype in (
+            ("24.wav", "PCM_24"),
+            ("32.wav", "PCM_32"),
+            ("24.flac", "PCM_24"),
+        ):
+            path, _ = self.write_wide(name, subtype)
+            memory = os.path.join(self.tmp.name, f"{name}.memory")
+            streamed = os.path.join(self.tmp.name, f"{name}.streamed")
+
+            expected = analyze_audio(path, canonical_path=memory)
+            result = analyze_audio_stream(
+                path, block_seconds=0.01, canonical_path=streamed
+            )
+
+            self.assertTrue(expected.peaks)
+            self.assert_same_result(result, expected)
+            if name.endswith(".flac"):
+                with open(memory, "rb") as copy, open(streamed, "rb") as other:
+                    self.assertEqual(other.read(), copy.read())
+
+
+@override_settings(AUDIO_PCM_CACHE_BYTES=0)
+class MultiChannelAnalysisTests(SimpleTestCase):
+    """Test stereo files are analysed per frame, not per interleaved sample."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        rng = np.random.default_rng(11)
+        frames = np.zeros((44100, 2), dtype=np.int16)
+        # Quiet clicks and noise on the left, loud clicks on the right. The
+        # noise is too faint to survive averaging the two channels.
+        frames[1::2, 0] = rng.integers(0, 2, size=22050)
+        frames[[10000, 30000], 0] = 5000
+        frames[[10000, 30000], 1] = 20000
+        self.path = write_wav(
+            os.path.join(self.tmp.name, "stereo.wav"), frames.ravel(), channels=2
+        )
+
+    def test_loudest_channel_gives_frame_indices(self):
+        """Test peaks of the loudest channel are frame indices."""
+        result = analyze_audio(self.path)
+
+        self.assertEqual(result.peaks, [10000, 30000])
+        self.assertEqual(result.envelope.levels[0][1].max(), 20000)
+
+    def test_stream_picks_the_same_channel(self):
+        """Test the streamed analysis chooses the channel like in memory."""
+        streamed = analyze_audio_stream(self.path, block_seconds=0.05)
+
+        self.assertEqual(streamed.peaks, analyze_audio(self.path).peaks)
+
+    @override_settings(AUDIO_CHANNEL_MODE="mix")
+    def test_mixed_channels(self):
+        """Test channels can be averaged into one signal instead."""
+        result = analyze_audio(self.path)
+        streamed = analyze_audio_stream(self.path, block_seconds=0.05)
+
+        self.assertEqual(result.peaks, [10000, 30000])
+        self.assertEqual(streamed.peaks, result.peaks)
+        self.assertEqual(result.envelope.levels[-1][1].max(), 12500)
+
+
+@override_settings(AUDIO_PCM_CACHE_BYTES=0)
+class InflightAnalysisTests(SimpleTestCase):
+    """Test uploads analysed while they arrive give the regular result."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        rng = np.random.default_rng(5)
+        frames = rng.permutation(30000).astype(np.int16).reshape(-1, 2)
+        frames[1::2] *= -1
+        # The right channel is louder, and the chunks split its frames.
+        frames[:, 0] //= 4
+        self.path = write_wav(
+            os.path.join(self.tmp.name, "stereo.wav"), frames.ravel(), channels=2
+        )
+
+    def feed_in_chunks(self, path, chunk=1001):
+        analysis = InflightAnalysis(self.tmp.name)
+        with open(path, "rb") as upload:
+            while data := upload.read(chunk):
+                analysis.feed(data)
+        return analysis
+
+    @patch("audio.upload_handlers.FEED_BYTES", 4096)
+    def test_matches_analysis_of_the_stored_file(self):
+        """Test peaks, envelope and waveform match the full analysis."""
+        memory = os.path.join(self.tmp.name, "memory.waveform")
+        inflight = os.path.join(self.tmp.name, "inflight.waveform")
+        expected = analyze_audio(self.path, waveform_path=memory)
+
+        analysis = self.feed_in_chunks(self.path)
+        result = analysis.finish(self.path, waveform_path=inflight)
+
+        self.assertTrue(expected.peaks)
+        self.assertEqual(result.frame_rate, expected.frame_rate)
+        self.assertEqual(result.peaks, expected.peaks)
+        self.assertEqual(result.envelope.to_bytes(), expected.envelope.to_bytes())
+        with open(memory, "rb") as wanted, open(inflight, "rb") as written:
+            self.assertEqual(written.read(), wanted.read())
+
+    @patch("audio.upload_handlers.FEED_BYTES", 4096)
+    def test_clipped_recording(self):
+        """Test equal clipped peaks are kept like the full analysis keeps them."""
+        rng = np.random.default_rng(8)
+        samples = rng.integers(-2000, 2000, size=200000).astype(np.int16)
+        # Impacts that clip, and so tie at full scale, closer than the peak
+        # distance and spread over many feed blocks.
+        clipped = rng.choice(samples.size, size=600, replace=False)
+        samples[clipped] = np.where(rng.random(600) < 0.5, 32767, -32768)
+        path = write_wav(os.path.join(self.tmp.name, "clipped.wav"), samples)
+
+        result = self.feed_in_chunks(path).finish(path)
+        expected = analyze_audio(path)
+
+        self.assertTrue(expected.peaks)
+        self.assertEqual(result.peaks, expected.peaks)
+        self.assertEqual(result.envelope.to_bytes(), expected.envelope.to_bytes())
+
+    def test_8_bit_wav(self):
+        """Test unsigned 8-bit samples are converted like the decoder does."""
+        samples = np.full(44100, 128, dtype=np.uint8)
+        samples[[10000, 30000]] = 255
+        path = write_wav(
+            os.path.join(self.tmp.name, "8bit.wav"), samples.tobytes(), sample_width=1
+        )
+
+        result = self.feed_in_chunks(path).finish(path)
+
+        self.assertEqual(result.peaks, analyze_audio(path).peaks)
+
+    def test_other_formats_are_not_followed(self):
+        """Test non-WAV and 24-bit uploads are left to the regular analysis."""
+        path = write_wav(
+            os.path.join(self.tmp.name, "24bit.wav"), bytes(300), sample_width=3
+        )
+
+        self.assertFalse(self.feed_in_chunks(path).ready)
+        self.assertFalse(self.feed_in_chunks(__file__).ready)
+
+
+@override_settings(AUDIO_PCM_CACHE_BYTES=0)
+class CanonicalCopyTests(SimpleTestCase):
+    """Test decoded uploads keep a mono PCM copy that analyses the same."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        rng = np.random.default_rng(9)
+        frames = rng.permutation(30000).astype(np.int16).reshape(-1, 2)
+        frames[1::2] *= -1
+        frames[:, 1] //= 4
+        self.flac = os.path.join(self.tmp.name, "stereo.flac")
+        soundfile.write(self.flac, frames, 22050, subtype="PCM_16")
+        self.copy = os.path.join(self.tmp.name, "stereo.flac.loudest.wav")
+
+    def assert_copy_analyses_the_same(self, expected):
+        with wave.open(self.copy, "rb") as wav:
+            self.assertEqual(wav.getnchannels(), 1)
+            self.assertEqual(wav.getframerate(), 22050)
+        with patch("audio.utils.decode_flac") as decode:
+            result = analyze_audio(self.copy)
+        decode.assert_not_called()
+        self.assertTrue(expected.peaks)
+        self.assertEqual(result.peaks, expected.peaks)
+        self.assertEqual(result.envelope.to_bytes(), expected.envelope.to_bytes())
+
+    def test_decoded_file_is_copied(self):
+        """Test the analysed channel is kept at its frame rate."""
+        expected = analyze_audio(self.flac, canonical_path=self.copy)
+
+        self.assert_copy_analyses_the_same(expected)
+
+    @override_settings(AUDIO_STREAM_MIN_BYTES=0)
+    def test_streamed_file_is_copied(self):
+        """Test the block-wise analysis writes the same copy."""
+        expected = analyze_audio(self.flac, canonical_path=self.copy)
+
+        self.assert_copy_analyses_the_same(expected)
+
+    def test_pcm_wav_is_not_copied(self):
+        """Test WAV uploads are mapped directly and need no copy."""
+        path = write_wav(os.path.join(self.tmp.name, "clip.wav"), np.arange(100))
+
+        analyze_audio(path, canonical_path=self.copy)
+
+        self.assertFalse(os.path.exists(self.copy))
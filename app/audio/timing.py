@@ -0,0 +1,115 @@
+"""
+Per-request stage timings, reported in a Server-Timing header.
+
+ServerTimingMiddleware collects the time spent in SQL queries and in the
+stages marked with ``timed`` while a request is handled, then adds them to
+the response and logs them as one JSON line. Stages may nest: ``db`` also
+runs inside ``auth`` and ``analysis``. With ``AUDIO_SERVER_TIMING`` off no
+timings are collected and ``timed`` does nothing.
+"""
+
+import json
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_timings = ContextVar("audio_timings", default=None)
+
+
+class Timings:
+    """Total seconds and number of runs of every stage of one request."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        total, count = self.stages.get(stage, (0.0, 0))
+        self.stages[stage] = (total + seconds, count + 1)
+
+    def query(self, execute, sql, params, many, context):
+        """Database execute wrapper charging every query to ``db``."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add("db", time.perf_counter() - started)
+
+    def header(self, total):
+        """Value of the Server-Timing header, durations in milliseconds."""
+        metrics = [
+            f'{stage};dur={seconds * 1000:.2f};desc="{count}x"'
+            for stage, (seconds, count) in self.stages.items()
+        ]
+        metrics.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(metrics)
+
+    def log_line(self, request, response, total):
+        return json.dumps(
+            {
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "total_ms": round(total * 1000, 2),
+                "stages": {
+                    stage: {"ms": round(seconds * 1000, 2), "count": count}
+                    for stage, (seconds, count) in self.stages.items()
+                },
+            }
+        )
+
+
+def timing_active():
+    """Whether the current request collects timings."""
+    return _timings.get() is not None
+
+
+@contextmanager
+def timed(stage):
+    """Charge the time spent in the block to ``stage`` of the current request."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage, time.perf_counter() - started)
+
+
+@contextmanager
+def collect_timings():
+    """Collect the stages timed in the block, e.g. outside of a request."""
+    timings = Timings()
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+class ServerTimingMiddleware:
+    """Add a Server-Timing header and a timing log line to every response."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.AUDIO_SERVER_TIMING:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with collect_timings() as timings:
+            with connection.execute_wrapper(timings.query):
+                response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        response["Server-Timing"] = timings.header(total)
+        logger.info(timings.log_line(request, response, total))
+        return response
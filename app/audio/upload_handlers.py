@@ -0,0 +1,256 @@
+"""
+Analysis of WAV uploads while their bytes arrive.
+
+AudioAnalysisUploadHandler sits in front of the handlers that store the
+upload and passes every chunk on unchanged. Chunks of 8 and 16-bit PCM WAV
+files are also decoded on the fly into the amplitude histograms, envelopes
+and waveform pyramids of every candidate channel. Only the peaks are left
+for the end: their threshold is a percentile of the whole recording, so
+finishing is one memory-mapped pass of the peak detector over the stored
+file instead of a full analysis.
+"""
+
+import os
+import struct
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler
+
+from .envelope import EnvelopeBuilder
+from .peaks import PeakDetector
+from .utils import (
+    PEAK_DISTANCE,
+    WAVE_FORMAT_EXTENSIBLE,
+    WAVE_FORMAT_PCM,
+    AudioAnalysisResult,
+    ChannelHistograms,
+    PCMStream,
+    calculate_amplitude,
+    channel_signals,
+    convert_wav_data,
+)
+from .waveform import WaveformWriter
+
+logger = logging.getLogger(__name__)
+
+# Bytes collected before they are decoded; upload chunks are only 64 KiB.
+FEED_BYTES = 1024 * 1024
+# Give up on files whose sample data does not start within this many bytes.
+MAX_HEADER_BYTES = 64 * 1024
+
+
+def parse_wav_prefix(buffer):
+    """
+    Locate the sample data in the first bytes of a WAV file.
+
+    Returns:
+        tuple: (channels, frame_rate, sample_width, data offset, data size), or
+        None while more bytes are needed
+
+    Raises:
+        ValueError: If the file is not 8 or 16-bit PCM WAV
+    """
+    if len(buffer) < 12:
+        return None
+    if buffer[:4] != b"RIFF" or buffer[8:12] != b"WAVE":
+        raise ValueError("Not a WAV file.")
+
+    fmt = None
+    position = 12
+    while len(buffer) >= position + 8:
+        chunk_id, size = struct.unpack_from("<4sI", buffer, position)
+        position += 8
+        if chunk_id == b"data":
+            if fmt is None or fmt[0] != WAVE_FORMAT_PCM or fmt[3] not in (8, 16):
+                raise ValueError("Not 8 or 16-bit PCM WAV.")
+            _, channels, frame_rate, bits = fmt
+            if not channels:
+                raise ValueError("WAV file without channels.")
+            return channels, frame_rate, bits // 8, position, size
+
+        end = position + size + size % 2
+        if chunk_id == b"fmt ":
+            if len(buffer) < end:
+                return None
+            if size < 16:
+                raise ValueError("Truncated WAV format chunk.")
+            tag, channels, frame_rate, _, _, bits = struct.unpack_from(
+                "<HHIIHH", buffer, position
+            )
+            if tag == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                tag = struct.unpack_from("<H", buffer, position + 24)[0]
+            fmt = (tag, channels, frame_rate, bits)
+        position = end
+    return None
+
+
+class InflightAnalysis:
+    """
+    Everything but the peaks of a WAV file, built from its bytes in order.
+
+    Files that turn out not to be 8 or 16-bit PCM WAV are dropped after their
+    first bytes and left to the regular analysis.
+    """
+
+    def __init__(self, waveform_dir):
+        self.waveform_dir = waveform_dir
+        self.buffer = bytearray()
+        self.header = None
+        # Bytes of sample data still expected, None up to the end of the file.
+        self.remaining = None
+        self.histograms = ChannelHistograms()
+        self.envelopes = []
+        self.waveforms = []
+        self.failed = False
+
+    @property
+    def ready(self):
+        """Whether the file could be followed up to its end."""
+        return self.header is not None and not self.failed
+
+    def feed(self, data):
+        if self.failed:
+            return
+        try:
+            if self.header is None:
+                self.buffer += data
+                self.header = parse_wav_prefix(self.buffer)
+                if self.header is None:
+                    if len(self.buffer) > MAX_HEADER_BYTES:
+                        raise ValueError("WAV header too long.")
+                    return
+                offset, size = self.header[3:]
+                data = bytes(self.buffer[offset:])
+                self.buffer = bytearray()
+                # Streamed writers leave the size empty; a size past the end
+                # of the upload simply never runs out.
+                self.remaining = size or None
+
+            if self.remaining is not None:
+                data = data[: self.remaining]
+                self.remaining -= len(data)
+            self.buffer += data
+            if len(self.buffer) >= FEED_BYTES:
+                self.decode()
+        except (ValueError, OSError) as e:
+            logger.info(f"Not analysing upload while it arrives: {str(e)}")
+            self.discard()
+            self.failed = True
+
+    def decode(self):
+        """Feed the whole frames collected so far to every candidate channel."""
+        channels, frame_rate, sample_width = self.header[:3]
+        usable = len(self.buffer) - len(self.buffer) % (channels * sample_width)
+        if not usable:
+            return
+        data = np.frombuffer(
+            bytes(self.buffer[:usable]),
+            dtype=np.uint8 if sample_width == 1 else "<i2",
+        )
+        del self.buffer[:usable]
+
+        signals = channel_signals(
+            convert_wav_data(data, sample_width).reshape(-1, channels)
+        )
+        if not self.envelopes:
+            # The final name of the upload is only known once it is stored.
+            path = os.path.join(self.waveform_dir, "upload.waveform")
+            for _ in range(signals.shape[1]):
+                self.envelopes.append(EnvelopeBuilder())
+                self.waveforms.append(WaveformWriter(path, frame_rate, 1))
+        self.histograms.feed(signals)
+        for column, envelope, waveform in zip(
+            signals.T, self.envelopes, self.waveforms
+        ):
+            envelope.feed(column)
+            waveform.feed(column)
+
+    def finish(self, audio_file_path, waveform_path=None):
+        """
+        Find the peaks in the stored upload and complete the analysis.
+
+        Args:
+            audio_file_path (str): Where the uploaded bytes were stored
+            waveform_path (str): Where to publish the waveform pyramid, if anywhere
+
+        Returns:
+            AudioAnalysisResult: Same result as analyze_audio on the stored file
+
+        Raises:
+            ValueError: If the upload has no samples
+        """
+        try:
+            self.decode()
+            if self.histograms.histogram is None:
+                raise ValueError(f"Audio file has no samples: {audio_file_path}")
+            channel, threshold = self.histograms.pick()
+
+            detector = PeakDetector(threshold, PEAK_DISTANCE)
+            hits = []
+            with PCMStream(audio_file_path) as stream:
+                for block in stream.blocks(settings.AUDIO_STREAM_BLOCK_SECONDS):
+                    block = channel_signals(block.reshape(-1, stream.channels))
+                    hits.append(detector.feed(calculate_amplitude(block[:, channel])))
+            hits.append(detector.finish())
+
+            if waveform_path is not None:
+                self.waveforms[channel].close(waveform_path)
+            envelope = self.envelopes[channel].finish()
+        finally:
+            self.discard()
+
+        return AudioAnalysisResult(
+            frame_rate=self.header[1],
+            peaks=[int(val) for val in np.concatenate(hits)],
+            envelope=envelope,
+        )
+
+    def discard(self):
+        """Release the spooled waveforms; a published one is not affected."""
+        for waveform in self.waveforms:
+            waveform.discard()
+        self.buffer = bytearray()
+
+
+class AudioAnalysisUploadHandler(FileUploadHandler):
+    """
+    Analyse WAV uploads while they are received.
+
+    Must come before the handlers that store the files. The analysis of every
+    uploaded file is kept on the request, per form field and in upload order,
+    for ``take_inflight``.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        request.inflight_analyses = {}
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.analysis = InflightAnalysis(default_storage.path("audio"))
+        analyses = self.request.inflight_analyses.setdefault(self.field_name, [])
+        analyses.append(self.analysis)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.analysis.feed(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        # The next handler builds the uploaded file.
+        return None
+
+
+def take_inflight(request, field_name, index=0):
+    """
+    The in-flight analysis of the ``index``-th file of a form field.
+
+    Returns:
+        InflightAnalysis: The analysis, or None if the file was not followed
+    """
+    analyses = getattr(request, "inflight_analyses", {}).get(field_name, [])
+    if index < len(analyses) and analyses[index].ready:
+        return analyses[index]
+    return None
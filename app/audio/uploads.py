@@ -0,0 +1,194 @@
+"""
+Resumable uploads: chunks are appended straight to the final file.
+
+An upload reserves its storage name in ``MEDIA_ROOT`` when it is created.
+Every chunk carries the offset it starts at, is written at the end of that
+file and fed to a running SHA-256, so finalizing never copies the recording.
+"""
+
+import os
+import hashlib
+from collections import OrderedDict
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from core.models import AudioFile, AudioUpload
+
+from .analysis import enqueue_analysis
+
+READ_BLOCK_BYTES = 64 * 1024
+
+# Running digests of the uploads this process received chunks for, so the
+# common case of a client talking to one worker never rereads the file.
+_digests = OrderedDict()
+MAX_DIGESTS = 256
+
+
+class UploadConflict(Exception):
+    """The chunk does not start where the upload currently ends."""
+
+
+class UploadIncomplete(Exception):
+    """The upload cannot be finalized, see the message."""
+
+
+def create_upload(user, file_name, size, distance, unit, sha256=""):
+    """Reserve the destination file of a new upload."""
+    # Named like a regular upload, short enough for AudioFile.file.
+    name = default_storage.save(
+        default_storage.generate_filename(f"audio/{file_name}"),
+        ContentFile(b""),
+        max_length=AudioFile._meta.get_field("file").max_length,
+    )
+    return AudioUpload.objects.create(
+        user=user,
+        file=name,
+        file_name=file_name,
+        size=size,
+        distance=distance,
+        unit=unit,
+        sha256=sha256.lower(),
+    )
+
+
+def running_digest(upload):
+    """SHA-256 of the first ``upload.offset`` bytes of the upload."""
+    cached = _digests.get(upload.id)
+    if cached is not None and cached[0] == upload.offset:
+        _digests.move_to_end(upload.id)
+        return cached[1].copy()
+
+    # Another worker took the previous chunk: catch up from the file.
+    digest = hashlib.sha256()
+    remaining = upload.offset
+    with open(default_storage.path(upload.file), "rb") as destination:
+        while remaining:
+            block = destination.read(min(READ_BLOCK_BYTES, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest
+
+
+def remember_digest(upload, digest):
+    _digests[upload.id] = (upload.offset, digest)
+    _digests.move_to_end(upload.id)
+    while len(_digests) > MAX_DIGESTS:
+        _digests.popitem(last=False)
+
+
+def append_chunk(upload_id, user, offset, stream, length):
+    """
+    Append ``length`` bytes read from ``stream`` at ``offset`` of an upload.
+
+    The upload row stays locked while the chunk is written, so two requests
+    for the same offset cannot interleave. Bytes past the stored offset,
+    left by a request that died before it committed, are cut off first.
+
+    Returns:
+        AudioUpload: The upload with its new offset
+
+    Raises:
+        AudioUpload.DoesNotExist: If the user has no such upload
+        UploadConflict: If ``offset`` is not the current offset
+    """
+    with transaction.atomic():
+        upload = AudioUpload.objects.select_for_update().get(
+            id=upload_id, user=user, audio_file__isnull=True
+        )
+        if offset != upload.offset:
+            raise UploadConflict(f"Upload is at offset {upload.offset}.")
+        if upload.offset + length > upload.size:
+            raise UploadConflict("Chunk goes past the announced size.")
+
+        digest = running_digest(upload)
+        path = default_storage.path(upload.file)
+        with open(path, "r+b") as destination:
+            destination.truncate(upload.offset)
+            destination.seek(upload.offset)
+            remaining = length
+            while remaining:
+                block = stream.read(min(READ_BLOCK_BYTES, remaining))
+                if not block:
+                    break
+                destination.write(block)
+                digest.update(block)
+                remaining -= len(block)
+            destination.flush()
+            os.fsync(destination.fileno())
+
+        upload.offset += length - remaining
+        upload.save(update_fields=["offset", "updated_at"])
+    remember_digest(upload, digest)
+    return upload
+
+
+def finalize_upload(upload_id, user):
+    """
+    Turn a complete upload into an AudioFile and queue its analysis.
+
+    Finalizing twice returns the same AudioFile.
+
+    Raises:
+        AudioUpload.DoesNotExist: If the user has no such upload
+        UploadIncomplete: If bytes are missing or the digest does not match
+    """
+    with transaction.atomic():
+        upload = (
+            AudioUpload.objects.select_for_update()
+            .select_related("audio_file")
+            .get(id=upload_id, user=user)
+        )
+        if upload.audio_file is not None:
+            return upload.audio_file
+        if upload.offset != upload.size:
+            raise UploadIncomplete(f"Received {upload.offset} of {upload.size} bytes.")
+        digest = running_digest(upload).hexdigest()
+        if upload.sha256 and digest != upload.sha256:
+            raise UploadIncomplete("SHA-256 of the received bytes does not match.")
+
+        # The chunks were written in place, so the file only needs its row.
+        audio_file = AudioFile.objects.create(
+            user=user, file=upload.file, distance=upload.distance, unit=upload.unit
+        )
+        upload.audio_file = audio_file
+        upload.sha256 = digest
+        upload.save(update_fields=["audio_file", "sha256", "updated_at"])
+        enqueue_analysis(audio_file)
+    _digests.pop(upload.id, None)
+    return audio_file
+
+
+def delete_upload(upload_id, user):
+    """Abort an unfinished upload and remove what was received."""
+    upload = AudioUpload.objects.get(id=upload_id, user=user, audio_file__isnull=True)
+    default_storage.delete(upload.file)
+    upload.delete()
+    _digests.pop(upload_id, None)
+
+
+def delete_abandoned_uploads(older_than):
+    """
+    Delete unfinished uploads without a chunk since ``older_than``, and their files.
+
+    Returns:
+        int: Number of uploads deleted
+    """
+    deleted = 0
+    stale = AudioUpload.objects.filter(
+        audio_file__isnull=True, updated_at__lt=older_than
+    )
+    for upload_id in stale.values_list("id", flat=True).iterator():
+        with transaction.atomic():
+            # Checked again under the lock, a chunk may have arrived since.
+            upload = stale.select_for_update().filter(id=upload_id).first()
+            if upload is None:
+                continue
+            default_storage.delete(upload.file)
+            upload.delete()
+        _digests.pop(upload_id, None)
+        deleted += 1
+    return deleted
@@ -1,14 +1,42 @@
 from django.urls import path
-from .views import AudioFileListView, AudioFileDetailView, AudioStatisticsView
+from .views import (
+    AudioFileListView,
+    AudioFileBatchView,
+    AudioFileDetailView,
+    AudioStatisticsView,
+    AudioUploadDetailView,
+    AudioUploadFinalizeView,
+    AudioUploadListView,
+    AudioWaveformView,
+)
 
 app_name = "audio"
 
 
 urlpatterns = [
     path("audio-files/", AudioFileListView.as_view(), name="audiofile-list-create"),
+    path(
+        "audio-files/batch/", AudioFileBatchView.as_view(), name="audiofile-batch"
+    ),
     path(
         "audio-files/<int:id>/", AudioFileDetailView.as_view(), name="audiofile-detail"
     ),
+    path(
+        "audio-files/<int:id>/waveform/",
+        AudioWaveformView.as_view(),
+        name="audiofile-waveform",
+    ),
+    path("audio-uploads/", AudioUploadListView.as_view(), name="audioupload-create"),
+    path(
+        "audio-uploads/<uuid:id>/",
+        AudioUploadDetailView.as_view(),
+        name="audioupload-detail",
+    ),
+    path(
+        "audio-uploads/<uuid:id>/finalize/",
+        AudioUploadFinalizeView.as_view(),
+        name="audioupload-finalize",
+    ),
     path(
         "audio-statistics/", AudioStatisticsView.as_view(), name="audio-statistics"
     ),  # New endpoint
@@ -1,8 +1,22 @@
 import os
+import wave
+import struct
 import logging
+import tempfile
+import subprocess
+from collections import namedtuple
+
 import numpy as np
+import soundfile
+from django.conf import settings
 from pydub import AudioSegment
-from scipy.signal import find_peaks
+
+from .canonical import CanonicalWriter
+from .envelope import EnvelopeBuilder, to_int16
+from .pcm_cache import PCMCache
+from .peaks import PeakDetector, find_distant_peaks
+from .timing import timed
+from .waveform import WaveformWriter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -12,11 +26,11 @@ logger = logging.getLogger(__name__)
 def convert_speed_to_mph(speed, unit):
     """
     Convert speed from different units to miles per hour (MPH).
-    
+
     Args:
         speed (float): Speed value to convert
         unit (str): Unit of measurement ('inches', 'meters', or 'centimeters')
-    
+
     Returns:
         float: Speed in MPH
     """
@@ -29,73 +43,653 @@ def convert_speed_to_mph(speed, unit):
     return speed
 
 
-def calculate_speed_of_sound(distance, audio_file_path, unit="inches"):
+# Bump whenever the detection logic changes so stored results can be refreshed.
+ANALYSIS_VERSION = 6
+
+# Peak detection parameters
+PEAK_PERCENTILE = 95
+PEAK_DISTANCE = 5000
+
+UNIT_CONVERSION = {
+    "inches": 0.0254,
+    "meters": 1,
+    "centimeters": 0.01,
+}
+
+
+class AudioAnalysisResult:
+    """Unit independent outcome of analysing an audio file."""
+
+    def __init__(self, frame_rate, peaks, envelope):
+        self.frame_rate = frame_rate
+        self.peaks = peaks
+        self.envelope = envelope
+
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+WavHeader = namedtuple(
+    "WavHeader", ["channels", "frame_rate", "sample_width", "offset", "frames"]
+)
+
+# FLAC subtypes decoded in-process, with the sample type pydub would produce.
+FLAC_DTYPES = {"PCM_16": "int16", "PCM_24": "int32", "PCM_32": "int32"}
+
+
+def sniff_format(audio_file_path):
+    """Recognise WAV and FLAC files from their magic bytes."""
+    with open(audio_file_path, "rb") as audio_file:
+        magic = audio_file.read(12)
+    if magic[:4] == b"RIFF" and magic[8:12] == b"WAVE":
+        return "wav"
+    if magic[:4] == b"fLaC":
+        return "flac"
+    return None
+
+
+def read_wav_header(audio_file_path):
     """
-    Calculate the speed of sound based on audio file analysis.
-    
+    Locate the sample data of a PCM WAV file.
+
+    Returns:
+        WavHeader: Format and position of the data, or None if the file is not
+        integer PCM WAV
+    """
+    with open(audio_file_path, "rb") as audio_file:
+        riff = audio_file.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            return None
+
+        fmt = None
+        while True:
+            chunk = audio_file.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = struct.unpack("<4sI", chunk)
+
+            if chunk_id == b"fmt ":
+                body = audio_file.read(size + size % 2)
+                if len(body) < 16:
+                    return None
+                tag, channels, frame_rate, _, _, bits = struct.unpack_from(
+                    "<HHIIHH", body
+                )
+                if tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    tag = struct.unpack_from("<H", body, 24)[0]
+                fmt = (tag, channels, frame_rate, bits)
+            elif chunk_id == b"data":
+                if fmt is None or fmt[0] != WAVE_FORMAT_PCM or fmt[3] % 8:
+                    return None
+                _, channels, frame_rate, bits = fmt
+                offset = audio_file.tell()
+                available = os.fstat(audio_file.fileno()).st_size - offset
+                # Streamed writers leave the size empty or at its maximum.
+                if size == 0 or size > available:
+                    size = available
+                sample_width = bits // 8
+                if not channels or sample_width not in (1, 2, 3, 4):
+                    return None
+                frames = size // (channels * sample_width)
+                return WavHeader(channels, frame_rate, sample_width, offset, frames)
+            else:
+                audio_file.seek(size + size % 2, os.SEEK_CUR)
+
+
+def map_wav_data(audio_file_path, header):
+    """Read-only memory map of the raw WAV data, without any decoding or copy."""
+    count = header.frames * header.channels
+    if count == 0:
+        return np.empty(0, dtype=np.uint8 if header.sample_width == 1 else "<i2")
+    dtype = {1: np.uint8, 2: "<i2", 3: np.uint8, 4: "<i4"}[header.sample_width]
+    if header.sample_width == 3:
+        count *= 3
+    return np.memmap(
+        audio_file_path, dtype=dtype, mode="r", offset=header.offset, shape=(count,)
+    )
+
+
+def convert_wav_data(data, sample_width):
+    """Turn raw WAV data into the signed samples pydub would return."""
+    if sample_width == 1:
+        # 8-bit WAV is unsigned.
+        return (data ^ 0x80).view(np.int8)
+    if sample_width == 3:
+        # 24-bit samples are widened to 32 bits, keeping the high bytes.
+        raw = data.reshape(-1, 3).astype(np.int32)
+        return (raw[:, 0] << 8) | (raw[:, 1] << 16) | (raw[:, 2] << 24)
+    return data
+
+
+def read_wav_samples(audio_file_path, header):
+    """Samples of a PCM WAV file; 16 and 32-bit data stays a zero-copy memmap."""
+    data = map_wav_data(audio_file_path, header)
+    return convert_wav_data(data, header.sample_width)
+
+
+def decode_flac(audio_file_path):
+    """
+    Decode a FLAC file in-process with libsndfile.
+
+    Returns:
+        tuple: (samples, frame_rate, channels), or None for unsupported subtypes
+    """
+    info = soundfile.info(audio_file_path)
+    dtype = FLAC_DTYPES.get(info.subtype)
+    if dtype is None:
+        return None
+    samples, frame_rate = soundfile.read(audio_file_path, dtype=dtype, always_2d=True)
+    return samples.reshape(-1), frame_rate, info.channels
+
+
+def decode_audio(audio_file_path):
+    """
+    Decode an audio file to interleaved samples.
+
+    PCM WAV is memory-mapped and FLAC is decoded in-process; ffmpeg (through
+    pydub) is only started for MP3 and other codecs.
+
+    Returns:
+        tuple: (samples, frame_rate, channels)
+    """
+    audio_format = sniff_format(audio_file_path)
+    if audio_format == "wav":
+        header = read_wav_header(audio_file_path)
+        if header is not None:
+            samples = read_wav_samples(audio_file_path, header)
+            return samples, header.frame_rate, header.channels
+    elif audio_format == "flac":
+        decoded = decode_flac(audio_file_path)
+        if decoded is not None:
+            return decoded
+
+    audio = AudioSegment.from_file(audio_file_path)
+    samples = np.array(audio.get_array_of_samples())
+    return samples, audio.frame_rate, audio.channels
+
+
+def load_samples(audio_file_path, cache_result=True):
+    """
+    Return the decoded samples of a file, reusing the shared PCM cache.
+
+    A cache hit maps the samples another worker already decoded instead of
+    decoding the file again. PCM WAV is mapped directly and never cached.
+
     Args:
-        distance (float): Distance value
         audio_file_path (str): Path to the audio file
-        unit (str): Unit of measurement (default: 'inches')
-    
+        cache_result (bool): Whether to cache the samples if they had to be
+            decoded; not worth it when later analyses read a canonical copy
+
     Returns:
-        tuple: (speed_in_meters_per_second, speed_unit, speed_in_mph, mph_unit, hits_formatted, amplitude_formatted)
-    """
-    # Unit conversion dictionary
-    unit_conversion = {
-        "inches": 0.0254,
-        "meters": 1,
-        "centimeters": 0.01,
-    }
-    
-    # Convert distance to meters
-    distance_in_meters = distance * unit_conversion.get(unit, 1)
+        tuple: (samples, frame_rate, channels)
+    """
+    header = read_wav_header(audio_file_path)
+    if header is not None and header.sample_width in (2, 4):
+        samples = read_wav_samples(audio_file_path, header)
+        return samples, header.frame_rate, header.channels
+
+    cache = PCMCache.from_settings()
+    cached = cache.get(audio_file_path)
+    if cached is not None:
+        return cached
+
+    samples, frame_rate, channels = decode_audio(audio_file_path)
+    if cache_result:
+        cache.put(audio_file_path, samples, frame_rate, channels)
+    return samples, frame_rate, channels
 
-    # Check if audio file exists
+
+def analyze_audio(audio_file_path, waveform_path=None, canonical_path=None):
+    """
+    Decode an audio file and locate the impact peaks in it.
+
+    Args:
+        audio_file_path (str): Path to the audio file
+        waveform_path (str): Where to write the waveform pyramid, if anywhere
+        canonical_path (str): Where to keep the analysed signal as mono PCM
+            WAV, if the file had to be decoded
+
+    Returns:
+        AudioAnalysisResult: Frame rate, peak sample indices and waveform envelope
+
+    Raises:
+        FileNotFoundError: If the audio file does not exist
+    """
     if not os.path.exists(audio_file_path):
-        logger.error(f"Audio file not found: {audio_file_path}")
-        return 0, "m/s", 0, "MPH", [], []
+        raise FileNotFoundError(f"Audio file not found: {audio_file_path}")
 
-    try:
-        # Load audio file
-        audio = AudioSegment.from_file(audio_file_path)
-        audio_data = np.array(audio.get_array_of_samples())
-        
+    # Long recordings are analysed block by block to bound memory use.
+    if os.path.getsize(audio_file_path) > settings.AUDIO_STREAM_MIN_BYTES:
+        return analyze_audio_stream(
+            audio_file_path,
+            waveform_path=waveform_path,
+            canonical_path=canonical_path,
+        )
+
+    # Load audio file
+    audio_data, frame_rate, decoded = load_signal(
+        audio_file_path, keep_copy=canonical_path is not None
+    )
+
+    with timed("peaks"):
         # Calculate amplitude
-        amplitude = np.abs(audio_data)
-        threshold = np.percentile(amplitude, 95)
-        
+        amplitude = calculate_amplitude(audio_data)
+        threshold = np.percentile(amplitude, PEAK_PERCENTILE)
+
         # Find peaks in the audio signal
-        hits, _ = find_peaks(amplitude, height=threshold, distance=5000)
-        
-        # Format amplitude and hits data
-        amplitude_formatted = [
-            {"value": int(val)} 
-            for val in amplitude[amplitude >= 15000]
-        ]
-        hits_formatted = [{"value": int(val)} for val in hits]
-
-        # Calculate speed if we have at least two peaks
-        if len(hits) > 1:
-            # Calculate time difference between first two peaks
-            time_difference = (hits[1] - hits[0]) / audio.frame_rate
-            
-            # Calculate speeds
-            speed_in_meters_per_second = distance_in_meters / time_difference
-            speed_in_mph = speed_in_meters_per_second * 2.23694
-
-            return (
-                round(speed_in_meters_per_second, 2),
-                "m/s",
-                round(speed_in_mph, 2),
-                "MPH",
-                hits_formatted,
-                amplitude_formatted,
+        hits = find_distant_peaks(amplitude, threshold, PEAK_DISTANCE)
+
+    return build_result(
+        audio_data, frame_rate, hits, waveform_path, canonical_path, decoded
+    )
+
+
+def load_signal(audio_file_path, keep_copy=False):
+    """
+    Decode a file and pick the signal the analysis looks at.
+
+    Args:
+        audio_file_path (str): Path to the audio file
+        keep_copy (bool): Whether a decoded file gets a canonical copy, which
+            later analyses read instead of the PCM cache
+
+    Returns:
+        tuple: (signal, frame_rate, whether the file needed a decoder)
+    """
+    with timed("decode"):
+        decoded = read_wav_header(audio_file_path) is None
+        samples, frame_rate, channels = load_samples(
+            audio_file_path, cache_result=not (keep_copy and decoded)
+        )
+        if samples.dtype.itemsize > 2:
+            # Analysed at 16 bits like the streamed analysis, whose exact
+            # amplitude histograms cannot hold wider samples.
+            samples = to_int16(samples)
+        signals = channel_signals(samples.reshape(-1, channels))
+        return signals[:, loudest_channel(signals)], frame_rate, decoded
+
+
+def build_result(
+    signal, frame_rate, hits, waveform_path=None, canonical_path=None, decoded=False
+):
+    """Envelope, waveform pyramid and canonical copy of an analysed signal."""
+    with timed("envelope"):
+        envelope = EnvelopeBuilder()
+        envelope.feed(signal)
+
+        if waveform_path is not None:
+            waveform = WaveformWriter(waveform_path, frame_rate, 1)
+            waveform.feed(signal)
+            waveform.close()
+
+        if canonical_path is not None and decoded:
+            canonical = CanonicalWriter(
+                canonical_path, frame_rate, signal.dtype.itemsize
             )
+            canonical.feed(signal)
+            canonical.close()
+
+        return AudioAnalysisResult(
+            frame_rate=frame_rate,
+            peaks=[int(val) for val in hits],
+            envelope=envelope.finish(),
+        )
+
+
+def calculate_amplitude(samples):
+    """Absolute sample values, widened so the most negative sample cannot overflow."""
+    return np.abs(samples, dtype=np.int32 if samples.dtype.itemsize <= 2 else np.int64)
+
+
+def channel_signals(frames):
+    """
+    Candidate signals for the analysis of ``(frames, channels)`` samples.
+
+    With ``AUDIO_CHANNEL_MODE = "loudest"`` every channel is a candidate and
+    the one with the most energy is analysed; with ``"mix"`` the channels are
+    averaged into a single signal. Either way peak indices count frames, so
+    they match the frame rate.
+
+    Returns:
+        np.ndarray: (frames, candidates) array, a view of ``frames`` if possible
+    """
+    if frames.shape[1] == 1 or settings.AUDIO_CHANNEL_MODE != "mix":
+        return frames
+    mixed = frames.sum(axis=1, dtype=np.int64) // frames.shape[1]
+    return mixed.astype(frames.dtype)[:, np.newaxis]
+
+
+def channel_energy(signals):
+    """Sum of squares of every column, without a widened copy of the samples."""
+    return np.einsum("ij,ij->j", signals, signals, dtype=np.float64)
+
+
+def loudest_channel(signals):
+    """Column of ``signals`` with the most energy."""
+    if signals.shape[1] == 1:
+        return 0
+    return int(np.argmax(channel_energy(signals)))
+
+
+class PCMStream:
+    """
+    Sequential reader of interleaved PCM samples with at most 16 bits.
+
+    PCM WAV data is sliced straight out of a memory map and FLAC is decoded
+    in-process. Any other input is decoded by an ffmpeg process into a 16-bit
+    WAV pipe, so only one block is ever in memory. Wider samples keep their
+    top 16 bits, as ffmpeg would.
+    """
+
+    def __init__(self, audio_file_path):
+        self.process = None
+        self.reader = None
+        self.flac = None
+        self.data = None
+
+        audio_format = sniff_format(audio_file_path)
+        if audio_format == "wav":
+            header = read_wav_header(audio_file_path)
+            if header is not None:
+                self.data = map_wav_data(audio_file_path, header)
+                self.frame_rate = header.frame_rate
+                self.channels = header.channels
+                self.sample_width = header.sample_width
+                return
+        elif audio_format == "flac":
+            if soundfile.info(audio_file_path).subtype in FLAC_DTYPES:
+                # libsndfile keeps the top 16 bits of wider samples.
+                self.flac = soundfile.SoundFile(audio_file_path)
+                self.frame_rate = self.flac.samplerate
+                self.channels = self.flac.channels
+                self.sample_width = 2
+                return
+
+        self.process = subprocess.Popen(
+            [
+                AudioSegment.converter,
+                "-v",
+                "error",
+                "-i",
+                audio_file_path,
+                "-vn",
+                "-acodec",
+                "pcm_s16le",
+                "-f",
+                "wav",
+                "-",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            self.reader = wave.open(self.process.stdout, "rb")
+        except (wave.Error, EOFError):
+            self.close()
+            raise ValueError(f"Could not decode audio file: {audio_file_path}")
+
+        self.frame_rate = self.reader.getframerate()
+        self.channels = self.reader.getnchannels()
+        self.sample_width = self.reader.getsampwidth()
+
+    def blocks(self, block_seconds):
+        """Yield blocks of at most ``block_seconds`` of interleaved samples."""
+        frames = max(1, int(block_seconds * self.frame_rate))
+        if self.data is not None:
+            # 24-bit data is mapped as bytes.
+            step = frames * self.channels * (3 if self.sample_width == 3 else 1)
+            for start in range(0, self.data.size, step):
+                block = self.data[start : start + step]
+                samples = convert_wav_data(block, self.sample_width)
+                yield to_int16(samples) if self.sample_width > 2 else samples
+        elif self.flac is not None:
+            blocks = self.flac.blocks(blocksize=frames, dtype="int16", always_2d=True)
+            for block in blocks:
+                yield block.reshape(-1)
         else:
-            logger.warning(f"Not enough peaks detected in audio file: {audio_file_path}")
-            return 0, "m/s", 0, "MPH", hits_formatted, amplitude_formatted
+            while True:
+                data = self.reader.readframes(frames)
+                if not data:
+                    break
+                yield np.frombuffer(data, dtype="<i2")
 
+    def close(self):
+        if self.flac is not None:
+            self.flac.close()
+        if self.reader is not None:
+            self.reader.close()
+        if self.process is not None:
+            self.process.stdout.close()
+            self.process.kill()
+            self.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def percentile_from_histogram(histogram, q):
+    """
+    Exact ``np.percentile`` (linear method) of integer values given their counts.
+
+    Args:
+        histogram (np.ndarray): Number of occurrences of each value 0..len-1
+        q (float): Percentile to compute
+
+    Returns:
+        float: The percentile
+    """
+    counts = np.cumsum(histogram)
+    total = int(counts[-1])
+    if total == 0:
+        raise ValueError("Cannot compute a percentile of an empty signal.")
+
+    position = (q / 100) * (total - 1)
+    below = int(np.floor(position))
+    low = np.searchsorted(counts, below, side="right")
+    high = np.searchsorted(counts, min(below + 1, total - 1), side="right")
+    return low + (high - low) * (position - below)
+
+
+class ChannelHistograms:
+    """
+    Exact amplitude histograms and energies of every candidate channel.
+
+    Fed with the ``(frames, candidates)`` blocks of ``channel_signals``; the
+    memory used does not depend on the length of the recording.
+    """
+
+    def __init__(self):
+        self.histogram = None
+        self.energy = None
+
+    def feed(self, signals):
+        # One bincount for all candidates: column k counts from k * 32769.
+        amplitude = calculate_amplitude(signals)
+        amplitude += np.arange(signals.shape[1], dtype=np.int32) * 32769
+        counts = np.bincount(
+            amplitude.ravel(), minlength=signals.shape[1] * 32769
+        ).reshape(signals.shape[1], 32769)
+        if self.histogram is None:
+            self.histogram, self.energy = counts, channel_energy(signals)
+        else:
+            self.histogram += counts
+            self.energy += channel_energy(signals)
+
+    def pick(self):
+        """
+        Candidate to analyse and its peak threshold.
+
+        Returns:
+            tuple: (column of the loudest candidate, threshold)
+        """
+        channel = int(np.argmax(self.energy))
+        return channel, percentile_from_histogram(
+            self.histogram[channel], PEAK_PERCENTILE
+        )
+
+
+def analyze_audio_stream(
+    audio_file_path, block_seconds=None, waveform_path=None, canonical_path=None
+):
+    """
+    Analyse a recording without ever holding the whole signal in memory.
+
+    A first pass builds an exact amplitude histogram of every candidate
+    channel and picks the one to analyse, a second pass feeds its blocks to
+    an online peak detector. Non-WAV inputs are decoded once and spooled to
+    a temporary WAV file for the second pass instead of decoding twice.
+
+    Args:
+        audio_file_path (str): Path to the audio file
+        block_seconds (float): Seconds of audio per block (default: setting)
+        waveform_path (str): Where to write the waveform pyramid, if anywhere
+        canonical_path (str): Where to keep the analysed signal as mono PCM
+            WAV, if the file had to be decoded
+
+    Returns:
+        AudioAnalysisResult: Same result as the in-memory analysis
+    """
+    if block_seconds is None:
+        block_seconds = settings.AUDIO_STREAM_BLOCK_SECONDS
+
+    histograms = ChannelHistograms()
+    spool = canonical = None
+    try:
+        with timed("decode"), PCMStream(audio_file_path) as stream:
+            frame_rate = stream.frame_rate
+            channels = stream.channels
+            decoded = stream.data is None
+            if stream.process is not None:
+                spool = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
+                writer = wave.open(spool, "wb")
+                writer.setnchannels(stream.channels)
+                writer.setsampwidth(2)
+                writer.setframerate(frame_rate)
+            for block in stream.blocks(block_seconds):
+                histograms.feed(channel_signals(block.reshape(-1, channels)))
+                if spool is not None:
+                    writer.writeframes(block.tobytes())
+            if spool is not None:
+                writer.close()
+                spool.close()
+
+        if histograms.histogram is None:
+            raise ValueError(f"Audio file has no samples: {audio_file_path}")
+        channel, threshold = histograms.pick()
+
+        detector = PeakDetector(threshold, PEAK_DISTANCE)
+        envelope = EnvelopeBuilder()
+        hits = []
+        with PCMStream(spool.name if spool else audio_file_path) as stream:
+            waveform = None
+            if waveform_path is not None:
+                waveform = WaveformWriter(waveform_path, frame_rate, 1)
+            if canonical_path is not None and decoded:
+                canonical = CanonicalWriter(
+                    canonical_path, frame_rate, stream.sample_width
+                )
+            for block in stream.blocks(block_seconds):
+                block = channel_signals(block.reshape(-1, channels))[:, channel]
+                with timed("peaks"):
+                    hits.append(detector.feed(calculate_amplitude(block)))
+                envelope.feed(block)
+                if waveform is not None:
+                    waveform.feed(block)
+                if canonical is not None:
+                    canonical.feed(block)
+        hits.append(detector.finish())
+        if waveform is not None:
+            waveform.close()
+        if canonical is not None:
+            canonical.close()
+            canonical = None
+    finally:
+        if canonical is not None:
+            canonical.discard()
+        if spool is not None:
+            spool.close()
+            os.unlink(spool.name)
+
+    hits = np.concatenate(hits)
+
+    return AudioAnalysisResult(
+        frame_rate=frame_rate,
+        peaks=[int(val) for val in hits],
+        envelope=envelope.finish(),
+    )
+
+
+def calculate_speed_from_peaks(distance, peaks, frame_rate, unit="inches"):
+    """
+    Calculate the speed between the first two peaks.
+
+    Args:
+        distance (float): Distance value
+        peaks (list): Peak sample indices
+        frame_rate (int): Sample rate the peak indices refer to
+        unit (str): Unit of measurement (default: 'inches')
+
+    Returns:
+        tuple: (speed_in_meters_per_second, speed_in_mph), both 0 with fewer than two peaks
+    """
+    if len(peaks) < 2 or not frame_rate:
+        return 0, 0
+
+    # Convert distance to meters
+    distance_in_meters = distance * UNIT_CONVERSION.get(unit, 1)
+
+    # Calculate time difference between first two peaks
+    time_difference = (peaks[1] - peaks[0]) / frame_rate
+
+    # Calculate speeds
+    speed_in_meters_per_second = distance_in_meters / time_difference
+    speed_in_mph = speed_in_meters_per_second * 2.23694
+
+    return round(speed_in_meters_per_second, 2), round(speed_in_mph, 2)
+
+
+def format_values(values):
+    """Wrap plain values in the ``{"value": int}`` shape used by the API."""
+    return [{"value": int(val)} for val in values]
+
+
+def calculate_speed_of_sound(distance, audio_file_path, unit="inches"):
+    """
+    Calculate the speed of sound based on audio file analysis.
+
+    Args:
+        distance (float): Distance value
+        audio_file_path (str): Path to the audio file
+        unit (str): Unit of measurement (default: 'inches')
+
+    Returns:
+        tuple: (speed_in_meters_per_second, speed_unit, speed_in_mph, mph_unit, hits_formatted, envelope)
+    """
+    try:
+        result = analyze_audio(audio_file_path)
+    except FileNotFoundError as e:
+        logger.error(str(e))
+        return 0, "m/s", 0, "MPH", [], {}
     except Exception as e:
         logger.error(f"Error processing audio file {audio_file_path}: {str(e)}")
-        return 0, "m/s", 0, "MPH", [], []
+        return 0, "m/s", 0, "MPH", [], {}
+
+    hits_formatted = format_values(result.peaks)
+
+    if len(result.peaks) < 2:
+        logger.warning(f"Not enough peaks detected in audio file: {audio_file_path}")
+
+    speed_in_meters_per_second, speed_in_mph = calculate_speed_from_peaks(
+        distance, result.peaks, result.frame_rate, unit
+    )
+    return (
+        speed_in_meters_per_second,
+        "m/s",
+        speed_in_mph,
+        "MPH",
+        hits_formatted,
+        result.envelope.as_dict(),
+    )
@@ -1,92 +1,234 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework import status, generics, authentication, permissions
-from core.models import AudioFile
-from .serializers import AudioFileSerializer
-from .utils import calculate_speed_of_sound, validate_audio_file
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.db.models import Count, Max
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date
+from core.models import AudioAnalysis, AudioFile, AudioUpload
+from .analysis import (
+    enqueue_analysis,
+    get_analysis,
+    get_envelope,
+    needs_analysis,
+    refresh_speed,
+    run_analysis,
+    run_batch_analysis,
+)
+from .cache import cached_response, invalidate_responses, store_response
+from .canonical import delete_canonical
+from .pagination import KeysetPagination
+from .renderers import AUDIO_RENDERER_CLASSES, packs_arrays
+from .summary import get_summary, record_changes
+from .timing import timed, timing_active
+from .serializers import (
+    AudioFileSerializer,
+    AudioUploadSerializer,
+    format_peaks,
+    requested_points,
+)
+from .upload_handlers import AudioAnalysisUploadHandler, take_inflight
+from .uploads import (
+    UploadConflict,
+    UploadIncomplete,
+    append_chunk,
+    delete_upload,
+    finalize_upload,
+)
+from .utils import ANALYSIS_VERSION
+from .waveform import MAX_TILE_POINTS, WaveformFile, delete_waveform, waveform_path
+import hashlib
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-class AudioFileListView(generics.ListCreateAPIView):
+def audio_validators(request, audio_files, collection=False):
+    """
+    Strong ETag and last modification of a response built from ``audio_files``.
+
+    One aggregate query covers the file count, the latest change of a file
+    and of an analysis; the analysis version, renderer and query parameters
+    are mixed in as they change the body too. A delete leaves no row behind
+    to date it, so a ``collection`` of the user's files also counts the last
+    change of their SpeedSummary, which every upload, delete and analysis
+    updates.
+
+    Returns:
+        tuple: (etag, last_modified, number of files), last_modified None
+        without any file
+    """
+    changed = {
+        "file_changed": Max("updated_at"),
+        "analysis_changed": Max("analysis__updated_at"),
+    }
+    if collection:
+        changed["summary_changed"] = Max("user__speed_summary__updated_at")
+    state = audio_files.aggregate(files=Count("id"), **changed)
+    changes = [state[name] for name in changed]
+    last_modified = max((change for change in changes if change), default=None)
+    key = "|".join(
+        [
+            str(state["files"]),
+            *(change.isoformat() if change else "" for change in changes),
+            str(ANALYSIS_VERSION),
+            request.accepted_renderer.format,
+            request.GET.urlencode(),
+        ]
+    )
+    etag = f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+    return etag, last_modified, state["files"]
+
+
+def not_modified(request, etag, last_modified):
+    """304 response if the client's copy matches the validators, else None."""
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def conditional_response(
+    request, audio_files, scope, build_response, audio_file_id=None, prepare=None
+):
+    """
+    Answer 304 when the client is up to date, before anything is serialized.
+
+    ``build_response`` is only called when the client's copy is stale and
+    the response cache has no body for the current ETag. ``prepare`` runs
+    right before it, e.g. to analyse missing results, and returns whether it
+    changed anything; the validators are then taken again, so they never
+    describe an older state than the body does.
+
+    Raises:
+        Http404: If ``audio_file_id`` is given but not in ``audio_files``,
+        before any ETag is compared
+    """
+    collection = audio_file_id is None
+    etag, last_modified, files = audio_validators(request, audio_files, collection)
+    if audio_file_id is not None and not files:
+        raise Http404("No such audio file.")
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        key, response = cached_response(request, scope, etag, audio_file_id)
+    if response is None and prepare is not None and prepare():
+        etag, last_modified, _ = audio_validators(request, audio_files, collection)
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            key, response = cached_response(request, scope, etag, audio_file_id)
+    if response is None:
+        response = build_response()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        store_response(key, etag, response)
+
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    # Polling clients keep their copy but must check it on every request.
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["Accept", "Authorization"])
+    return response
+
+
+def analyze_or_enqueue(request, audio_file, field_name="file", index=0):
+    """Finish the analysis followed during the upload, or queue a full one."""
+    inflight = take_inflight(request, field_name, index)
+    if inflight is None:
+        return enqueue_analysis(audio_file)
+    with timed("analysis"):
+        return run_analysis(audio_file, inflight)
+
+
+def upload_status(audio_file):
+    """201 once the upload is analysed, 202 while it waits for a worker"""
+    if audio_file.analysis.status == AudioAnalysis.STATUS_PENDING:
+        return status.HTTP_202_ACCEPTED
+    return status.HTTP_201_CREATED
+
+
+class ServerTimingMixin:
+    """Time token authentication and rendering for the Server-Timing header."""
+
+    def perform_authentication(self, request):
+        with timed("auth"):
+            super().perform_authentication(request)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # Rendered here rather than by Django so the time can be told apart.
+        if timing_active() and isinstance(response, Response):
+            with timed("render"):
+                response.render()
+        return response
+
+
+class AnalyzeWhileUploadingMixin:
+    """Analyse WAV uploads while the request body is still being received."""
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Upload handlers must be in place before the body is parsed.
+        if request.method in ("POST", "PUT", "PATCH") and (
+            settings.AUDIO_ANALYZE_DURING_UPLOAD
+        ):
+            request.upload_handlers.insert(0, AudioAnalysisUploadHandler(request))
+        return super().initialize_request(request, *args, **kwargs)
+
+
+class AudioFileListView(
+    ServerTimingMixin, AnalyzeWhileUploadingMixin, generics.ListCreateAPIView
+):
     queryset = AudioFile.objects.all()
     serializer_class = AudioFileSerializer
-    pagination_class = LimitOffsetPagination
+    pagination_class = KeysetPagination
     parser_classes = [MultiPartParser, FormParser]
     permission_classes = [permissions.IsAuthenticated]
     authentication_classes = [authentication.TokenAuthentication]
+    renderer_classes = AUDIO_RENDERER_CLASSES
 
     def get_queryset(self):
         """Get queryset filtered by current user"""
-        return AudioFile.objects.filter(user=self.request.user).order_by("-updated_at")
+        return AudioFile.objects.filter(user=self.request.user).select_related(
+            "analysis"
+        )
 
     def perform_create(self, serializer):
-        """Save the audio file with the current user"""
+        """Save the audio file with the current user and analyse or queue it"""
         serializer.save(user=self.request.user)
-
-    def calculate_speed_and_peaks(self, instance):
-        """Calculate speed and peaks from audio file"""
-        try:
-            speed_mps, speed_unit, speed_mph, mph_unit, peaks, amplitude_formatted = calculate_speed_of_sound(
-                float(instance.distance), instance.file.path, instance.unit
-            )
-            return speed_mps, speed_unit, speed_mph, mph_unit, peaks, amplitude_formatted
-        except Exception as e:
-            logger.error(f"Error calculating speed and peaks: {str(e)}")
-            return 0, "m/s", 0, "MPH", [], []
+        analyze_or_enqueue(self.request, serializer.instance)
 
     def list(self, request, *args, **kwargs):
-        """List audio files with speed calculations"""
+        """One page of audio files with their stored speed calculations"""
         queryset = self.get_queryset()
-        audio_files_data = []
 
-        for instance in queryset:
-            try:
-                serializer = self.get_serializer(instance)
-                speed_mps, speed_unit, speed_mph, mph_unit, peaks, amplitude_formatted = (
-                    self.calculate_speed_and_peaks(instance)
-                )
-                audio_files_data.append(
-                    {
-                        **serializer.data,
-                        "speed_mps": speed_mps,
-                        "speed_unit": speed_unit,
-                        "peaks": peaks,
-                        "speed_mph": speed_mph,
-                        "unit_mph": mph_unit,
-                        "amplitude_formatted": amplitude_formatted,
-                    }
-                )
-            except Exception as e:
-                logger.error(f"Error processing audio file {instance.id}: {str(e)}")
+        def build_response():
+            page = self.paginate_queryset(queryset)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
 
-        return Response(audio_files_data, status=status.HTTP_200_OK)
+        return conditional_response(request, queryset, "list", build_response)
 
     def post(self, request, *args, **kwargs):
-        """Create new audio file entry"""
+        """Create new audio file entry; WAV uploads are analysed on arrival"""
         serializer = self.get_serializer(data=request.data)
 
         if serializer.is_valid():
             try:
-                serializer.save(user=request.user)
-                speed_mps, speed_unit, speed_mph, mph_unit, peaks, amplitude_formatted = (
-                    self.calculate_speed_and_peaks(serializer.instance)
-                )
-
+                self.perform_create(serializer)
                 return Response(
-                    {
-                        **serializer.data,
-                        "speed_mps": speed_mps,
-                        "speed_unit": speed_unit,
-                        "peaks": peaks,
-                        "speed_mph": speed_mph,
-                        "unit_mph": mph_unit,
-                        "amplitude_formatted": amplitude_formatted,
-                    },
-                    status=status.HTTP_201_CREATED,
+                    serializer.data,
+                    status=upload_status(serializer.instance),
+                    headers={"Location": self.detail_url(serializer.instance)},
                 )
             except Exception as e:
                 logger.error(f"Error in post: {str(e)}")
@@ -96,23 +238,144 @@ class AudioFileListView(generics.ListCreateAPIView):
                 )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def detail_url(self, instance):
+        """URL clients poll for the analysis result"""
+        return self.request.build_absolute_uri(
+            reverse("audio:audiofile-detail", args=[instance.id])
+        )
+
+
+def batch_value(values, index):
+    """One value shared by the whole batch, or the value of the file at ``index``."""
+    if not values:
+        return None
+    return values[0] if len(values) == 1 else values[index]
+
+
+class AudioFileBatchView(ServerTimingMixin, AnalyzeWhileUploadingMixin, APIView):
+    parser_classes = [MultiPartParser, FormParser]
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [authentication.TokenAuthentication]
+    renderer_classes = AUDIO_RENDERER_CLASSES
+
+    def post(self, request, *args, **kwargs):
+        """
+        Create and analyse a whole session of uploads in one request.
+
+        ``files`` holds the uploads; ``distance`` and ``unit`` are given once
+        for all of them or once per file, in the same order. Every file gets
+        its own result or validation errors.
+        """
+        files = request.FILES.getlist("files")
+        distances = request.data.getlist("distance")
+        units = request.data.getlist("unit")
+
+        if not files:
+            return Response(
+                {"files": ["No files were submitted."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(files) > settings.AUDIO_BATCH_MAX_FILES:
+            return Response(
+                {
+                    "files": [
+                        f"At most {settings.AUDIO_BATCH_MAX_FILES} files per batch."
+                    ]
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(distances) > 1 and len(distances) != len(files):
+            return Response(
+                {"distance": ["Give one distance, or one per file."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(units) > 1 and len(units) != len(files):
+            return Response(
+                {"unit": ["Give one unit, or one per file."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        context = {"request": request}
+        results = [None] * len(files)
+        valid = []
+        for index, upload in enumerate(files):
+            data = {"file": upload, "distance": batch_value(distances, index)}
+            if units:
+                data["unit"] = batch_value(units, index)
+            serializer = AudioFileSerializer(data=data, context=context)
+            if serializer.is_valid():
+                valid.append(
+                    (index, AudioFile(user=request.user, **serializer.validated_data))
+                )
+            else:
+                results[index] = {"file_name": upload.name, "errors": serializer.errors}
+
+        try:
+            with transaction.atomic():
+                created = AudioFile.objects.bulk_create(
+                    [audio_file for _, audio_file in valid]
+                )
+                if created:
+                    record_changes(
+                        request.user.id, files=len(created), rebuild_missing=True
+                    )
+                    invalidate_responses(request.user.id)
+            pooled = []
+            with timed("analysis"):
+                for (index, _), audio_file in zip(valid, created):
+                    inflight = take_inflight(request, "files", index)
+                    if inflight is None:
+                        pooled.append(audio_file)
+                    else:
+                        run_analysis(audio_file, inflight)
+                run_batch_analysis(pooled)
+        except Exception as e:
+            logger.error(f"Error in batch post: {str(e)}")
+            return Response(
+                {"error": "Error processing audio files"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
 
-class AudioFileDetailView(generics.RetrieveUpdateDestroyAPIView):
+        for (index, _), audio_file in zip(valid, created):
+            data = AudioFileSerializer(audio_file, context=context).data
+            if audio_file.analysis.status == AudioAnalysis.STATUS_FAILED:
+                data["error"] = audio_file.analysis.error
+            results[index] = data
+
+        if not created:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif len(created) < len(files):
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({"results": results}, status=response_status)
+
+
+class AudioFileDetailView(
+    ServerTimingMixin,
+    AnalyzeWhileUploadingMixin,
+    generics.RetrieveUpdateDestroyAPIView,
+):
     queryset = AudioFile.objects.all()
     serializer_class = AudioFileSerializer
     lookup_field = "id"
     parser_classes = [MultiPartParser, FormParser]
     permission_classes = [permissions.IsAuthenticated]
     authentication_classes = [authentication.TokenAuthentication]
+    renderer_classes = AUDIO_RENDERER_CLASSES
 
     def get_queryset(self):
         """Get queryset filtered by current user"""
-        return AudioFile.objects.filter(user=self.request.user)
+        return AudioFile.objects.filter(user=self.request.user).select_related(
+            "analysis"
+        )
 
     def delete(self, request, *args, **kwargs):
         """Delete audio file and its data"""
         try:
             instance = self.get_object()
+            delete_waveform(instance)
+            delete_canonical(instance)
             instance.file.delete()
             instance.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
@@ -123,38 +386,44 @@ class AudioFileDetailView(generics.RetrieveUpdateDestroyAPIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-    def calculate_speed_and_peaks(self, instance):
-        """Calculate speed and peaks from audio file"""
-        try:
-            speed_mps, speed_unit, speed_mph, mph_unit, peaks, amplitude_formatted = calculate_speed_of_sound(
-                float(instance.distance), instance.file.path, instance.unit
-            )
-            return speed_mps, speed_unit, speed_mph, mph_unit, peaks, amplitude_formatted
-        except Exception as e:
-            logger.error(f"Error calculating speed and peaks: {str(e)}")
-            return 0, "m/s", 0, "MPH", [], []
+    def perform_update(self, serializer):
+        """Save the changes, re-analysing only when the file was replaced"""
+        if "file" in serializer.validated_data:
+            delete_waveform(serializer.instance)
+            delete_canonical(serializer.instance)
+        serializer.save()
+        if "file" in serializer.validated_data:
+            analyze_or_enqueue(self.request, serializer.instance)
+        else:
+            refresh_speed(serializer.instance)
+
+    def update_status(self, serializer):
+        """202 while a replaced file waits for its analysis, 200 otherwise"""
+        if (
+            "file" in serializer.validated_data
+            and serializer.instance.analysis.status == AudioAnalysis.STATUS_PENDING
+        ):
+            return status.HTTP_202_ACCEPTED
+        return status.HTTP_200_OK
+
+    def build_response(self):
+        """Serialize the file; only called for stale clients"""
+        serializer = self.get_serializer(self.get_object())
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
     def retrieve(self, request, *args, **kwargs):
-        """Retrieve single audio file with calculations"""
+        """Retrieve single audio file with its stored calculations"""
         try:
-            instance = self.get_object()
-            serializer = self.get_serializer(instance)
-            speed_mps, speed_unit, speed_mph, mph_unit, peaks, amplitude_formatted = (
-                self.calculate_speed_and_peaks(instance)
-            )
-
-            return Response(
-                {
-                    **serializer.data,
-                    "speed_mps": speed_mps,
-                    "speed_unit": speed_unit,
-                    "peaks": peaks,
-                    "speed_mph": speed_mph,
-                    "unit_mph": mph_unit,
-                    "amplitude_formatted": amplitude_formatted,
-                },
-                status=status.HTTP_200_OK,
+            audio_file_id = kwargs[self.lookup_field]
+            return conditional_response(
+                request,
+                self.get_queryset().filter(id=audio_file_id),
+                "detail",
+                self.build_response,
+                audio_file_id,
             )
+        except Http404:
+            raise
         except Exception as e:
             logger.error(f"Error retrieving audio file: {str(e)}")
             return Response(
@@ -166,27 +435,11 @@ class AudioFileDetailView(generics.RetrieveUpdateDestroyAPIView):
         """Partially update audio file"""
         try:
             instance = self.get_object()
-            serializer = self.get_serializer(
-                instance, data=request.data, partial=True
-            )
+            serializer = self.get_serializer(instance, data=request.data, partial=True)
 
             if serializer.is_valid():
-                serializer.save()
-                speed_mps, speed_unit, speed_mph, mph_unit, peaks, amplitude_formatted = (
-                    self.calculate_speed_and_peaks(instance)
-                )
-                return Response(
-                    {
-                        **serializer.data,
-                        "speed_mps": speed_mps,
-                        "speed_unit": speed_unit,
-                        "peaks": peaks,
-                        "speed_mph": speed_mph,
-                        "unit_mph": mph_unit,
-                        "amplitude_formatted": amplitude_formatted,
-                    },
-                    status=status.HTTP_200_OK,
-                )
+                self.perform_update(serializer)
+                return Response(serializer.data, status=self.update_status(serializer))
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Error updating audio file: {str(e)}")
@@ -202,22 +455,8 @@ class AudioFileDetailView(generics.RetrieveUpdateDestroyAPIView):
             serializer = self.get_serializer(instance, data=request.data)
 
             if serializer.is_valid():
-                serializer.save()
-                speed_mps, speed_unit, speed_mph, mph_unit, peaks, amplitude_formatted = (
-                    self.calculate_speed_and_peaks(instance)
-                )
-                return Response(
-                    {
-                        **serializer.data,
-                        "speed_mps": speed_mps,
-                        "speed_unit": speed_unit,
-                        "peaks": peaks,
-                        "speed_mph": speed_mph,
-                        "unit_mph": mph_unit,
-                        "amplitude_formatted": amplitude_formatted,
-                    },
-                    status=status.HTTP_200_OK,
-                )
+                self.perform_update(serializer)
+                return Response(serializer.data, status=self.update_status(serializer))
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Error updating audio file: {str(e)}")
@@ -227,59 +466,267 @@ class AudioFileDetailView(generics.RetrieveUpdateDestroyAPIView):
             )
 
 
-class AudioStatisticsView(APIView):
+CHUNK_CONTENT_TYPE = "application/offset+octet-stream"
+
+
+def upload_response(upload, response_status=status.HTTP_200_OK):
+    """Progress of an upload, with the offset also in ``Upload-Offset``."""
+    response = Response(
+        {"id": upload.id, "offset": upload.offset, "size": upload.size},
+        status=response_status,
+    )
+    response["Upload-Offset"] = str(upload.offset)
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+class AudioUploadListView(ServerTimingMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
     authentication_classes = [authentication.TokenAuthentication]
 
-    def get(self, request, *args, **kwargs):
-        """Get statistics for all audio files of the current user"""
+    def post(self, request, *args, **kwargs):
+        """Start a resumable upload: ``file_name``, ``size``, distance, unit"""
+        serializer = AudioUploadSerializer(
+            data=request.data, context={"request": request}
+        )
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        upload = serializer.save()
+        response = Response(serializer.data, status=status.HTTP_201_CREATED)
+        response["Location"] = request.build_absolute_uri(
+            reverse("audio:audioupload-detail", args=[upload.id])
+        )
+        response["Upload-Offset"] = "0"
+        return response
+
+
+class AudioUploadDetailView(ServerTimingMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [authentication.TokenAuthentication]
+    # Chunks are read from the raw request stream, never parsed.
+    parser_classes = []
+
+    def get(self, request, id, *args, **kwargs):
+        """Where to resume: the number of bytes received so far"""
+        upload = get_object_or_404(AudioUpload, id=id, user=request.user)
+        return upload_response(upload)
+
+    def patch(self, request, id, *args, **kwargs):
+        """Append the body at the offset given in ``Upload-Offset``"""
+        if request.content_type.split(";")[0].strip() != CHUNK_CONTENT_TYPE:
+            return Response(
+                {"error": f"Chunks must be sent as {CHUNK_CONTENT_TYPE}"},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
         try:
-            audio_files = AudioFile.objects.filter(user=request.user).order_by(
-                "-updated_at"
+            offset = int(request.headers["Upload-Offset"])
+            length = int(request.headers.get("Content-Length") or 0)
+        except (KeyError, ValueError):
+            return Response(
+                {"error": "Upload-Offset and Content-Length are required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = settings.AUDIO_UPLOAD_MAX_CHUNK_BYTES
+        if length > limit:
+            return Response(
+                {"error": f"Chunks are limited to {limit} bytes"},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
             )
-            audio_statistics = []
-            all_speeds = []
-
-            for audio_file in audio_files:
-                speed_mps, speed_unit, speed_mph, mph_unit, peaks, amplitude_formatted = calculate_speed_of_sound(
-                    float(audio_file.distance),
-                    audio_file.file.path,
-                    audio_file.unit
-                )
 
-                if isinstance(speed_mph, (int, float)) and speed_mph > 0:
-                    all_speeds.append(speed_mph)
-
-                audio_statistics.append(
-                    {
-                        "file_name": audio_file.file.name,
-                        "speed": speed_mph,
-                        "speed_unit": mph_unit,
-                        "peaks": peaks,
-                        "distance": audio_file.distance,
-                        "unit": audio_file.unit,
-                        "amplitude_formatted": amplitude_formatted,
-                    }
+        try:
+            upload = append_chunk(id, request.user, offset, request.stream, length)
+        except AudioUpload.DoesNotExist:
+            return Response(
+                {"error": "Upload not found or already finalized"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        except UploadConflict as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        return upload_response(upload)
+
+    def delete(self, request, id, *args, **kwargs):
+        """Abort an unfinished upload"""
+        try:
+            delete_upload(id, request.user)
+        except AudioUpload.DoesNotExist:
+            return Response(
+                {"error": "Upload not found or already finalized"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AudioUploadFinalizeView(ServerTimingMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [authentication.TokenAuthentication]
+    renderer_classes = AUDIO_RENDERER_CLASSES
+
+    def post(self, request, id, *args, **kwargs):
+        """Create the audio file of a complete upload and queue its analysis"""
+        try:
+            audio_file = finalize_upload(id, request.user)
+        except AudioUpload.DoesNotExist:
+            return Response(
+                {"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+        except UploadIncomplete as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = AudioFileSerializer(audio_file, context={"request": request})
+        return Response(
+            serializer.data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={
+                "Location": request.build_absolute_uri(
+                    reverse("audio:audiofile-detail", args=[audio_file.id])
                 )
+            },
+        )
+
 
-            min_speed = min(all_speeds) if all_speeds else 0
-            max_speed = max(all_speeds) if all_speeds else 0
-            avg_speed = sum(all_speeds) / len(all_speeds) if all_speeds else 0
+class AudioWaveformView(ServerTimingMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [authentication.TokenAuthentication]
+    renderer_classes = AUDIO_RENDERER_CLASSES
+
+    def get(self, request, id, *args, **kwargs):
+        """Tile of the waveform pyramid: ``?level=&start=&end=`` in points"""
+        audio_file = get_object_or_404(
+            AudioFile.objects.filter(user=request.user).select_related("analysis"),
+            id=id,
+        )
+        analysis = get_analysis(audio_file)
+        if analysis.status == AudioAnalysis.STATUS_PENDING:
+            return Response(
+                {"analysis_status": analysis.status}, status=status.HTTP_202_ACCEPTED
+            )
 
-            response_data = {
-                "audio_statistics": audio_statistics,
-                "min_speed": round(min_speed, 2),
-                "max_speed": round(max_speed, 2),
-                "avg_speed": round(avg_speed, 2),
-                "total_files": len(audio_files),
-                "processed_files": len(all_speeds),
-            }
+        try:
+            waveform = WaveformFile(waveform_path(audio_file))
+        except (OSError, ValueError):
+            return Response(
+                {"error": "Waveform not available"}, status=status.HTTP_404_NOT_FOUND
+            )
 
-            return Response(response_data, status=status.HTTP_200_OK)
+        try:
+            level = int(request.query_params.get("level", waveform.overview_level()))
+            start = int(request.query_params.get("start", 0))
+            end = int(request.query_params.get("end", start + MAX_TILE_POINTS))
+        except ValueError:
+            return Response(
+                {"error": "level, start and end must be integers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not 0 <= level < len(waveform.levels) or start < 0 or end < start:
+            return Response(
+                {"error": "Tile out of range"}, status=status.HTTP_400_BAD_REQUEST
+            )
 
+        points = waveform.levels[level][1]
+        end = min(end, start + MAX_TILE_POINTS, points)
+        start = min(start, end)
+
+        # Tiles only change when the file is analysed again.
+        version = f"{analysis.pk}-{analysis.updated_at.timestamp()}"
+        tile_range = f"{level}-{start}-{end}-{request.accepted_renderer.format}"
+        etag = f'"{version}-{tile_range}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            tile = waveform.tile(level, start, end)
+            packed = packs_arrays(request)
+            response = Response(
+                {
+                    "level": level,
+                    "levels": len(waveform.levels),
+                    "samples_per_point": waveform.samples_per_point(level),
+                    "frame_rate": waveform.frame_rate,
+                    "channels": waveform.channels,
+                    "points": points,
+                    "start": start,
+                    "end": end,
+                    "min": tile[:, 0] if packed else tile[:, 0].tolist(),
+                    "max": tile[:, 1] if packed else tile[:, 1].tolist(),
+                },
+                status=status.HTTP_200_OK,
+            )
+        response["ETag"] = etag
+        patch_cache_control(response, public=True, max_age=60)
+        patch_vary_headers(response, ["Authorization"])
+        return response
+
+
+class AudioStatisticsView(ServerTimingMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [authentication.TokenAuthentication]
+    renderer_classes = AUDIO_RENDERER_CLASSES
+
+    def get(self, request, *args, **kwargs):
+        """Get statistics for all audio files of the current user"""
+        try:
+            return conditional_response(
+                request,
+                AudioFile.objects.filter(user=request.user),
+                "statistics",
+                lambda: self.build_response(request),
+                prepare=lambda: self.analyze_missing(request),
+            )
         except Exception as e:
             logger.error(f"Error generating audio statistics: {str(e)}")
             return Response(
                 {"error": "Error generating statistics"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
\ No newline at end of file
+            )
+
+    def analyze_missing(self, request):
+        """Analyse what is missing in parallel; stragglers stay queued"""
+        with timed("analysis"):
+            missing = needs_analysis(
+                AudioFile.objects.filter(user=request.user).select_related("analysis")
+            )
+            if missing:
+                run_batch_analysis(missing, timeout=settings.AUDIO_STATISTICS_DEADLINE)
+        return bool(missing)
+
+    def build_response(self, request):
+        """Serialize the statistics; only called for stale clients"""
+        audio_files = (
+            AudioFile.objects.filter(user=request.user)
+            .select_related("analysis")
+            .order_by("-updated_at")
+        )
+        audio_statistics = []
+        points = requested_points(request)
+        packed = packs_arrays(request)
+
+        for audio_file in audio_files:
+            analysis = get_analysis(audio_file)
+            speed_mph = analysis.speed_mph
+
+            audio_statistics.append(
+                {
+                    "file_name": audio_file.file.name,
+                    "speed": speed_mph,
+                    "speed_unit": "MPH",
+                    "peaks": format_peaks(analysis.peaks, packed),
+                    "distance": audio_file.distance,
+                    "unit": audio_file.unit,
+                    "envelope": get_envelope(analysis).as_dict(points, packed),
+                    "analysis_status": analysis.status,
+                }
+            )
+
+        # Totals are maintained incrementally, see audio.summary.
+        summary = get_summary(request.user)
+        response_data = {
+            "audio_statistics": audio_statistics,
+            "min_speed": round(summary.speed_min or 0, 2),
+            "max_speed": round(summary.speed_max or 0, 2),
+            "avg_speed": round(summary.speed_avg, 2),
+            "stddev_speed": round(summary.speed_stddev, 2),
+            "total_files": summary.total_files,
+            "processed_files": summary.processed_files,
+            "pending_files": summary.pending_files,
+        }
+
+        return Response(response_data, status=status.HTTP_200_OK)
@@ -0,0 +1,205 @@
+"""
+Binary on-disk waveform pyramids for zoomable waveform tiles.
+
+Each recording gets a ``.waveform`` file next to it in ``MEDIA_ROOT``. It
+holds min/max pairs of every ``WAVEFORM_BUCKET`` samples and every coarser
+level down to a single point, so any tile is a slice of a memory map.
+
+Layout (little-endian)::
+
+    header  magic, version, level count, bucket, frame rate, channels
+    table   (offset, points) of every level, offsets counted in pairs
+    data    int16 (min, max) pairs of level 0, then level 1, ...
+"""
+
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from .envelope import level_sizes, to_int16
+
+MAGIC = b"AWFM"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIH")
+LEVEL = struct.Struct("<QQ")
+WAVEFORM_BUCKET = 32
+MAX_TILE_POINTS = 4096
+# Pairs per read or write while building the coarser levels.
+CHUNK_POINTS = 1 << 18
+
+
+def waveform_path(audio_file):
+    """Location of the waveform pyramid of an AudioFile."""
+    return f"{audio_file.file.path}.waveform"
+
+
+def delete_waveform(audio_file):
+    """Remove the waveform pyramid of an AudioFile, if it has one."""
+    if not audio_file.file:
+        return
+    try:
+        os.unlink(waveform_path(audio_file))
+    except FileNotFoundError:
+        pass
+
+
+class WaveformWriter:
+    """
+    Write a waveform pyramid from blocks of samples.
+
+    Level 0 pairs are spooled to a temporary file while samples arrive; the
+    coarser levels are derived from it in fixed-size chunks when closing, so
+    memory use does not depend on the recording length.
+    """
+
+    def __init__(self, path, frame_rate, channels, bucket=WAVEFORM_BUCKET):
+        self.path = path
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.bucket = bucket
+        self.points = 0
+        self.rest = np.empty(0, dtype=np.int16)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        self.base = tempfile.TemporaryFile(dir=directory)
+
+    def feed(self, samples):
+        samples = np.concatenate((self.rest, to_int16(samples)))
+        full = samples.size - samples.size % self.bucket
+        if full:
+            buckets = samples[:full].reshape(-1, self.bucket)
+            self.write_base(buckets.min(axis=1), buckets.max(axis=1))
+        self.rest = samples[full:]
+
+    def write_base(self, mins, maxs):
+        self.base.write(np.stack((mins, maxs), axis=1).astype("<i2").tobytes())
+        self.points += mins.size
+
+    def close(self, path=None):
+        """
+        Finish level 0, build the coarser levels and publish the file.
+
+        ``path`` replaces the path given when writing started, for pyramids
+        whose final name was not known yet.
+        """
+        if path is not None:
+            self.path = path
+        if self.rest.size:
+            self.write_base(self.rest.min(keepdims=True), self.rest.max(keepdims=True))
+            self.rest = self.rest[:0]
+
+        sizes = level_sizes(self.points) if self.points else []
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+        data_offset = HEADER.size + LEVEL.size * len(sizes)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path))
+        try:
+            with os.fdopen(fd, "wb") as output:
+                output.write(
+                    HEADER.pack(
+                        MAGIC,
+                        VERSION,
+                        len(sizes),
+                        self.bucket,
+                        self.frame_rate,
+                        self.channels,
+                    )
+                )
+                for offset, size in zip(offsets, sizes):
+                    output.write(LEVEL.pack(int(offset), size))
+                self.base.seek(0)
+                while True:
+                    chunk = self.base.read(CHUNK_POINTS * 4)
+                    if not chunk:
+                        break
+                    output.write(chunk)
+                output.truncate(data_offset + int(offsets[-1]) * 4)
+            self.base.close()
+
+            if len(sizes) > 1:
+                pairs = np.memmap(
+                    tmp_path,
+                    dtype="<i2",
+                    mode="r+",
+                    offset=data_offset,
+                    shape=(int(offsets[-1]), 2),
+                )
+                for level in range(1, len(sizes)):
+                    self.build_level(
+                        pairs, offsets[level - 1], sizes[level - 1], offsets[level]
+                    )
+                pairs.flush()
+                del pairs
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def discard(self):
+        """Drop what was written without publishing anything."""
+        self.base.close()
+
+    @staticmethod
+    def build_level(pairs, source, size, target):
+        """Halve ``size`` pairs at ``source`` into the level at ``target``."""
+        for start in range(0, size, CHUNK_POINTS):
+            chunk = pairs[source + start : source + min(start + CHUNK_POINTS, size)]
+            if chunk.shape[0] % 2:
+                chunk = np.concatenate((chunk, chunk[-1:]))
+            chunk = chunk.reshape(-1, 2, 2)
+            halved = np.stack(
+                (chunk[:, :, 0].min(axis=1), chunk[:, :, 1].max(axis=1)), axis=1
+            )
+            first = target + start // 2
+            pairs[first : first + halved.shape[0]] = halved
+
+
+class WaveformFile:
+    """Read-only access to a waveform pyramid file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as waveform:
+            header = waveform.read(HEADER.size)
+            magic, version, levels, bucket, frame_rate, channels = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"Not a waveform file: {path}")
+            self.levels = [
+                LEVEL.unpack(waveform.read(LEVEL.size)) for _ in range(levels)
+            ]
+        self.path = path
+        self.bucket = bucket
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.data_offset = HEADER.size + LEVEL.size * levels
+
+    def samples_per_point(self, level):
+        return self.bucket << level
+
+    def overview_level(self, points=MAX_TILE_POINTS):
+        """Most detailed level that fits in ``points`` points."""
+        for level, (_, size) in enumerate(self.levels):
+            if size <= points:
+                return level
+        return len(self.levels) - 1
+
+    def tile(self, level, start, end):
+        """
+        Min/max pairs ``start:end`` of a level, read through a memory map.
+
+        Returns:
+            np.ndarray: (points, 2) int16 array of (min, max) pairs
+        """
+        offset, points = self.levels[level]
+        start, end = max(0, start), min(end, points)
+        if start >= end:
+            return np.empty((0, 2), dtype="<i2")
+        return np.memmap(
+            self.path,
+            dtype="<i2",
+            mode="r",
+            offset=self.data_offset + (offset + start) * 4,
+            shape=(end - start, 2),
+        )
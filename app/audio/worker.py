@@ -0,0 +1,228 @@
+"""
+Background worker for the Postgres backed analysis job queue.
+"""
+
+import os
+import socket
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from core.models import AnalysisJob, AudioAnalysis
+
+from .analysis import run_analysis
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id():
+    """Identify a worker by host and process so several nodes can share a queue."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_job(worker_id):
+    """
+    Lock and return the next runnable job, or None if the queue is empty.
+
+    ``SELECT ... FOR UPDATE SKIP LOCKED`` lets any number of workers poll the
+    same table without handing out a job twice or waiting on each other.
+    """
+    with transaction.atomic():
+        job = (
+            AnalysisJob.objects.select_for_update(skip_locked=True)
+            .filter(status=AnalysisJob.STATUS_QUEUED, run_after__lte=timezone.now())
+            .order_by("run_after", "id")
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = AnalysisJob.STATUS_RUNNING
+        job.locked_by = worker_id
+        job.locked_at = timezone.now()
+        job.attempts += 1
+        job.save(
+            update_fields=["status", "locked_by", "locked_at", "attempts", "updated_at"]
+        )
+        return job
+
+
+def refresh_lock(job):
+    """Tell other workers the job is still being processed."""
+    return AnalysisJob.objects.filter(
+        pk=job.pk, status=AnalysisJob.STATUS_RUNNING, locked_by=job.locked_by
+    ).update(locked_at=timezone.now())
+
+
+@contextmanager
+def heartbeat(job, interval=None):
+    """
+    Refresh the lock of a job from a background thread while it runs.
+
+    Analyses longer than ``AUDIO_ANALYSIS_STALE_SECONDS`` are then not taken
+    for abandoned; only a worker that stops beating is.
+    """
+    if interval is None:
+        interval = settings.AUDIO_ANALYSIS_HEARTBEAT_SECONDS
+    stopped = threading.Event()
+
+    def beat():
+        try:
+            while not stopped.wait(interval):
+                refresh_lock(job)
+        except Exception as e:
+            logger.error(f"Heartbeat of analysis job {job.id} failed: {str(e)}")
+        finally:
+            # The thread has its own database connection.
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, name=f"heartbeat-{job.id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def fail_analysis(job, error):
+    """Mark the analysis of a job that will not be retried as failed."""
+    analysis = (
+        AudioAnalysis.objects.filter(audio_file_id=job.audio_file_id)
+        .select_related("audio_file")
+        .first()
+    )
+    if analysis is not None:
+        # Saved rather than updated so the speed summary follows.
+        analysis.status = AudioAnalysis.STATUS_FAILED
+        analysis.error = error
+        analysis.save(update_fields=["status", "error", "updated_at"])
+
+
+def process_job(job):
+    """Run the analysis of a claimed job and record its outcome."""
+    try:
+        with heartbeat(job):
+            analysis = run_analysis(job.audio_file)
+    except Exception as e:
+        logger.error(f"Analysis job {job.id} raised: {str(e)}")
+        job.last_error = str(e)
+        if job.attempts < settings.AUDIO_ANALYSIS_MAX_ATTEMPTS:
+            job.status = AnalysisJob.STATUS_QUEUED
+            job.run_after = timezone.now() + timedelta(
+                seconds=settings.AUDIO_ANALYSIS_RETRY_DELAY * job.attempts
+            )
+        else:
+            job.status = AnalysisJob.STATUS_FAILED
+            fail_analysis(job, str(e))
+    else:
+        if analysis.status == AudioAnalysis.STATUS_DONE:
+            job.status = AnalysisJob.STATUS_DONE
+        else:
+            # Undecodable files fail the same way on every attempt.
+            job.status = AnalysisJob.STATUS_FAILED
+            job.last_error = analysis.error
+
+    job.locked_by = ""
+    job.locked_at = None
+    job.save(
+        update_fields=[
+            "status",
+            "run_after",
+            "last_error",
+            "locked_by",
+            "locked_at",
+            "updated_at",
+        ]
+    )
+    return job
+
+
+def requeue_stale_jobs(stale_after=None):
+    """
+    Put back jobs whose worker died while holding them.
+
+    A job that already used ``AUDIO_ANALYSIS_MAX_ATTEMPTS`` attempts fails
+    with its analysis instead, so a file that kills its worker is not
+    retried forever.
+
+    Returns:
+        int: Number of jobs requeued or failed
+    """
+    if stale_after is None:
+        stale_after = settings.AUDIO_ANALYSIS_STALE_SECONDS
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    stale = AnalysisJob.objects.filter(
+        status=AnalysisJob.STATUS_RUNNING, locked_at__lt=cutoff
+    )
+    max_attempts = settings.AUDIO_ANALYSIS_MAX_ATTEMPTS
+
+    failed = 0
+    with transaction.atomic():
+        exhausted = stale.filter(attempts__gte=max_attempts).select_for_update(
+            skip_locked=True
+        )
+        for job in exhausted:
+            error = f"Worker stopped responding after {job.attempts} attempts"
+            logger.error(f"Analysis job {job.id} failed: {error}")
+            job.status = AnalysisJob.STATUS_FAILED
+            job.last_error = error
+            job.locked_by = ""
+            job.locked_at = None
+            job.save(
+                update_fields=[
+                    "status",
+                    "last_error",
+                    "locked_by",
+                    "locked_at",
+                    "updated_at",
+                ]
+            )
+            fail_analysis(job, error)
+            failed += 1
+
+    requeued = stale.filter(attempts__lt=max_attempts).update(
+        status=AnalysisJob.STATUS_QUEUED, locked_by="", locked_at=None
+    )
+    return requeued + failed
+
+
+def run_worker(worker_id=None, poll_interval=1.0, burst=False, should_stop=None):
+    """
+    Process jobs until stopped.
+
+    Args:
+        worker_id (str): Name stored on claimed jobs (default: host:pid)
+        poll_interval (float): Seconds to sleep when the queue is empty
+        burst (bool): Return as soon as the queue is empty
+        should_stop (callable): Checked between jobs to allow a clean shutdown
+
+    Returns:
+        int: Number of jobs processed
+    """
+    worker_id = worker_id or default_worker_id()
+    processed = 0
+    last_stale_check = 0.0
+
+    while not (should_stop and should_stop()):
+        if time.monotonic() - last_stale_check > settings.AUDIO_ANALYSIS_STALE_SECONDS:
+            requeue_stale_jobs()
+            last_stale_check = time.monotonic()
+
+        job = claim_job(worker_id)
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        process_job(job)
+        processed += 1
+
+    return processed
@@ -65,3 +65,5 @@ class UserAdmin(BaseUserAdmin):
 
 admin.site.register(models.User, UserAdmin)
 admin.site.register(models.AudioFile)
+admin.site.register(models.AudioAnalysis)
+admin.site.register(models.AnalysisJob)
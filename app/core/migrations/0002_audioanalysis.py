@@ -0,0 +1,66 @@
+# Generated by Django 5.1.2 on 2026-10-17 15:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AudioAnalysis",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                ("algorithm_version", models.PositiveIntegerField(default=0)),
+                ("speed_mps", models.FloatField(default=0)),
+                ("speed_mph", models.FloatField(default=0)),
+                ("frame_rate", models.PositiveIntegerField(default=0)),
+                (
+                    "peaks",
+                    models.JSONField(default=list, help_text="Peak sample indices."),
+                ),
+                (
+                    "amplitude",
+                    models.JSONField(
+                        default=list,
+                        help_text="Amplitude values at or above the loudness cutoff.",
+                    ),
+                ),
+                ("error", models.TextField(blank=True, default="")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "audio_file",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="analysis",
+                        to="core.audiofile",
+                    ),
+                ),
+            ],
+        ),
+    ]
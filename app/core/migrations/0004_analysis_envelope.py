@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-17 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_analysisjob"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="audioanalysis",
+            name="amplitude",
+        ),
+        migrations.AddField(
+            model_name="audioanalysis",
+            name="envelope",
+            field=models.BinaryField(
+                default=bytes, help_text="Min/max waveform pyramid as int16 pairs."
+            ),
+        ),
+        migrations.AddField(
+            model_name="audioanalysis",
+            name="envelope_bucket",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Samples per point of the most detailed envelope level.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="audioanalysis",
+            name="envelope_points",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Points of the most detailed envelope level."
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.2 on 2026-10-17 18:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_analysis_envelope"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SpeedSummary",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="speed_summary",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("total_files", models.PositiveIntegerField(default=0)),
+                (
+                    "processed_files",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Files whose analysis is no longer pending.",
+                    ),
+                ),
+                (
+                    "speed_count",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Analyses with a speed above zero."
+                    ),
+                ),
+                ("speed_sum", models.FloatField(default=0)),
+                ("speed_sum_squares", models.FloatField(default=0)),
+                ("speed_min", models.FloatField(blank=True, null=True)),
+                ("speed_max", models.FloatField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
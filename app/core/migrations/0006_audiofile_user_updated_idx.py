@@ -0,0 +1,20 @@
+# Generated by Django 5.1.2 on 2026-10-17 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_speedsummary"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="audiofile",
+            index=models.Index(
+                fields=["user", "-updated_at", "-id"],
+                name="audiofile_user_updated_idx",
+            ),
+        ),
+    ]
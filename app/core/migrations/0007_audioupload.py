@@ -0,0 +1,91 @@
+# Generated by Django 5.1.2 on 2026-10-17 19:20
+
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_audiofile_user_updated_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AudioUpload",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "file",
+                    models.CharField(
+                        help_text="Storage name of the file the chunks go to.",
+                        max_length=255,
+                    ),
+                ),
+                ("file_name", models.CharField(max_length=255)),
+                (
+                    "size",
+                    models.PositiveBigIntegerField(help_text="Total size in bytes."),
+                ),
+                (
+                    "offset",
+                    models.PositiveBigIntegerField(
+                        default=0, help_text="Bytes received so far."
+                    ),
+                ),
+                (
+                    "sha256",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="Expected hex digest.",
+                        max_length=64,
+                    ),
+                ),
+                ("distance", models.FloatField()),
+                (
+                    "unit",
+                    models.CharField(
+                        choices=[
+                            ("inches", "In"),
+                            ("meters", "M"),
+                            ("centimeters", "CM"),
+                        ],
+                        default="inches",
+                        max_length=20,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "audio_file",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="upload",
+                        to="core.audiofile",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="audio_uploads",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -1,7 +1,10 @@
 """Database Models"""
 
-from django.db import models
+import uuid
+
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
 
@@ -76,6 +79,14 @@ class AudioFile(models.Model):
     ]
     unit = models.CharField(max_length=20, choices=UNIT_CHOICES, default="inches")
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "-updated_at", "-id"],
+                name="audiofile_user_updated_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Audio File {self.id} for user {self.user.email}"
 
@@ -90,4 +101,166 @@ class AudioFile(models.Model):
 
     def save(self, *args, **kwargs):
         self.clean()
-        super().save(*args, **kwargs)
+        # Signal handlers update the SpeedSummary in the same transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class AudioUpload(models.Model):
+    """Resumable upload of a recording, appended to its file chunk by chunk."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="audio_uploads"
+    )
+    file = models.CharField(
+        max_length=255, help_text="Storage name of the file the chunks go to."
+    )
+    file_name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField(help_text="Total size in bytes.")
+    offset = models.PositiveBigIntegerField(
+        default=0, help_text="Bytes received so far."
+    )
+    sha256 = models.CharField(
+        max_length=64, blank=True, default="", help_text="Expected hex digest."
+    )
+    distance = models.FloatField()
+    unit = models.CharField(
+        max_length=20, choices=AudioFile.UNIT_CHOICES, default="inches"
+    )
+    audio_file = models.OneToOneField(
+        AudioFile,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="upload",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.id} of {self.file_name} ({self.offset}/{self.size})"
+
+
+class AudioAnalysis(models.Model):
+    """Stored analysis result of an AudioFile, computed once per upload."""
+
+    STATUS_PENDING = "pending"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    audio_file = models.OneToOneField(
+        AudioFile, on_delete=models.CASCADE, related_name="analysis"
+    )
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    algorithm_version = models.PositiveIntegerField(default=0)
+    speed_mps = models.FloatField(default=0)
+    speed_mph = models.FloatField(default=0)
+    frame_rate = models.PositiveIntegerField(default=0)
+    peaks = models.JSONField(default=list, help_text="Peak sample indices.")
+    envelope = models.BinaryField(
+        default=bytes, help_text="Min/max waveform pyramid as int16 pairs."
+    )
+    envelope_bucket = models.PositiveIntegerField(
+        default=0, help_text="Samples per point of the most detailed envelope level."
+    )
+    envelope_points = models.PositiveIntegerField(
+        default=0, help_text="Points of the most detailed envelope level."
+    )
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def save(self, *args, **kwargs):
+        # Signal handlers update the SpeedSummary in the same transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Analysis of audio file {self.audio_file_id} ({self.status})"
+
+
+class AnalysisJob(models.Model):
+    """Queued request to analyse an AudioFile in a background worker."""
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    audio_file = models.ForeignKey(
+        AudioFile, on_delete=models.CASCADE, related_name="analysis_jobs"
+    )
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=255, blank=True, default="")
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["run_after", "id"],
+                condition=models.Q(status="queued"),
+                name="analysisjob_queued_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Analysis job {self.id} for audio file {self.audio_file_id} ({self.status})"
+
+
+class SpeedSummary(models.Model):
+    """Running totals behind the statistics of one user, updated on every change."""
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="speed_summary"
+    )
+    total_files = models.PositiveIntegerField(default=0)
+    processed_files = models.PositiveIntegerField(
+        default=0, help_text="Files whose analysis is no longer pending."
+    )
+    speed_count = models.PositiveIntegerField(
+        default=0, help_text="Analyses with a speed above zero."
+    )
+    speed_sum = models.FloatField(default=0)
+    speed_sum_squares = models.FloatField(default=0)
+    speed_min = models.FloatField(blank=True, null=True)
+    speed_max = models.FloatField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def pending_files(self):
+        return self.total_files - self.processed_files
+
+    @property
+    def speed_avg(self):
+        return self.speed_sum / self.speed_count if self.speed_count else 0
+
+    @property
+    def speed_stddev(self):
+        if not self.speed_count:
+            return 0
+        variance = self.speed_sum_squares / self.speed_count - self.speed_avg**2
+        return max(variance, 0) ** 0.5
+
+    def __str__(self):
+        return f"Speed summary of user {self.user_id}"
@@ -2,11 +2,24 @@ upstream app {
     server app:9000;  # Ensure this matches the service name and port in your docker-compose
 }
 
+# Waveform tiles never change for a given analysis, so keep them at the proxy
+uwsgi_cache_path /tmp/nginx-waveform levels=1:2 keys_zone=waveform:10m max_size=256m inactive=1h;
+
 server {
     listen 80;
 
+    location ~ ^/api/audio/audio-files/\d+/waveform/$ {
+        include uwsgi_params;
+        uwsgi_pass app;
+        uwsgi_cache waveform;
+        # Tiles are per user, so the token is part of the key
+        uwsgi_cache_key "$http_authorization$request_uri$http_accept";
+        uwsgi_cache_revalidate on;
+        add_header X-Cache-Status $upstream_cache_status;
+    }
+
     location / {
         include uwsgi_params;  # Include the uwsgi_params file
         uwsgi_pass app;        # Pass requests to the uWSGI server
     }
-}
\ No newline at end of file
+}